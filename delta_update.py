@@ -0,0 +1,413 @@
+"""差分更新包的生成和应用
+
+比较新旧两次打包的产物，生成只包含变化部分的差分包：目录产物中内容未变的文件只记录路径，
+移动或重复的文件按内容去重，修改过的文件和单文件产物记录二进制差分，新增文件整体压缩保存。
+应用时先校验基准文件的SHA-256，在临时位置生成新版本并校验，全部通过后才替换原产物；
+目录产物中不属于旧版本的文件（如程序运行时写入的配置和日志）原样保留到新版本中。
+
+只依赖标准库，可以单独随程序分发，在用户机器上应用差分包。
+
+用法:
+    python delta_update.py create 旧版本产物 新版本产物 -o app.delta.zip
+    python delta_update.py apply app.delta.zip 已安装的产物
+
+产物为目录（如 dist/app）或单文件（如 dist/app.exe）。应用时目标程序不能正在运行。
+"""
+import os
+import sys
+import json
+import lzma
+import shutil
+import struct
+import hashlib
+import zipfile
+import argparse
+
+# 差分包格式版本
+DELTA_FORMAT = 1
+DELTA_INFO = 'delta.json'
+
+# 二进制差分: 头部之后是一串操作，C 从旧文件复制，I 插入新数据
+PATCH_MAGIC = b'PGUPATCH1'
+PATCH_BLOCK = 64
+# 旧文件索引的最大块数，文件较大时相应增大块的大小，索引占用的内存不随文件大小增长
+PATCH_INDEX_MAX = 1 << 18
+# 逐字节查找的最大字节数：变化的部分超过这个大小时放弃差分，整体压缩保存
+PATCH_MAX_SCAN = 1 << 20
+# 差分压缩后超过新文件大小的这一比例时，再比较整体压缩的大小
+PATCH_RATIO = 0.5
+# 整体压缩超过这个大小的文件时使用较快的压缩级别（单文件产物的内容大多已经压缩过）
+LZMA_FAST_SIZE = 16 * 1024 * 1024
+
+
+class DeltaError(Exception):
+    """差分包无效、基准文件不匹配或应用结果校验失败"""
+
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def list_files(target):
+    """产物中的文件 [(相对路径, 绝对路径)]，单文件产物只有它自己"""
+    if not os.path.isdir(target):
+        return [(os.path.basename(target), target)]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(target):
+        for name in filenames:
+            full_path = os.path.join(dirpath, name)
+            if os.path.isfile(full_path):
+                files.append((os.path.relpath(full_path, target).replace(os.sep, '/'), full_path))
+    return sorted(files)
+
+
+def scan_manifest(target):
+    """计算产物清单，格式与打包器写入的 <产物>.manifest.json 相同"""
+    files = [{'path': rel_path, 'size': os.path.getsize(full_path), 'sha256': file_sha256(full_path)}
+             for rel_path, full_path in list_files(target)]
+    return {
+        'format': 1,
+        'algorithm': 'sha256',
+        'name': os.path.basename(target),
+        'type': 'onedir' if os.path.isdir(target) else 'onefile',
+        'file_count': len(files),
+        'total_size': sum(record['size'] for record in files),
+        'files': files,
+    }
+
+
+def manifest_id(manifest):
+    """清单的内容标识，文件路径、大小和哈希都相同的两次打包得到相同的标识"""
+    sha = hashlib.sha256()
+    for record in sorted(manifest['files'], key=lambda record: record['path']):
+        sha.update(f"{record['path']}\0{record['size']}\0{record['sha256']}\n".encode('utf-8'))
+    return sha.hexdigest()[:16]
+
+
+def artifact_file(target, rel_path, is_dir):
+    return os.path.join(target, *rel_path.split('/')) if is_dir else target
+
+
+def compress_whole(data):
+    return lzma.compress(data, preset=1 if len(data) >= LZMA_FAST_SIZE else 6)
+
+
+def make_patch(old, new, block=PATCH_BLOCK, max_scan=PATCH_MAX_SCAN):
+    """生成把 old 变为 new 的二进制差分，变化太多时返回 None
+
+    旧文件按固定大小分块，以块内容的哈希值建立索引（最多 PATCH_INDEX_MAX 块），
+    在新文件中逐字节查找与某一块相同的位置，找到后向前、向后扩展成尽可能长的复制操作，
+    其余部分作为插入数据。只在不匹配的区域逐字节推进，逐字节查找的字节数超过 max_scan 时
+    放弃差分，耗时和内存都有上限。
+    """
+    block = max(block, -(-len(old) // PATCH_INDEX_MAX))
+    index = {}
+    for offset in range(0, len(old) - block + 1, block):
+        index.setdefault(hash(old[offset:offset + block]), offset)
+
+    ops = [PATCH_MAGIC, struct.pack('<QQ', len(old), len(new))]
+
+    def add_literal(start, end):
+        if end > start:
+            ops.append(b'I' + struct.pack('<Q', end - start))
+            ops.append(new[start:end])
+
+    literal_start = 0
+    pos = 0
+    scanned = 0
+    last = len(new) - block
+    while pos <= last:
+        chunk = new[pos:pos + block]
+        src = index.get(hash(chunk))
+        if src is None or old[src:src + block] != chunk:
+            pos += 1
+            scanned += 1
+            if scanned > max_scan:
+                return None
+            continue
+        start = pos
+        # 向前扩展到上一次操作结束的位置
+        while start > literal_start and src > 0 and new[start - 1] == old[src - 1]:
+            start -= 1
+            src -= 1
+        # 向后扩展：步长从大到小逼近第一个不同的字节
+        length = pos + block - start
+        step = 1 << 16
+        while step:
+            a = start + length
+            b = src + length
+            if a + step <= len(new) and b + step <= len(old) and new[a:a + step] == old[b:b + step]:
+                length += step
+            else:
+                step >>= 1
+        add_literal(literal_start, start)
+        ops.append(b'C' + struct.pack('<QQ', src, length))
+        pos = literal_start = start + length
+    add_literal(literal_start, len(new))
+    return b''.join(ops)
+
+
+def apply_patch(old, patch):
+    """按 make_patch 生成的差分由 old 得到新文件的内容"""
+    view = memoryview(patch)
+    if bytes(view[:len(PATCH_MAGIC)]) != PATCH_MAGIC:
+        raise DeltaError("二进制差分格式无效")
+    pos = len(PATCH_MAGIC)
+    old_size, new_size = struct.unpack_from('<QQ', patch, pos)
+    pos += 16
+    if old_size != len(old):
+        raise DeltaError(f"基准文件大小不符: 应为 {old_size}，实际 {len(old)}")
+    old_view = memoryview(old)
+    out = bytearray()
+    while pos < len(patch):
+        op = patch[pos:pos + 1]
+        if op == b'C':
+            src, length = struct.unpack_from('<QQ', patch, pos + 1)
+            pos += 17
+            if src + length > len(old):
+                raise DeltaError("二进制差分超出基准文件范围")
+            out += old_view[src:src + length]
+        elif op == b'I':
+            length, = struct.unpack_from('<Q', patch, pos + 1)
+            pos += 9
+            if pos + length > len(patch):
+                raise DeltaError("二进制差分数据不完整")
+            out += view[pos:pos + length]
+            pos += length
+        else:
+            raise DeltaError("二进制差分格式无效")
+    if len(out) != new_size:
+        raise DeltaError(f"差分结果大小不符: 应为 {new_size}，实际 {len(out)}")
+    return bytes(out)
+
+
+def create_delta(base_manifest, base_file, target, target_manifest, output, log=None, is_cancelled=None):
+    """生成从 base_manifest 描述的旧版本到 target 的差分包，返回统计信息
+
+    base_file(sha256) 返回内容为该哈希的旧文件路径；target_manifest 为新产物的清单。
+    取消时返回 None，不留下输出文件。
+    """
+    is_dir = target_manifest['type'] == 'onedir'
+    if base_manifest['type'] != target_manifest['type']:
+        raise DeltaError("新旧产物类型不同（目录/单文件），无法生成差分包")
+    base_by_path = {record['path']: record for record in base_manifest['files']}
+    base_by_sha = {}
+    for record in base_manifest['files']:
+        base_by_sha.setdefault(record['sha256'], record)
+    # 单文件产物改名后仍与旧文件比较
+    single_base = base_manifest['files'][0] if not is_dir and base_manifest['files'] else None
+
+    stats = {'keep': 0, 'copy': 0, 'patch': 0, 'add': 0, 'bytes': 0}
+    entries = []
+    stored = {}
+    tmp_output = output + '.tmp'
+    with zipfile.ZipFile(tmp_output, 'w', zipfile.ZIP_STORED) as zf:
+        for record in target_manifest['files']:
+            if is_cancelled and is_cancelled():
+                break
+            full_path = artifact_file(target, record['path'], is_dir)
+            entry = dict(record, mode=os.stat(full_path).st_mode & 0o777)
+            old = base_by_path.get(record['path'])
+            if old and old['sha256'] == record['sha256']:
+                entry.update(action='keep', source=old['path'], source_sha256=old['sha256'])
+            elif record['sha256'] in base_by_sha:
+                # 移动或重复的文件
+                source = base_by_sha[record['sha256']]
+                entry.update(action='copy', source=source['path'], source_sha256=source['sha256'])
+            elif record['sha256'] in stored:
+                entry.update(action='add', data=stored[record['sha256']])
+            else:
+                with open(full_path, 'rb') as f:
+                    data = f.read()
+                old = old or single_base
+                whole = None
+                if old and old['size']:
+                    with open(base_file(old['sha256']), 'rb') as f:
+                        patch = make_patch(f.read(), data)
+                    if patch is not None:
+                        patch = lzma.compress(patch)
+                        if len(patch) >= len(data) * PATCH_RATIO:
+                            whole = compress_whole(data)
+                    if patch is not None and (whole is None or len(patch) < len(whole)):
+                        name = f"patches/{record['sha256']}"
+                        zf.writestr(name, patch)
+                        entry.update(action='patch', source=old['path'], source_sha256=old['sha256'], data=name)
+                if 'action' not in entry:
+                    name = f"files/{record['sha256']}"
+                    zf.writestr(name, whole if whole is not None else compress_whole(data))
+                    entry.update(action='add', data=name)
+                    stored[record['sha256']] = name
+                if log:
+                    log(f"  {'差分' if entry['action'] == 'patch' else '新增'} {record['path']}: "
+                        f"{record['size']} -> {zf.getinfo(name).file_size} 字节")
+            stats[entry['action']] += 1
+            entries.append(entry)
+
+        info = {
+            'format': DELTA_FORMAT,
+            'name': target_manifest['name'],
+            'type': target_manifest['type'],
+            'base': {'id': manifest_id(base_manifest), 'name': base_manifest['name'],
+                     'file_count': len(base_manifest['files']),
+                     'files': sorted(record['path'] for record in base_manifest['files'])},
+            'target': {'id': manifest_id(target_manifest), 'file_count': len(target_manifest['files']),
+                       'total_size': sum(record['size'] for record in target_manifest['files'])},
+            'files': entries,
+        }
+        zf.writestr(DELTA_INFO, json.dumps(info, ensure_ascii=False, indent=1))
+    if is_cancelled and is_cancelled():
+        os.remove(tmp_output)
+        return None
+    os.replace(tmp_output, output)
+    stats['bytes'] = os.path.getsize(output)
+    stats['base_id'] = info['base']['id']
+    stats['target_id'] = info['target']['id']
+    return stats
+
+
+def read_delta_info(zf):
+    try:
+        info = json.loads(zf.read(DELTA_INFO).decode('utf-8'))
+    except (KeyError, ValueError) as e:
+        raise DeltaError(f"不是有效的差分包: {e}")
+    if info.get('format') != DELTA_FORMAT:
+        raise DeltaError(f"不支持的差分包格式: {info.get('format')}")
+    return info
+
+
+def link_or_copy(src, dst):
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copyfile(src, dst)
+
+
+def apply_delta(package, target, log=print):
+    """把差分包应用到已安装的产物 target
+
+    1. 校验差分包用到的所有基准文件的SHA-256，不符时不做任何修改
+    2. 在 target 旁边的临时位置生成新版本：未变和移动的文件从基准复制（优先硬链接），
+       其余文件由差分或完整数据生成，校验每个生成文件的大小和SHA-256
+    3. 目录产物中既不属于旧版本也不属于新版本的文件（程序运行时写入的配置、日志等）复制到新版本
+    4. 全部通过后替换 target；目录产物先改名保留旧版本，替换失败时恢复
+    """
+    target = os.path.abspath(target)
+    with zipfile.ZipFile(package) as zf:
+        info = read_delta_info(zf)
+        is_dir = info['type'] == 'onedir'
+        if is_dir != os.path.isdir(target):
+            raise DeltaError(f"产物类型不符: 差分包用于{'目录' if is_dir else '单文件'}产物")
+
+        log(f"校验基准文件: {target}")
+        verified = {}
+        for entry in info['files']:
+            source = entry.get('source')
+            if source is None or source in verified:
+                continue
+            path = artifact_file(target, source, is_dir)
+            if not os.path.isfile(path):
+                raise DeltaError(f"缺少基准文件: {source}")
+            if file_sha256(path) != entry['source_sha256']:
+                raise DeltaError(f"基准文件校验失败，可能不是生成差分包时的版本: {source}")
+            verified[source] = path
+
+        staging = target + '.delta-new'
+        if os.path.isdir(staging):
+            shutil.rmtree(staging)
+        elif os.path.exists(staging):
+            os.remove(staging)
+        try:
+            for entry in info['files']:
+                dst = staging if not is_dir else artifact_file(staging, entry['path'], True)
+                if is_dir:
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                if entry['action'] in ('keep', 'copy'):
+                    link_or_copy(verified[entry['source']], dst)
+                    if os.path.getsize(dst) != entry['size']:
+                        raise DeltaError(f"文件大小不符: {entry['path']}")
+                    continue
+                data = lzma.decompress(zf.read(entry['data']))
+                if entry['action'] == 'patch':
+                    with open(verified[entry['source']], 'rb') as f:
+                        data = apply_patch(f.read(), data)
+                elif entry['action'] != 'add':
+                    raise DeltaError(f"未知的操作: {entry['action']}")
+                if len(data) != entry['size'] or hashlib.sha256(data).hexdigest() != entry['sha256']:
+                    raise DeltaError(f"生成的文件校验失败: {entry['path']}")
+                with open(dst, 'wb') as f:
+                    f.write(data)
+                if os.name != 'nt':
+                    os.chmod(dst, entry['mode'])
+            if is_dir:
+                known = set(info['base']['files']) | {entry['path'] for entry in info['files']}
+                extra = [(rel_path, full_path) for rel_path, full_path in list_files(target) if rel_path not in known]
+                for rel_path, full_path in extra:
+                    dst = artifact_file(staging, rel_path, True)
+                    os.makedirs(os.path.dirname(dst), exist_ok=True)
+                    link_or_copy(full_path, dst)
+                if extra:
+                    log(f"保留 {len(extra)} 个不属于旧版本的文件（如程序写入的配置和日志）")
+        except Exception:
+            if os.path.isdir(staging):
+                shutil.rmtree(staging, ignore_errors=True)
+            elif os.path.exists(staging):
+                os.remove(staging)
+            raise
+
+    if not is_dir:
+        os.replace(staging, target)
+    else:
+        backup = target + '.delta-old'
+        if os.path.exists(backup):
+            shutil.rmtree(backup)
+        os.rename(target, backup)
+        try:
+            os.rename(staging, target)
+        except OSError:
+            os.rename(backup, target)
+            raise
+        shutil.rmtree(backup, ignore_errors=True)
+    log(f"已更新到 {info['target']['id']}: {len(info['files'])} 个文件")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="生成或应用打包产物的差分更新包")
+    commands = parser.add_subparsers(dest='command', required=True)
+    create = commands.add_parser('create', help="比较新旧两个产物，生成差分包")
+    create.add_argument('base', help="旧版本的产物目录或单文件")
+    create.add_argument('target', help="新版本的产物目录或单文件")
+    create.add_argument('-o', '--output', required=True, help="差分包路径")
+    apply = commands.add_parser('apply', help="把差分包应用到已安装的产物")
+    apply.add_argument('package', help="差分包路径")
+    apply.add_argument('target', help="要更新的产物目录或单文件")
+    args = parser.parse_args(argv)
+    log = lambda message: print(message, flush=True)
+
+    try:
+        if args.command == 'create':
+            base = os.path.abspath(args.base)
+            base_manifest = scan_manifest(base)
+            base_files = {record['sha256']: artifact_file(base, record['path'], os.path.isdir(base))
+                          for record in base_manifest['files']}
+            target = os.path.abspath(args.target)
+            stats = create_delta(base_manifest, base_files.__getitem__, target, scan_manifest(target),
+                                 os.path.abspath(args.output), log)
+            log(f"已生成: {args.output} ({stats['bytes']} 字节)，未变 {stats['keep']}，移动 {stats['copy']}，"
+                f"差分 {stats['patch']}，新增 {stats['add']}")
+        else:
+            apply_delta(args.package, args.target, log)
+    except (DeltaError, OSError, zipfile.BadZipFile, lzma.LZMAError) as e:
+        log(f"失败: {e}")
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
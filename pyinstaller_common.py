@@ -0,0 +1,4120 @@
+import os
+import sys
+import re
+import ast
+import glob
+import json
+import codecs
+import shutil
+import hashlib
+import mmap
+import fnmatch
+import time
+import bisect
+import zipfile
+import signal
+import threading
+import tempfile
+import subprocess
+from array import array
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from PyQt5.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QPushButton,
+    QListWidget, QListWidgetItem, QPlainTextEdit, QSplitter, QCompleter
+)
+from PyQt5.QtCore import (
+    Qt, QObject, QThread, QTimer, QProcess, QProcessEnvironment, QAbstractListModel, QModelIndex,
+    QStringListModel, QSortFilterProxyModel, QFileSystemWatcher, pyqtSignal
+)
+from PyQt5.QtGui import QSyntaxHighlighter, QTextCharFormat, QColor
+from delta_update import create_delta, manifest_id, artifact_file, DeltaError
+
+
+def get_app_data_dir(*parts):
+    """获取程序数据目录（缓存、历史记录等持久化数据），不存在时自动创建"""
+    base = os.environ.get('LOCALAPPDATA') or os.environ.get('XDG_CACHE_HOME')
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.cache')
+    path = os.path.join(base, 'PyInstallerGUI', *parts)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def split_patterns(text):
+    """将逗号分隔的模式字符串拆分为列表"""
+    return [p.strip() for p in text.split(',') if p.strip()]
+
+
+def match_patterns(rel_path, patterns):
+    """判断相对路径或文件名是否匹配任一通配符模式"""
+    name = rel_path.rsplit('/', 1)[-1]
+    for pattern in patterns:
+        if fnmatch.fnmatch(rel_path, pattern) or fnmatch.fnmatch(name, pattern):
+            return True
+    return False
+
+
+# 不小于该大小的文件通过内存映射计算哈希
+MMAP_HASH_MIN_SIZE = 16 * 1024 * 1024
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """分块计算文件的SHA-256；大文件通过内存映射分块读取，省去逐块复制到读缓冲区"""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size >= MMAP_HASH_MIN_SIZE:
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+                    for offset in range(0, size, chunk_size):
+                        sha.update(view[offset:offset + chunk_size])
+                return sha.hexdigest()
+            except (OSError, ValueError):
+                # 无法映射（如特殊文件系统）时按普通方式读取
+                sha = hashlib.sha256()
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_json_atomic(path, data):
+    """先写临时文件再替换，避免中途退出留下损坏的JSON
+
+    临时文件名带进程号和线程号，多个窗口或进程同时写同一个文件时互不干扰。
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}-{threading.get_ident()}"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def read_json(path, default=None):
+    """读取JSON文件，不存在或损坏时返回默认值"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+class DataStager:
+    """附加数据目录的增量暂存区
+
+    暂存区结构:
+        objects/xx/<sha256>      按内容寻址的文件对象，相同内容只保存一份
+        trees/<key>/<目录名>/... 通过硬链接（不支持时复制）指向对象的目录树
+        trees/<key>/manifest.json 记录每个文件的大小、修改时间和哈希
+
+    再次暂存时，大小和修改时间未变的文件直接复用，内容未变的文件不重新复制。
+    """
+
+    def __init__(self, staging_root, includes=None, excludes=None):
+        self.staging_root = staging_root
+        self.objects_dir = os.path.join(staging_root, 'objects')
+        self.trees_dir = os.path.join(staging_root, 'trees')
+        self.includes = includes or []
+        self.excludes = excludes or []
+        self.cancelled = False
+        self.stats = {'files': 0, 'reused': 0, 'copied': 0, 'deduped': 0, 'removed': 0, 'bytes_copied': 0}
+
+    def tree_key(self, src_dir):
+        """根据源目录的绝对路径生成暂存树的键"""
+        norm = os.path.normcase(os.path.abspath(src_dir))
+        return hashlib.sha1(norm.encode('utf-8')).hexdigest()[:16]
+
+    def walk(self, src_dir):
+        """遍历源目录，按包含/排除模式过滤，生成 (相对路径, 绝对路径, stat)"""
+        stack = ['']
+        while stack:
+            rel_dir = stack.pop()
+            try:
+                it = os.scandir(os.path.join(src_dir, rel_dir) if rel_dir else src_dir)
+            except OSError:
+                continue
+            with it:
+                for entry in it:
+                    rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                    if self.excludes and match_patterns(rel_path, self.excludes):
+                        continue
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(rel_path)
+                        elif entry.is_file():
+                            if self.includes and not match_patterns(rel_path, self.includes):
+                                continue
+                            yield rel_path, entry.path, entry.stat()
+                    except OSError:
+                        continue
+
+    def stage_directory(self, src_dir, progress=None):
+        """暂存单个目录，返回可传给 --add-data 的暂存目录路径"""
+        key = self.tree_key(src_dir)
+        tree_root = os.path.join(self.trees_dir, key)
+        staged_dir = os.path.join(tree_root, os.path.basename(os.path.normpath(src_dir)))
+        manifest_path = os.path.join(tree_root, 'manifest.json')
+        os.makedirs(staged_dir, exist_ok=True)
+
+        old_manifest = read_json(manifest_path, {})
+        new_manifest = {}
+
+        for rel_path, abs_path, st in self.walk(src_dir):
+            if self.cancelled:
+                break
+            self.stats['files'] += 1
+            dst = os.path.join(staged_dir, *rel_path.split('/'))
+            old = old_manifest.get(rel_path)
+
+            # 大小和修改时间都未变，直接复用
+            if old and old[0] == st.st_size and old[1] == st.st_mtime_ns and os.path.exists(dst):
+                new_manifest[rel_path] = old
+                self.stats['reused'] += 1
+            else:
+                digest = hash_file(abs_path)
+                if not (old and old[2] == digest and os.path.exists(dst)):
+                    obj_path = self.store_object(abs_path, digest, st.st_size)
+                    self.link_object(obj_path, dst)
+                else:
+                    self.stats['reused'] += 1
+                new_manifest[rel_path] = [st.st_size, st.st_mtime_ns, digest]
+
+            if progress and self.stats['files'] % 500 == 0:
+                progress(f"已暂存 {self.stats['files']} 个文件 (复制 {self.stats['copied']}, 复用 {self.stats['reused']})")
+
+        if self.cancelled:
+            # 取消时保留尚未处理的旧记录，下次继续增量暂存
+            for rel_path, record in old_manifest.items():
+                new_manifest.setdefault(rel_path, record)
+        else:
+            # 删除源目录中已不存在或被排除的文件
+            for rel_path in old_manifest.keys() - new_manifest.keys():
+                try:
+                    os.remove(os.path.join(staged_dir, *rel_path.split('/')))
+                    self.stats['removed'] += 1
+                except OSError:
+                    pass
+            if self.stats['removed']:
+                self.remove_empty_dirs(staged_dir)
+
+        write_json_atomic(manifest_path, new_manifest)
+        return staged_dir
+
+    def store_object(self, src_path, digest, size):
+        """将文件内容存入对象库，已存在相同内容时直接复用"""
+        obj_dir = os.path.join(self.objects_dir, digest[:2])
+        obj_path = os.path.join(obj_dir, digest)
+        if os.path.exists(obj_path):
+            self.stats['deduped'] += 1
+            return obj_path
+        os.makedirs(obj_dir, exist_ok=True)
+        tmp_path = obj_path + '.tmp'
+        shutil.copyfile(src_path, tmp_path)
+        os.replace(tmp_path, obj_path)
+        self.stats['copied'] += 1
+        self.stats['bytes_copied'] += size
+        return obj_path
+
+    def link_object(self, obj_path, dst):
+        """在暂存树中创建指向对象的硬链接，不支持硬链接时退回复制"""
+        os.makedirs(os.path.dirname(dst), exist_ok=True)
+        if os.path.lexists(dst):
+            os.remove(dst)
+        try:
+            os.link(obj_path, dst)
+        except OSError:
+            shutil.copyfile(obj_path, dst)
+
+    def remove_empty_dirs(self, root):
+        """自底向上删除空目录"""
+        for dirpath, dirnames, filenames in os.walk(root, topdown=False):
+            # 不检查 dirnames：自底向上遍历时它仍列出刚被删除的子目录，
+            # 非空目录交给 rmdir 失败跳过即可
+            if dirpath != root and not filenames:
+                try:
+                    os.rmdir(dirpath)
+                except OSError:
+                    pass
+
+    def prune_objects(self):
+        """删除不再被任何暂存树引用的对象，返回删除数量"""
+        referenced = set()
+        if os.path.isdir(self.trees_dir):
+            for key in os.listdir(self.trees_dir):
+                manifest = read_json(os.path.join(self.trees_dir, key, 'manifest.json'), {})
+                referenced.update(record[2] for record in manifest.values())
+
+        removed = 0
+        if os.path.isdir(self.objects_dir):
+            for prefix in os.listdir(self.objects_dir):
+                prefix_dir = os.path.join(self.objects_dir, prefix)
+                for name in os.listdir(prefix_dir):
+                    if name not in referenced:
+                        try:
+                            os.remove(os.path.join(prefix_dir, name))
+                            removed += 1
+                        except OSError:
+                            pass
+        return removed
+
+
+class StagingThread(QThread):
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+    staged_updated = pyqtSignal(dict)  # 源目录 -> 暂存目录
+
+    def __init__(self, directories, includes=None, excludes=None, staging_root=None):
+        super().__init__()
+        self.directories = directories
+        self.stager = DataStager(staging_root or get_app_data_dir('staging'), includes, excludes)
+
+    def cancel(self):
+        """请求取消暂存，当前文件处理完后退出"""
+        self.stager.cancelled = True
+
+    def run(self):
+        """后台增量暂存附加数据目录"""
+        staged = {}
+        try:
+            for src_dir in self.directories:
+                self.progress_updated.emit(f"正在暂存目录: {src_dir}", "info")
+                staged[src_dir] = self.stager.stage_directory(
+                    src_dir, lambda msg: self.progress_updated.emit(msg, "info"))
+                if self.stager.cancelled:
+                    self.finished.emit(False, "暂存已取消")
+                    return
+
+            pruned = self.stager.prune_objects()
+            stats = self.stager.stats
+            self.progress_updated.emit(
+                f"暂存完成: 共 {stats['files']} 个文件，复用 {stats['reused']}，新复制 {stats['copied']} "
+                f"({stats['bytes_copied'] / 1024 / 1024:.1f} MB)，去重 {stats['deduped']}，"
+                f"删除 {stats['removed']}，清理对象 {pruned}", "success")
+            self.staged_updated.emit(staged)
+            self.finished.emit(True, "暂存成功")
+        except Exception as e:
+            self.progress_updated.emit(f"暂存附加数据失败: {str(e)}", "error")
+            self.finished.emit(False, f"暂存附加数据失败: {str(e)}")
+
+
+def format_size(size):
+    """将字节数格式化为易读的大小"""
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f"{size:.0f} {unit}" if unit == 'B' else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+# 通常不应被打包的目录名
+SUSPICIOUS_DIR_NAMES = {'.git', '.svn', '.hg', 'node_modules', '__pycache__', '.venv', 'venv',
+                        '.idea', '.vscode', '.pytest_cache', '.mypy_cache', '.tox', 'build', 'dist'}
+
+
+def scan_directory(path, is_cancelled=None, progress=None, top_count=5):
+    """流式扫描目录，统计总大小、文件数和最大的子目录
+
+    返回字典: total_size, file_count, dir_count, subtrees（[名称, 大小, 文件数]，按大小降序），
+    suspicious（可疑目录的相对路径）, dir_mtimes（每个目录的修改时间，用于判断缓存是否失效）。
+    取消时返回 None。
+    """
+    result = {'total_size': 0, 'file_count': 0, 'dir_count': 0, 'subtrees': [], 'suspicious': [], 'dir_mtimes': {}}
+    subtrees = {}
+    stack = [('', None)]
+    while stack:
+        if is_cancelled and is_cancelled():
+            return None
+        rel_dir, top = stack.pop()
+        dir_path = os.path.join(path, rel_dir) if rel_dir else path
+        try:
+            result['dir_mtimes'][rel_dir] = os.stat(dir_path).st_mtime_ns
+            it = os.scandir(dir_path)
+        except OSError:
+            continue
+        with it:
+            for entry in it:
+                rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        result['dir_count'] += 1
+                        if entry.name in SUSPICIOUS_DIR_NAMES:
+                            result['suspicious'].append(rel_path)
+                        stack.append((rel_path, top or entry.name))
+                    elif entry.is_file(follow_symlinks=False):
+                        size = entry.stat(follow_symlinks=False).st_size
+                        result['total_size'] += size
+                        result['file_count'] += 1
+                        bucket = subtrees.setdefault(top or '(根目录文件)', [0, 0])
+                        bucket[0] += size
+                        bucket[1] += 1
+                        if progress and result['file_count'] % 2000 == 0:
+                            progress(result['total_size'], result['file_count'])
+                except OSError:
+                    continue
+
+    ordered = sorted(subtrees.items(), key=lambda item: item[1][0], reverse=True)
+    result['subtrees'] = [[name, size, count] for name, (size, count) in ordered[:top_count]]
+    return result
+
+
+class ScanCache:
+    """目录扫描结果缓存，任一目录的修改时间变化即视为失效"""
+
+    def __init__(self, cache_path=None):
+        self.cache_path = cache_path or os.path.join(get_app_data_dir(), 'scan_cache.json')
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def load(self):
+        """首次使用时才读取缓存文件，避免拖慢启动"""
+        if self.entries is None:
+            self.entries = read_json(self.cache_path, {})
+
+    def get(self, path):
+        """返回仍然有效的缓存结果，失效或不存在时返回 None"""
+        key = os.path.normcase(os.path.abspath(path))
+        with self.lock:
+            self.load()
+            result = self.entries.get(key)
+        if not result:
+            return None
+        for rel_dir, mtime in result['dir_mtimes'].items():
+            try:
+                if os.stat(os.path.join(path, rel_dir) if rel_dir else path).st_mtime_ns != mtime:
+                    return None
+            except OSError:
+                return None
+        return result
+
+    def put(self, path, result):
+        """保存扫描结果并写回磁盘"""
+        key = os.path.normcase(os.path.abspath(path))
+        with self.lock:
+            self.load()
+            self.entries[key] = result
+            try:
+                write_json_atomic(self.cache_path, self.entries)
+            except OSError:
+                pass
+
+
+class DirectoryScanThread(QThread):
+    # 信号定义
+    progress_updated = pyqtSignal(str, int, int)  # 目录, 已统计大小, 已统计文件数
+    scan_updated = pyqtSignal(str, dict)  # 目录, 扫描结果
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    def __init__(self, path, cache):
+        super().__init__()
+        self.path = path
+        self.cache = cache
+        self.cancelled = False
+
+    def cancel(self):
+        """请求取消扫描"""
+        self.cancelled = True
+
+    def run(self):
+        """后台扫描目录，优先使用仍然有效的缓存"""
+        try:
+            result = self.cache.get(self.path)
+            if result is None:
+                result = scan_directory(
+                    self.path,
+                    lambda: self.cancelled,
+                    lambda size, count: self.progress_updated.emit(self.path, size, count)
+                )
+                if result is None:
+                    self.finished.emit(False, "扫描已取消")
+                    return
+                self.cache.put(self.path, result)
+            self.scan_updated.emit(self.path, result)
+            self.finished.emit(True, "扫描完成")
+        except Exception as e:
+            self.finished.emit(False, f"扫描目录失败: {str(e)}")
+
+
+# 日志级别与颜色，info 使用文本框默认颜色以适配深色/浅色模式
+LOG_LEVELS = ["info", "success", "warning", "error", "debug"]
+LOG_COLORS = {
+    "success": "#4CAF50",
+    "warning": "#FF9800",
+    "error": "#F44336",
+    "debug": "#2196F3"
+}
+
+
+# PyInstaller 日志格式为 "123 INFO: ..."，pip 为 "ERROR: ..."
+LOG_LINE_PATTERN = re.compile(r'^(?:\d+ )?(DEBUG|INFO|WARNING|WARN|ERROR|CRITICAL|FATAL)\b:?')
+SUCCESS_LINE_PATTERN = re.compile(r'completed successfully|^Successfully (?:installed|built)')
+
+
+def classify_line(line):
+    """根据子进程输出行的内容判断日志级别"""
+    match = LOG_LINE_PATTERN.match(line)
+    if match:
+        tag = match.group(1)
+        if tag in ('ERROR', 'CRITICAL', 'FATAL'):
+            return "error"
+        if tag in ('WARNING', 'WARN'):
+            return "warning"
+    if line.startswith('Traceback (most recent call last)'):
+        return "error"
+    if SUCCESS_LINE_PATTERN.search(line):
+        return "success"
+    return "debug"
+
+
+class OutputDecoder:
+    """子进程输出的增量解码器
+
+    按UTF-8增量解码，多字节字符被拆到两个数据块时不会产生乱码；
+    只输出完整的行，用回车符重绘的进度条只保留最后一次内容；
+    每行在解码时分类一次，并统计各级别数量和最近的错误行。
+    """
+
+    def __init__(self, encoding='utf-8', max_error_lines=20):
+        self.decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+        self.buffer = ''
+        self.counts = {level: 0 for level in LOG_LEVELS}
+        self.error_lines = deque(maxlen=max_error_lines)
+
+    def feed(self, data):
+        """输入一个数据块，返回其中完整的 (行, 级别) 列表"""
+        return self.split_lines(self.decoder.decode(data))
+
+    def flush(self):
+        """进程结束时输出剩余内容"""
+        lines = self.split_lines(self.decoder.decode(b'', final=True))
+        if self.buffer:
+            lines.append(self.make_line(self.buffer))
+            self.buffer = ''
+        return lines
+
+    def split_lines(self, text):
+        if not text:
+            return []
+        self.buffer += text
+        parts = self.buffer.split('\n')
+        self.buffer = parts.pop()
+        # 未结束的行中已被回车覆盖的部分直接丢弃，避免进度条撑大缓冲区
+        cr_pos = self.buffer.rfind('\r', 0, len(self.buffer) - 1)
+        if cr_pos >= 0:
+            self.buffer = self.buffer[cr_pos + 1:]
+        return [self.make_line(part) for part in parts]
+
+    def make_line(self, raw):
+        raw = raw.rstrip('\r')
+        if '\r' in raw:
+            raw = raw.rsplit('\r', 1)[1]
+        level = classify_line(raw)
+        self.counts[level] += 1
+        if level == "error":
+            self.error_lines.append(raw)
+        return raw, level
+
+
+class LogHighlighter(QSyntaxHighlighter):
+    """按日志级别为整行着色，级别保存在文本块的 userState 中"""
+
+    def __init__(self, document):
+        super().__init__(document)
+        self.pending_level = 0
+        self.formats = {}
+        for level, color in LOG_COLORS.items():
+            fmt = QTextCharFormat()
+            fmt.setForeground(QColor(color))
+            self.formats[LOG_LEVELS.index(level)] = fmt
+
+    def highlightBlock(self, text):
+        state = self.currentBlockState()
+        if state < 0:
+            # 新插入的文本块，记录插入时的级别
+            state = self.pending_level
+            self.setCurrentBlockState(state)
+        fmt = self.formats.get(state)
+        if fmt is not None:
+            self.setFormat(0, len(text), fmt)
+
+
+class LogView(QPlainTextEdit):
+    """批量刷新的纯文本日志视图
+
+    追加的日志先进入缓冲区，由定时器按固定帧率（默认约60帧/秒）批量写入，
+    单帧写入行数有上限以保证界面流畅；文本块数量超过上限时自动丢弃最早的行。
+    """
+
+    def __init__(self, max_lines=20000, flush_interval=16, lines_per_flush=500, parent=None):
+        super().__init__(parent)
+        self.setReadOnly(True)
+        self.setUndoRedoEnabled(False)
+        self.setMaximumBlockCount(max_lines)
+        self.max_lines = max_lines
+        self.lines_per_flush = lines_per_flush
+        self.pending = deque(maxlen=max_lines)
+        self.highlighter = LogHighlighter(self.document())
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(flush_interval)
+        self.flush_timer.timeout.connect(self.flush)
+
+    def append_message(self, message, level="info"):
+        """添加一条日志，多行文本按行拆分"""
+        level_code = LOG_LEVELS.index(level) if level in LOG_LEVELS else 0
+        for line in message.replace('\r\n', '\n').split('\n'):
+            self.pending.append((level_code, line))
+        if not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def append_lines(self, lines):
+        """批量添加已分类的 (行, 级别) 列表"""
+        for line, level in lines:
+            self.pending.append((LOG_LEVELS.index(level) if level in LOG_LEVELS else 0, line))
+        if lines and not self.flush_timer.isActive():
+            self.flush_timer.start()
+
+    def flush(self):
+        """将缓冲区中的日志一次性写入文本框"""
+        if not self.pending:
+            self.flush_timer.stop()
+            return
+
+        scrollbar = self.verticalScrollBar()
+        at_bottom = scrollbar.value() >= scrollbar.maximum() - 2
+
+        # 相同级别的连续行合并为一次插入，每帧最多写入 lines_per_flush 行
+        batch = []
+        batch_level = self.pending[0][0]
+        for _ in range(min(len(self.pending), self.lines_per_flush)):
+            level_code, line = self.pending.popleft()
+            if level_code != batch_level:
+                self.write_batch(batch_level, batch)
+                batch = []
+                batch_level = level_code
+            batch.append(line)
+        self.write_batch(batch_level, batch)
+
+        if at_bottom:
+            scrollbar.setValue(scrollbar.maximum())
+
+    def write_batch(self, level_code, lines):
+        """以指定级别追加多行文本"""
+        if lines:
+            self.highlighter.pending_level = level_code
+            self.appendPlainText('\n'.join(lines))
+
+    def clear(self):
+        """清空日志和缓冲区"""
+        self.pending.clear()
+        super().clear()
+
+
+class JobLog:
+    """单个任务的日志文件，按大小分段轮转，并为每段维护行偏移索引
+
+    每段由 <任务ID>.<序号>.log 和 <任务ID>.<序号>.idx 组成，
+    索引是每行起始字节偏移组成的 uint64 数组，用于按行号快速定位。
+    """
+
+    def __init__(self, store, job_id):
+        self.store = store
+        self.job_id = job_id
+        self.segment = -1
+        self.log_file = None
+        self.idx_file = None
+        self.size = 0
+        self.pending_offsets = array('Q')
+        self.partial = b''
+        self.closed = False
+        self.open_segment()
+
+    def segment_paths(self, segment):
+        base = os.path.join(self.store.log_dir, f"{self.job_id}.{segment}")
+        return base + '.log', base + '.idx'
+
+    def open_segment(self):
+        """开启新的日志段，超出段数上限时删除最早的段"""
+        self.close_files()
+        self.segment += 1
+        log_path, idx_path = self.segment_paths(self.segment)
+        self.log_file = open(log_path, 'ab')
+        self.idx_file = open(idx_path, 'ab')
+        self.size = 0
+        old_segment = self.segment - self.store.max_segments
+        if old_segment >= 0:
+            for path in self.segment_paths(old_segment):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        self.store.update_job(self.job_id, first_segment=max(0, old_segment + 1), last_segment=self.segment)
+
+    def write(self, text):
+        """写入一段输出文本，按行记录偏移"""
+        data = self.partial + text.replace('\r\n', '\n').encode('utf-8', errors='replace')
+        lines = data.split(b'\n')
+        self.partial = lines.pop()
+        for line in lines:
+            if self.size >= self.store.max_segment_bytes:
+                self.open_segment()
+            self.pending_offsets.append(self.size)
+            self.log_file.write(line + b'\n')
+            self.size += len(line) + 1
+
+    def write_line(self, text):
+        """写入一整行"""
+        self.write(text + '\n')
+
+    def flush(self):
+        """将缓冲的内容和索引写入磁盘"""
+        if self.log_file:
+            self.log_file.flush()
+            self.pending_offsets.tofile(self.idx_file)
+            self.pending_offsets = array('Q')
+            self.idx_file.flush()
+
+    def close_files(self):
+        if self.log_file:
+            self.flush()
+            self.log_file.close()
+            self.idx_file.close()
+            self.log_file = None
+            self.idx_file = None
+
+    def close(self, exit_code=None):
+        """结束任务，补全最后一行并记录退出码，重复调用时忽略"""
+        if self.closed:
+            return
+        self.closed = True
+        if self.partial:
+            self.write('\n')
+        self.close_files()
+        self.store.finish_job(self, exit_code)
+
+
+class BuildLogStore:
+    """打包和pip任务的磁盘日志库
+
+    每个任务的输出以追加方式写入独立的日志文件，jobs.json 记录任务列表，
+    超过保留数量的旧任务会被删除。同一进程中的打包器和Spec编辑器通过 instance() 共用一个日志库；
+    多个进程共用 jobs.json，写入时在 jobs.lock 上加锁，重新读取后只合并本进程改动的任务。
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls()
+        return cls._instance
+
+    def __init__(self, log_dir=None, max_jobs=200, max_segment_bytes=8 * 1024 * 1024, max_segments=8):
+        self.log_dir = log_dir or get_app_data_dir('logs')
+        os.makedirs(self.log_dir, exist_ok=True)
+        self.jobs_path = os.path.join(self.log_dir, 'jobs.json')
+        self.lock_path = os.path.join(self.log_dir, 'jobs.lock')
+        self.max_jobs = max_jobs
+        self.max_segment_bytes = max_segment_bytes
+        self.max_segments = max_segments
+        self.lock = threading.Lock()
+        self.jobs = read_json(self.jobs_path, [])
+        # 本进程新建或修改、尚未写入 jobs.json 的任务
+        self.dirty = {}
+        self.open_jobs = {}
+        self.job_counter = 0
+
+    def start_job(self, kind, title):
+        """创建新的任务日志"""
+        self.job_counter += 1
+        job_id = time.strftime('%Y%m%d-%H%M%S') + f"-{os.getpid()}-{self.job_counter}"
+        job = {'id': job_id, 'kind': kind, 'title': title, 'start': time.time(),
+               'end': None, 'exit_code': None, 'first_segment': 0, 'last_segment': 0}
+        with self.lock:
+            self.jobs.append(job)
+            self.dirty[job_id] = job
+            self.save()
+        job_log = JobLog(self, job_id)
+        self.open_jobs[job_id] = job_log
+        return job_log
+
+    def update_job(self, job_id, **fields):
+        with self.lock:
+            for job in self.jobs:
+                if job['id'] == job_id:
+                    job.update(fields)
+                    self.dirty[job_id] = job
+                    break
+            self.save()
+
+    def finish_job(self, job_log, exit_code):
+        self.open_jobs.pop(job_log.job_id, None)
+        self.update_job(job_log.job_id, end=time.time(), exit_code=exit_code)
+
+    @contextmanager
+    def index_locked(self):
+        """独占 jobs.json，其他进程写入期间短暂等待"""
+        with open(self.lock_path, 'a+') as lock_file:
+            deadline = time.monotonic() + 5
+            while True:
+                try:
+                    lock_file_nonblocking(lock_file)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+            yield
+
+    def merge_jobs(self):
+        """重新读取 jobs.json 并合并本进程改动的任务，返回超出保留数量被移除的任务（调用时持有 self.lock）"""
+        jobs = {job['id']: job for job in read_json(self.jobs_path, [])}
+        jobs.update(self.dirty)
+        merged = sorted(jobs.values(), key=lambda job: job['start'])
+        expired = merged[:-self.max_jobs] if len(merged) > self.max_jobs else []
+        self.jobs = merged[len(expired):]
+        return expired
+
+    def save(self):
+        """合并其他进程的任务后写入 jobs.json（调用时持有 self.lock）"""
+        try:
+            with self.index_locked():
+                expired = self.merge_jobs()
+                write_json_atomic(self.jobs_path, self.jobs)
+        except OSError:
+            return
+        self.dirty.clear()
+        for job in expired:
+            self.delete_job_files(job)
+
+    def delete_job_files(self, job):
+        for segment in range(job['first_segment'], job['last_segment'] + 1):
+            for ext in ('.log', '.idx'):
+                try:
+                    os.remove(os.path.join(self.log_dir, f"{job['id']}.{segment}{ext}"))
+                except OSError:
+                    pass
+
+    def flush_all(self):
+        """刷新所有进行中的任务，使搜索能看到最新输出"""
+        for job_log in list(self.open_jobs.values()):
+            job_log.flush()
+
+    def list_jobs(self):
+        """所有进程的任务，包括其他打包器进程新增的任务"""
+        with self.lock:
+            self.jobs = [self.dirty.get(job['id'], job) for job in read_json(self.jobs_path, self.jobs)]
+            known = {job['id'] for job in self.jobs}
+            self.jobs.extend(job for job_id, job in self.dirty.items() if job_id not in known)
+            return [dict(job) for job in self.jobs]
+
+    def load_index(self, job_id, segment):
+        index = array('Q')
+        idx_path = os.path.join(self.log_dir, f"{job_id}.{segment}.idx")
+        try:
+            with open(idx_path, 'rb') as f:
+                index.frombytes(f.read())
+        except OSError:
+            pass
+        return index
+
+    def read_lines(self, job_id, segment, start_line, count):
+        """通过索引读取指定行范围，不需要加载整个文件"""
+        index = self.load_index(job_id, segment)
+        if start_line >= len(index):
+            return []
+        start_line = max(0, start_line)
+        end_line = min(len(index), start_line + count)
+        log_path = os.path.join(self.log_dir, f"{job_id}.{segment}.log")
+        with open(log_path, 'rb') as f:
+            f.seek(index[start_line])
+            if end_line < len(index):
+                data = f.read(index[end_line] - index[start_line])
+            else:
+                data = f.read()
+        return data.decode('utf-8', errors='replace').split('\n')[:end_line - start_line]
+
+    def search(self, query, is_cancelled=None, limit=1000):
+        """在历史日志中搜索（不区分大小写），生成 (任务, 段号, 行号, 行内容)"""
+        needle = query.lower().encode('utf-8')
+        if not needle:
+            return
+        found = 0
+        for job in reversed(self.list_jobs()):
+            for segment in range(job['first_segment'], job['last_segment'] + 1):
+                if is_cancelled and is_cancelled():
+                    return
+                log_path = os.path.join(self.log_dir, f"{job['id']}.{segment}.log")
+                try:
+                    with open(log_path, 'rb') as f:
+                        data = f.read()
+                except OSError:
+                    continue
+                haystack = data.lower()
+                index = None
+                pos = haystack.find(needle)
+                while pos >= 0:
+                    if index is None:
+                        index = self.load_index(job['id'], segment)
+                    line_no = bisect.bisect_right(index, pos) - 1
+                    line_start = index[line_no] if line_no >= 0 else 0
+                    line_end = data.find(b'\n', pos)
+                    if line_end < 0:
+                        line_end = len(data)
+                    yield job, segment, line_no, data[line_start:line_end].decode('utf-8', errors='replace')
+                    found += 1
+                    if found >= limit:
+                        return
+                    pos = haystack.find(needle, line_end)
+
+
+class LogSearchThread(QThread):
+    # 信号定义
+    result_found = pyqtSignal(dict, int, int, str)  # 任务, 段号, 行号, 行内容
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    def __init__(self, store, query):
+        super().__init__()
+        self.store = store
+        self.query = query
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        """后台搜索历史日志"""
+        try:
+            count = 0
+            for job, segment, line_no, text in self.store.search(self.query, lambda: self.cancelled):
+                self.result_found.emit(job, segment, line_no, text)
+                count += 1
+            self.finished.emit(True, f"共找到 {count} 条结果")
+        except Exception as e:
+            self.finished.emit(False, f"搜索日志失败: {str(e)}")
+
+
+class LogSearchDialog(QDialog):
+    """历史日志搜索窗口，选中结果后通过索引读取上下文"""
+
+    def __init__(self, store, query="", parent=None):
+        super().__init__(parent)
+        self.store = store
+        self.search_thread = None
+        self.setWindowTitle("搜索历史日志")
+        self.resize(900, 600)
+
+        layout = QVBoxLayout(self)
+        search_layout = QHBoxLayout()
+        self.query_edit = QLineEdit(query)
+        self.query_edit.setPlaceholderText("输入要搜索的文本")
+        self.query_edit.returnPressed.connect(self.start_search)
+        search_layout.addWidget(self.query_edit)
+        search_btn = QPushButton("搜索")
+        search_btn.clicked.connect(self.start_search)
+        search_layout.addWidget(search_btn)
+        layout.addLayout(search_layout)
+
+        self.status_label = QLabel("")
+        layout.addWidget(self.status_label)
+
+        splitter = QSplitter(Qt.Vertical)
+        self.results_list = QListWidget()
+        self.results_list.currentItemChanged.connect(self.show_context)
+        splitter.addWidget(self.results_list)
+        self.context_view = QPlainTextEdit()
+        self.context_view.setReadOnly(True)
+        splitter.addWidget(self.context_view)
+        layout.addWidget(splitter)
+
+        if query:
+            self.start_search()
+
+    def start_search(self):
+        """开始新的搜索"""
+        if self.search_thread and self.search_thread.isRunning():
+            self.search_thread.cancel()
+            self.search_thread.wait()
+        self.results_list.clear()
+        self.context_view.clear()
+        query = self.query_edit.text().strip()
+        if not query:
+            return
+        self.store.flush_all()
+        self.status_label.setText("正在搜索...")
+        self.search_thread = LogSearchThread(self.store, query)
+        self.search_thread.result_found.connect(self.add_result)
+        self.search_thread.finished.connect(lambda success, message: self.status_label.setText(message))
+        self.search_thread.start()
+
+    def add_result(self, job, segment, line_no, text):
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(job['start']))
+        item = QListWidgetItem(f"[{started}] {job['title']} 第{line_no + 1}行: {text.strip()}")
+        item.setData(Qt.UserRole, (job['id'], segment, line_no))
+        self.results_list.addItem(item)
+
+    def show_context(self, item, previous=None):
+        """显示选中结果前后的日志行"""
+        if not item:
+            return
+        job_id, segment, line_no = item.data(Qt.UserRole)
+        start = max(0, line_no - 20)
+        lines = self.store.read_lines(job_id, segment, start, 41)
+        self.context_view.setPlainText('\n'.join(
+            f"{'>>' if start + i == line_no else '  '} {start + i + 1:6d}  {line}" for i, line in enumerate(lines)))
+
+    def closeEvent(self, event):
+        if self.search_thread and self.search_thread.isRunning():
+            self.search_thread.cancel()
+            self.search_thread.wait()
+        super().closeEvent(event)
+
+
+# PyInstaller 打包阶段：(标识, 名称, 进入该阶段的日志特征)
+BUILD_PHASES = [
+    ('startup', '启动', None),
+    ('analysis', '分析依赖', re.compile(r'Running Analysis|Building Analysis')),
+    ('binaries', '收集二进制文件', re.compile(r'Looking for dynamic libraries')),
+    ('pyz', '生成PYZ归档', re.compile(r'Building PYZ')),
+    ('pkg', '生成PKG归档', re.compile(r'Building PKG')),
+    ('exe', '生成可执行文件', re.compile(r'Building EXE')),
+    ('collect', '收集输出目录', re.compile(r'Building COLLECT')),
+]
+PHASE_NAMES = {key: name for key, name, pattern in BUILD_PHASES}
+
+
+def format_duration(seconds):
+    """将秒数格式化为 mm:ss 或 h:mm:ss"""
+    seconds = int(max(0, seconds))
+    minutes, secs = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{secs:02d}" if hours else f"{minutes:02d}:{secs:02d}"
+
+
+def median(values):
+    ordered = sorted(values)
+    mid = len(ordered) // 2
+    return ordered[mid] if len(ordered) % 2 else (ordered[mid - 1] + ordered[mid]) / 2
+
+
+class BuildHistory:
+    """按项目和选项记录每次成功打包的各阶段耗时"""
+
+    def __init__(self, history_path=None, max_runs=20):
+        self.history_path = history_path or os.path.join(get_app_data_dir(), 'build_history.json')
+        self.max_runs = max_runs
+        self.data = read_json(self.history_path, {})
+
+    @staticmethod
+    def make_keys(source_file, options):
+        """项目键为脚本路径，选项键为打包参数的哈希"""
+        project = os.path.normcase(os.path.abspath(source_file))
+        option_key = hashlib.sha1('\0'.join(options).encode('utf-8')).hexdigest()[:16]
+        return project, option_key
+
+    def record(self, project, option_key, phases, total):
+        runs = self.data.setdefault(project, {}).setdefault(option_key, [])
+        runs.append({'time': time.time(), 'total': total, 'phases': phases})
+        del runs[:-self.max_runs]
+        try:
+            write_json_atomic(self.history_path, self.data)
+        except OSError:
+            pass
+
+    def estimate(self, project, option_key):
+        """返回各阶段耗时的中位数；没有相同选项的记录时使用该项目的全部记录"""
+        options = self.data.get(project, {})
+        runs = options.get(option_key) or [run for runs in options.values() for run in runs]
+        if not runs:
+            return None
+        estimate = {}
+        for key, name, pattern in BUILD_PHASES:
+            values = [run['phases'][key] for run in runs if key in run['phases']]
+            if values:
+                estimate[key] = median(values)
+        estimate['total'] = median([run['total'] for run in runs])
+        estimate['runs'] = len(runs)
+        return estimate
+
+
+class BuildProgressTracker:
+    """根据打包输出识别当前阶段，结合历史耗时计算剩余时间"""
+
+    def __init__(self, estimate=None):
+        self.estimate = estimate
+        self.start_time = time.monotonic()
+        self.phase_index = 0
+        self.phase_start = self.start_time
+        self.durations = {}
+        self.slow_warned = False
+
+    @property
+    def phase(self):
+        return BUILD_PHASES[self.phase_index][0]
+
+    def feed_line(self, line):
+        """处理一行输出，进入新阶段时返回阶段标识"""
+        for index in range(self.phase_index + 1, len(BUILD_PHASES)):
+            if BUILD_PHASES[index][2].search(line):
+                now = time.monotonic()
+                self.durations[self.phase] = self.durations.get(self.phase, 0) + now - self.phase_start
+                self.phase_index = index
+                self.phase_start = now
+                return self.phase
+        return None
+
+    def finish(self):
+        """结束计时，返回 (各阶段耗时, 总耗时)"""
+        now = time.monotonic()
+        self.durations[self.phase] = self.durations.get(self.phase, 0) + now - self.phase_start
+        self.phase_start = now
+        return dict(self.durations), now - self.start_time
+
+    def elapsed(self):
+        return time.monotonic() - self.start_time
+
+    def remaining(self):
+        """预计剩余秒数，没有历史记录时返回 None"""
+        if not self.estimate:
+            return None
+        in_phase = time.monotonic() - self.phase_start
+        remaining = max(self.estimate.get(self.phase, 0) - in_phase, 0)
+        for key, name, pattern in BUILD_PHASES[self.phase_index + 1:]:
+            remaining += self.estimate.get(key, 0)
+        return remaining
+
+    def is_slow(self, factor=1.5, margin=10):
+        """本次已用时间明显超过历史总耗时"""
+        return bool(self.estimate) and self.elapsed() > self.estimate['total'] * factor + margin
+
+    def regressions(self, durations, total, factor=1.5, margin=5):
+        """与历史中位数相比明显变慢的阶段说明列表"""
+        if not self.estimate:
+            return []
+        messages = []
+        for key, seconds in durations.items():
+            expected = self.estimate.get(key)
+            if expected is not None and seconds > expected * factor + margin:
+                messages.append(f"{PHASE_NAMES[key]}: {format_duration(seconds)}（历史中位数 {format_duration(expected)}）")
+        if total > self.estimate['total'] * factor + margin:
+            messages.append(f"总耗时: {format_duration(total)}（历史中位数 {format_duration(self.estimate['total'])}）")
+        return messages
+
+
+class StringListModel(QAbstractListModel):
+    """以哈希集合为索引的字符串列表模型
+
+    成员判断和按文本查找行号为 O(1)，批量插入和删除只触发一次模型更新；
+    除显示文本外，可为每一项设置提示、颜色等附加数据。模型保持添加顺序，排序显示使用 sorted_view()。
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.items = []
+        self.item_set = set()
+        self.item_data = {}
+        # 文本 -> 行号，删除后行号整体变化，置为 None，下次查找时重建
+        self.row_map = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.items)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        text = self.items[index.row()]
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            return text
+        return self.item_data.get(text, {}).get(role)
+
+    def __contains__(self, text):
+        return text in self.item_set
+
+    def __len__(self):
+        return len(self.items)
+
+    def __iter__(self):
+        return iter(list(self.items))
+
+    def add(self, text):
+        """添加一项，已存在时返回 False"""
+        return self.add_many([text]) == 1
+
+    def add_many(self, texts):
+        """批量添加，跳过空值和重复项，返回实际添加的数量"""
+        new_items = []
+        for text in texts:
+            if text and text not in self.item_set:
+                self.item_set.add(text)
+                new_items.append(text)
+        if new_items:
+            start = len(self.items)
+            self.beginInsertRows(QModelIndex(), start, start + len(new_items) - 1)
+            self.items.extend(new_items)
+            if self.row_map is not None:
+                # 追加在末尾，已有的行号不变
+                self.row_map.update((text, start + offset) for offset, text in enumerate(new_items))
+            self.endInsertRows()
+        return len(new_items)
+
+    def remove_rows(self, rows):
+        """批量删除指定行，连续的行合并为一次删除，返回被删除的文本"""
+        removed = []
+        rows = sorted(set(rows), reverse=True)
+        if rows:
+            self.row_map = None
+        while rows:
+            end = start = rows.pop(0)
+            while rows and rows[0] == start - 1:
+                start = rows.pop(0)
+            self.beginRemoveRows(QModelIndex(), start, end)
+            for text in self.items[start:end + 1]:
+                self.item_set.discard(text)
+                self.item_data.pop(text, None)
+                removed.append(text)
+            del self.items[start:end + 1]
+            self.endRemoveRows()
+        return removed
+
+    def clear(self):
+        self.beginResetModel()
+        self.items = []
+        self.item_set = set()
+        self.item_data = {}
+        self.row_map = None
+        self.endResetModel()
+
+    def row_of(self, text):
+        """文本所在的行号，不存在时返回 -1"""
+        if text not in self.item_set:
+            return -1
+        if self.row_map is None:
+            self.row_map = {item: row for row, item in enumerate(self.items)}
+        return self.row_map[text]
+
+    def set_item_data(self, text, role, value):
+        """设置某一项的附加数据（如 Qt.ToolTipRole、Qt.ForegroundRole）"""
+        row = self.row_of(text)
+        if row < 0:
+            return
+        self.item_data.setdefault(text, {})[role] = value
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [role])
+
+
+def sorted_view(model):
+    """列表模型的排序视图：调用 sort(0) 后按文本（不区分大小写）排序显示，不改变模型中的顺序
+
+    之后添加的项自动插入到排序后的位置。
+    """
+    proxy = QSortFilterProxyModel(model)
+    proxy.setSourceModel(model)
+    proxy.setSortCaseSensitivity(Qt.CaseInsensitive)
+    proxy.setDynamicSortFilter(True)
+    return proxy
+
+
+def selected_rows(view):
+    """返回列表视图中选中的行号，视图使用排序视图时换算为源模型的行号"""
+    model = view.model()
+    indexes = view.selectionModel().selectedRows()
+    if isinstance(model, QSortFilterProxyModel):
+        indexes = [model.mapToSource(index) for index in indexes]
+    return [index.row() for index in indexes]
+
+
+# 可导入模块的文件后缀，嵌入式Python的标准库zip中是 .pyc
+MODULE_SUFFIXES = ('.py', '.pyc', '.pyd', '.so')
+
+
+def module_name_from_file(filename):
+    """从文件名得到模块名，如 _socket.cp39-win_amd64.pyd -> _socket，非模块文件返回 None"""
+    for suffix in MODULE_SUFFIXES:
+        if filename.endswith(suffix):
+            name = filename[:-len(suffix)].split('.', 1)[0]
+            return name if name.isidentifier() else None
+    return None
+
+
+def scan_package_dir(path, name, modules, check=None):
+    """递归收集包及其子模块的名称，check 在进入每个目录时调用，取消时由它抛出异常"""
+    if check:
+        check()
+    modules.append(name)
+    try:
+        it = os.scandir(path)
+    except OSError:
+        return
+    with it:
+        for entry in it:
+            try:
+                if entry.is_dir():
+                    if entry.name.isidentifier() and entry.name != '__pycache__':
+                        scan_package_dir(entry.path, f"{name}.{entry.name}", modules, check)
+                else:
+                    module = module_name_from_file(entry.name)
+                    if module and module != '__init__':
+                        modules.append(f"{name}.{module}")
+            except OSError:
+                continue
+
+
+def scan_zip_modules(zip_path):
+    """收集zip归档（如 python39.zip）中的模块名称"""
+    modules = set()
+    with zipfile.ZipFile(zip_path) as zf:
+        for filename in zf.namelist():
+            parts = filename.split('/')
+            module = module_name_from_file(parts[-1])
+            if not module or not all(part.isidentifier() for part in parts[:-1]):
+                continue
+            packages = parts[:-1]
+            for i in range(1, len(packages) + 1):
+                modules.add('.'.join(packages[:i]))
+            if module != '__init__':
+                modules.add('.'.join(packages + [module]))
+    return sorted(modules)
+
+
+class ModuleIndex:
+    """模块名前缀索引
+
+    名称保存在有序数组中，前缀查询用二分查找定位区间，效果等同于前缀树，
+    但十万级名称下内存占用远小于逐字符节点；集合用于精确校验。
+    """
+
+    def __init__(self, names=()):
+        self.names = sorted(set(names))
+        self.name_set = set(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.name_set
+
+    def complete(self, prefix, limit=50):
+        """返回以 prefix 开头的名称，最多 limit 个"""
+        start = bisect.bisect_left(self.names, prefix)
+        result = []
+        for name in self.names[start:start + limit]:
+            if not name.startswith(prefix):
+                break
+            result.append(name)
+        return result
+
+
+class ModuleIndexThread(QThread):
+    """后台建立目标Python运行时的模块索引
+
+    缓存按 sys.path 条目及其下的顶层项目记录修改时间，pip 安装后再次运行时
+    只重新扫描发生变化的顶层包。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    index_updated = pyqtSignal(object)  # ModuleIndex
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    QUERY_SCRIPT = "import sys, json; print(json.dumps({'path': sys.path, 'builtins': list(sys.builtin_module_names)}))"
+
+    def __init__(self, python_path, cache_key):
+        super().__init__()
+        self.python_path = python_path
+        self.runtime_root = os.path.dirname(os.path.abspath(python_path))
+        cache_name = hashlib.sha1(cache_key.encode('utf-8')).hexdigest()[:16] + '.json'
+        self.cache_path = os.path.join(get_app_data_dir('module_index'), cache_name)
+        self.runner = CommandRunner()
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def entry_key(self, entry):
+        """运行时目录内的路径使用相对路径，使每次解压到不同临时目录时缓存仍然有效"""
+        entry = os.path.abspath(entry)
+        if os.path.normcase(entry).startswith(os.path.normcase(self.runtime_root)):
+            return os.path.relpath(entry, self.runtime_root)
+        return entry
+
+    def query_runtime(self):
+        """获取目标Python的 sys.path 和内置模块"""
+        output = self.runner.run([self.python_path, '-c', self.QUERY_SCRIPT], timeout=60, cwd=self.runtime_root).stdout
+        return json.loads(output.decode('utf-8', errors='replace'))
+
+    def run(self):
+        try:
+            cache = read_json(self.cache_path, {})
+            if cache.get('entries'):
+                self.index_updated.emit(self.build_index(cache))
+
+            info = self.query_runtime()
+            old_entries = cache.get('entries', {})
+            entries = {}
+            rescanned = 0
+            for entry in info['path']:
+                self.runner.check()
+                if not entry or not os.path.exists(entry):
+                    continue
+                key = self.entry_key(entry)
+                old = old_entries.get(key, {})
+                children = {}
+                if os.path.isfile(entry):
+                    if not zipfile.is_zipfile(entry):
+                        continue
+                    mtime = os.stat(entry).st_mtime_ns
+                    previous = old.get('')
+                    if previous and previous[0] == mtime:
+                        children[''] = previous
+                    else:
+                        children[''] = [mtime, scan_zip_modules(entry)]
+                        rescanned += 1
+                else:
+                    with os.scandir(entry) as it:
+                        for child in it:
+                            self.runner.check()
+                            try:
+                                is_dir = child.is_dir()
+                                if is_dir and (not child.name.isidentifier() or child.name == '__pycache__'):
+                                    continue
+                                module = None if is_dir else module_name_from_file(child.name)
+                                if not is_dir and not module:
+                                    continue
+                                mtime = child.stat().st_mtime_ns
+                            except OSError:
+                                continue
+                            previous = old.get(child.name)
+                            if previous and previous[0] == mtime:
+                                children[child.name] = previous
+                                continue
+                            modules = []
+                            if is_dir:
+                                scan_package_dir(child.path, child.name, modules, self.runner.check)
+                            else:
+                                modules.append(module)
+                            children[child.name] = [mtime, modules]
+                            rescanned += 1
+                entries[key] = children
+
+            cache = {'builtins': info['builtins'], 'entries': entries}
+            write_json_atomic(self.cache_path, cache)
+            index = self.build_index(cache)
+            self.index_updated.emit(index)
+            self.progress_updated.emit(f"模块索引已更新: 共 {len(index)} 个模块，重新扫描 {rescanned} 项", "info")
+            self.finished.emit(True, "模块索引已更新")
+        except OperationCancelled:
+            self.finished.emit(False, "已取消建立模块索引")
+        except Exception as e:
+            self.progress_updated.emit(f"建立模块索引失败: {str(e)}", "warning")
+            self.finished.emit(False, f"建立模块索引失败: {str(e)}")
+
+    @staticmethod
+    def build_index(cache):
+        names = list(cache.get('builtins', []))
+        for children in cache['entries'].values():
+            for mtime, modules in children.values():
+                names.extend(modules)
+        return ModuleIndex(names)
+
+
+class ModuleCompleter(QCompleter):
+    """模块名输入框的自动补全和校验
+
+    候选项由模块索引按前缀查询得到，支持逗号分隔的多个模块名；
+    输入了运行时中不存在的模块时，输入框边框变为橙色并在提示中列出。
+    """
+
+    def __init__(self, line_edit, index_provider, multiple=True):
+        super().__init__(line_edit)
+        self.line_edit = line_edit
+        self.index_provider = index_provider
+        self.multiple = multiple
+        self.list_model = QStringListModel(self)
+        self.setModel(self.list_model)
+        self.setCaseSensitivity(Qt.CaseSensitive)
+        self.setModelSorting(QCompleter.CaseSensitivelySortedModel)
+        self.setCompletionMode(QCompleter.PopupCompletion)
+        self.setMaxVisibleItems(12)
+        line_edit.setCompleter(self)
+        line_edit.textEdited.connect(self.update_candidates)
+        line_edit.editingFinished.connect(self.validate)
+
+    def current_token(self, text):
+        return text.rsplit(',', 1)[-1].strip() if self.multiple else text.strip()
+
+    def splitPath(self, path):
+        return [self.current_token(path)]
+
+    def pathFromIndex(self, index):
+        completion = self.list_model.data(index, Qt.DisplayRole)
+        text = self.line_edit.text()
+        if not self.multiple or ',' not in text:
+            return completion
+        return text.rsplit(',', 1)[0] + ',' + completion
+
+    def update_candidates(self, text):
+        """按当前输入的前缀刷新候选项"""
+        token = self.current_token(text)
+        index = self.index_provider()
+        candidates = index.complete(token) if token and index else []
+        self.list_model.setStringList(candidates)
+        if candidates:
+            self.setCompletionPrefix(token)
+            self.complete()
+        else:
+            self.popup().hide()
+        self.validate()
+
+    def validate(self):
+        """检查输入的模块名是否存在于运行时中"""
+        index = self.index_provider()
+        if not index or not len(index):
+            return
+        text = self.line_edit.text()
+        tokens = [t.strip() for t in text.split(',')] if self.multiple else [text.strip()]
+        unknown = [t for t in tokens if t and t not in index]
+        if unknown:
+            self.line_edit.setStyleSheet("border: 1px solid #FF9800;")
+            self.line_edit.setToolTip("运行时中找不到以下模块: " + ", ".join(unknown))
+        else:
+            self.line_edit.setStyleSheet("")
+            self.line_edit.setToolTip("")
+
+
+def unique_dir_name(root, name):
+    """在 root 下返回一个尚不存在的目录名，重名时追加序号"""
+    candidate = name
+    counter = 1
+    while os.path.exists(os.path.join(root, candidate)):
+        counter += 1
+        candidate = f"{name}-{counter}"
+    return candidate
+
+
+class SpecBuildJob:
+    """一次spec打包任务，spec文件、工作目录和输出目录都是独立的"""
+
+    def __init__(self, name, spec_content, python_path, build_dir, dist_dir, meta=None, epoch=None):
+        self.name = name
+        self.spec_content = spec_content
+        self.python_path = python_path
+        self.build_dir = build_dir
+        self.spec_path = os.path.join(build_dir, f"{name}.spec")
+        self.work_dir = os.path.join(build_dir, 'build')
+        self.dist_dir = dist_dir
+        self.meta = meta or {}
+        self.epoch = epoch
+        self.process = None
+        self.timer = None
+        self.status = 'pending'  # pending, running, success, failed, cancelled, timeout
+        self.exit_code = None
+
+    def command(self):
+        return [self.python_path, '-m', 'PyInstaller', '--noconfirm',
+                '--workpath', self.work_dir, '--distpath', self.dist_dir, self.spec_path]
+
+
+class SpecBuildScheduler(QObject):
+    """spec打包任务调度器
+
+    每个任务在独立目录中写入spec并使用独立的工作目录，产物直接输出到按任务命名的
+    输出目录，因此多个窗口或多个任务可以同时打包而互不覆盖。同时运行的任务数不超过
+    max_concurrent，其余任务排队等待。运行时间超过 timeout 秒（0 为不限）的任务被结束，
+    状态为 timeout；取消和超时的任务结束整个进程树，并删除其工作目录和输出目录。
+    """
+
+    # 信号定义
+    job_started = pyqtSignal(object)  # SpecBuildJob
+    job_finished = pyqtSignal(object, int)  # SpecBuildJob, 退出码
+
+    def __init__(self, max_concurrent=2, build_root=None, parent=None, timeout=0):
+        super().__init__(parent)
+        self.max_concurrent = max_concurrent
+        self.timeout = timeout
+        self.build_root = build_root or get_app_data_dir('spec_builds')
+        os.makedirs(self.build_root, exist_ok=True)
+        self.pending = deque()
+        self.running = []
+
+    def submit(self, name, spec_content, python_path, output_root, meta=None, epoch=None):
+        """提交打包任务，产物输出到 output_root 下以任务名和时间命名的目录
+
+        meta 为调用方附加的任务信息，原样保存在 job.meta 中；epoch 为打包进程使用的 SOURCE_DATE_EPOCH
+        """
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        os.makedirs(output_root, exist_ok=True)
+        dist_dir = os.path.join(output_root, unique_dir_name(output_root, f"{name}-{stamp}"))
+        build_dir = os.path.join(self.build_root, unique_dir_name(self.build_root, f"{name}-{stamp}-{os.getpid()}"))
+        os.makedirs(dist_dir)
+        os.makedirs(build_dir)
+
+        job = SpecBuildJob(name, spec_content, python_path, build_dir, dist_dir, meta, epoch)
+        with open(job.spec_path, 'w', encoding='utf-8') as f:
+            f.write(spec_content)
+        self.pending.append(job)
+        self.schedule()
+        return job
+
+    def set_max_concurrent(self, value):
+        self.max_concurrent = max(1, value)
+        self.schedule()
+
+    def set_timeout(self, seconds):
+        """设置之后启动的任务的超时时间，0 为不限"""
+        self.timeout = max(0, seconds)
+
+    def schedule(self):
+        """在并发上限内启动排队的任务"""
+        while self.pending and len(self.running) < self.max_concurrent:
+            job = self.pending.popleft()
+            self.start_job(job)
+
+    def start_job(self, job):
+        process = QProcess(self)
+        process.setProcessChannelMode(QProcess.MergedChannels)
+        process.setWorkingDirectory(job.build_dir)
+        env = QProcessEnvironment.systemEnvironment()
+        env.insert("PYTHONIOENCODING", "utf-8")
+        env.insert("PYTHONUTF8", "1")
+        process.setProcessEnvironment(reproducible_environment(env, job.epoch))
+        process.finished.connect(lambda exit_code, exit_status: self.on_job_finished(job, exit_code))
+        process.errorOccurred.connect(lambda error: self.on_job_error(job, error))
+
+        job.process = process
+        job.status = 'running'
+        self.running.append(job)
+        if self.timeout:
+            job.timer = QTimer(self)
+            job.timer.setSingleShot(True)
+            job.timer.timeout.connect(lambda: self.cancel_job(job, 'timeout'))
+            job.timer.start(self.timeout * 1000)
+        self.job_started.emit(job)
+        cmd = job.command()
+        process.start(cmd[0], cmd[1:])
+
+    def on_job_error(self, job, error):
+        """进程无法启动时不会发出 finished 信号，在这里结束任务"""
+        if error == QProcess.FailedToStart:
+            self.on_job_finished(job, -1)
+
+    def on_job_finished(self, job, exit_code):
+        if job not in self.running:
+            return
+        self.running.remove(job)
+        if job.timer:
+            job.timer.stop()
+        job.exit_code = exit_code
+        if job.status == 'running':
+            job.status = 'success' if exit_code == 0 else 'failed'
+        self.job_finished.emit(job, exit_code)
+        if job.status == 'success':
+            # 成功后工作目录不再需要，失败时保留以便排查
+            discard_dir(job.build_dir)
+        elif job.status in ('cancelled', 'timeout'):
+            # 中途结束的任务只留下不完整的输出
+            discard_dir(job.build_dir)
+            discard_dir(job.dist_dir)
+        self.schedule()
+
+    def cancel_job(self, job, status='cancelled'):
+        """取消任务：排队的直接移除，运行中的结束整个进程树，结束后在 on_job_finished 中清理
+
+        status 为 'timeout' 表示因超时结束。
+        """
+        if job in self.pending:
+            self.pending.remove(job)
+            job.status = status
+            discard_dir(job.build_dir)
+            discard_dir(job.dist_dir)
+        elif job in self.running and job.status == 'running':
+            job.status = status
+            kill_qprocess_tree(job.process)
+
+    def cancel_all(self, discard=False):
+        """取消排队的任务并终止正在运行的任务
+
+        discard 为 True 时（关闭窗口）不等待 finished 信号，进程树结束后立即删除不完整的输出。
+        """
+        for job in list(self.pending) + list(self.running):
+            self.cancel_job(job)
+        if discard:
+            for job in self.running:
+                discard_dir(job.build_dir)
+                discard_dir(job.dist_dir)
+
+
+# MERGE 在多个程序间共享的TOC条目类型
+SHARED_TOC_TYPES = ('BINARY', 'EXTENSION', 'DATA')
+
+
+def collect_toc_files(data, files):
+    """递归查找TOC数据中的 (目标名, 源路径, 类型) 条目，兼容不同版本的保存格式"""
+    if isinstance(data, (list, tuple)):
+        if len(data) == 3 and all(isinstance(x, str) for x in data) and data[2] in SHARED_TOC_TYPES:
+            files[data[0]] = data[1]
+            return
+        for item in data:
+            collect_toc_files(item, files)
+    elif isinstance(data, dict):
+        for value in data.values():
+            collect_toc_files(value, files)
+
+
+def merge_savings(work_dir):
+    """统计MERGE打包中被多个程序共用的文件
+
+    读取工作目录中各 Analysis-NN.toc，同一个目标文件出现在 n 个程序中时，
+    分别打包需要保存 n 份，MERGE后只保存一份。
+    返回 (程序数, 共享文件数, 节省字节数)，无法读取TOC时返回 None。
+    """
+    toc_paths = sorted(glob.glob(os.path.join(work_dir, '**', 'Analysis-*.toc'), recursive=True))
+    if not toc_paths:
+        return None
+    counts = {}
+    sizes = {}
+    for toc_path in toc_paths:
+        try:
+            with open(toc_path, 'r', encoding='utf-8') as f:
+                data = ast.literal_eval(f.read())
+        except (OSError, ValueError, SyntaxError):
+            return None
+        files = {}
+        collect_toc_files(data, files)
+        for dest, src in files.items():
+            counts[dest] = counts.get(dest, 0) + 1
+            if dest not in sizes:
+                try:
+                    sizes[dest] = os.path.getsize(src)
+                except OSError:
+                    sizes[dest] = 0
+    shared = [dest for dest, count in counts.items() if count > 1]
+    return len(toc_paths), len(shared), sum(sizes[dest] * (counts[dest] - 1) for dest in shared)
+
+
+# 单文件+目录模式的PyInstaller启动脚本，在目标Python中以 python -c 运行，
+# 参数为: 单文件程序名 PyInstaller参数...（参数中须使用 -D）。
+# 在PyInstaller生成目录模式spec之后、开始构建之前，按目录版EXE段追加一个单文件EXE，
+# 两个产物共用同一次Analysis和PYZ。
+DUAL_OUTPUT_DRIVER = r"""
+import re
+import sys
+import PyInstaller.__main__ as pyi_main
+
+onefile_name = sys.argv.pop(1)
+run_makespec = pyi_main.run_makespec
+
+
+def add_onefile_target(spec_file):
+    with open(spec_file, 'r', encoding='utf-8') as f:
+        spec = f.read()
+    match = re.search(r'^exe = EXE\(\n(.*?)^\)\n', spec, re.S | re.M)
+    if not match or 'exclude_binaries=True,' not in match.group(1):
+        raise SystemExit('ERROR: 无法在生成的spec中找到目录模式的EXE段')
+    body = match.group(1).replace('    [],\n    exclude_binaries=True,\n', '    a.binaries,\n    a.datas,\n    [],\n', 1)
+    body = re.sub(r"^    name=.*$", '    name=%r,' % onefile_name, body, count=1, flags=re.M)
+    with open(spec_file, 'a', encoding='utf-8') as f:
+        f.write('\n# 单文件版本，复用上面的Analysis和PYZ\nexe_onefile = EXE(\n' + body + ')\n')
+
+
+def makespec_with_onefile(*args, **kwargs):
+    spec_file = run_makespec(*args, **kwargs)
+    add_onefile_target(spec_file)
+    return spec_file
+
+
+pyi_main.run_makespec = makespec_with_onefile
+pyi_main.run(sys.argv[1:])
+"""
+
+
+def format_command(cmd):
+    """用于日志显示的命令行，内嵌的启动脚本以简短说明代替"""
+    return " ".join("<单文件+目录启动脚本>" if arg == DUAL_OUTPUT_DRIVER else arg for arg in cmd)
+
+
+def canonical_path(path):
+    """规范化路径：绝对路径、统一分隔符、去掉 . 和 ..，同一个文件无论怎样输入都生成相同的参数"""
+    return os.path.normpath(os.path.abspath(path))
+
+
+def sorted_unique(items):
+    """去掉空项和重复项后排序，用于与顺序无关的选项（隐藏导入、排除模块等）"""
+    return sorted({item.strip() for item in items if item.strip()})
+
+
+def unique_paths(paths):
+    """规范化路径并去重，保留原有顺序（搜索路径和钩子的先后顺序会影响打包结果）"""
+    result = []
+    for path in paths:
+        path = canonical_path(path)
+        if path not in result:
+            result.append(path)
+    return result
+
+
+# git仓库 -> (仓库状态, 最后一次提交的时间)，仓库状态不变时不再运行 git
+_commit_time_cache = {}
+
+
+def git_repo_state(path):
+    """查找 path 所在的git仓库，返回 (git目录, 状态)；不在仓库中时返回 None
+
+    状态取自 HEAD、HEAD 的引用日志和当前分支引用文件的修改时间，只读取文件属性，
+    提交、切换分支或重置后状态随之变化。
+    """
+    directory = os.path.dirname(canonical_path(path))
+    while True:
+        git_dir = os.path.join(directory, '.git')
+        if os.path.exists(git_dir):
+            break
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+    try:
+        if os.path.isfile(git_dir):
+            # 工作树和子模块中 .git 是指向实际目录的文件
+            with open(git_dir, 'r', encoding='utf-8') as f:
+                git_dir = os.path.join(directory, f.read().strip().split('gitdir:', 1)[-1].strip())
+        with open(os.path.join(git_dir, 'HEAD'), 'r', encoding='utf-8') as f:
+            head = f.read().strip()
+    except OSError:
+        return None
+    common_dir = git_dir
+    if os.path.isfile(os.path.join(git_dir, 'commondir')):
+        with open(os.path.join(git_dir, 'commondir'), 'r', encoding='utf-8') as f:
+            common_dir = os.path.join(git_dir, f.read().strip())
+    files = [os.path.join(git_dir, 'HEAD'), os.path.join(git_dir, 'logs', 'HEAD'),
+             os.path.join(common_dir, 'packed-refs')]
+    if head.startswith('ref:'):
+        files.append(os.path.join(common_dir, head[4:].strip()))
+    state = [head]
+    for file_path in files:
+        try:
+            state.append(os.stat(file_path).st_mtime_ns)
+        except OSError:
+            state.append(None)
+    return canonical_path(git_dir), tuple(state)
+
+
+def source_date_epoch(paths):
+    """打包使用的固定时间戳 SOURCE_DATE_EPOCH
+
+    优先使用环境中已设置的值，其次取第一个输入所在git仓库最后一次提交的时间，
+    否则取输入文件中最新的修改时间。输入不变时时间戳不变。
+    在界面线程中调用：提交时间按仓库缓存，仓库状态不变时不运行 git，
+    仓库很慢时 git 最多等待 2 秒并在本状态下不再重试。
+    """
+    value = os.environ.get('SOURCE_DATE_EPOCH', '').strip()
+    if value.isdigit():
+        return int(value)
+    paths = [p for p in paths if os.path.exists(p)]
+    if not paths:
+        return 0
+    repo = git_repo_state(paths[0])
+    if repo:
+        git_dir, state = repo
+        cached = _commit_time_cache.get(git_dir)
+        if cached and cached[0] == state:
+            commit_time = cached[1]
+        else:
+            commit_time = None
+            kwargs = {}
+            if os.name == 'nt':
+                kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+            try:
+                result = subprocess.run(['git', 'log', '-1', '--format=%ct'],
+                                        cwd=os.path.dirname(canonical_path(paths[0])),
+                                        capture_output=True, text=True, timeout=2, **kwargs)
+                if result.returncode == 0 and result.stdout.strip().isdigit():
+                    commit_time = int(result.stdout.strip())
+            except (OSError, subprocess.SubprocessError):
+                pass
+            _commit_time_cache[git_dir] = (state, commit_time)
+        if commit_time is not None:
+            return commit_time
+    return max(int(os.path.getmtime(p)) for p in paths)
+
+
+def reproducible_environment(env, epoch=None):
+    """为打包进程固定哈希种子和时间戳，集合的遍历顺序和写入产物的时间不再随每次运行变化"""
+    env.insert("PYTHONHASHSEED", "0")
+    if epoch is not None:
+        env.insert("SOURCE_DATE_EPOCH", str(epoch))
+    return env
+
+
+def compare_artifacts(dir_a, dir_b, names=None, is_cancelled=None):
+    """逐文件比较两次打包的产物，返回 (比较的文件数, [(相对路径, 差异说明)])
+
+    names 为只比较的顶层文件或目录名，默认比较目录中的全部内容。
+    """
+    def list_files(root):
+        files = {}
+        top_names = names if names is not None else (os.listdir(root) if os.path.isdir(root) else [])
+        for name in top_names:
+            path = os.path.join(root, name)
+            if os.path.isfile(path):
+                files[name] = path
+            for dirpath, dirnames, filenames in os.walk(path):
+                for filename in filenames:
+                    full_path = os.path.join(dirpath, filename)
+                    files[os.path.relpath(full_path, root).replace(os.sep, '/')] = full_path
+        return files
+
+    files_a = list_files(dir_a)
+    files_b = list_files(dir_b)
+    all_files = sorted(set(files_a) | set(files_b))
+    differences = []
+    for rel_path in all_files:
+        if is_cancelled and is_cancelled():
+            break
+        if rel_path not in files_b:
+            differences.append((rel_path, "只在第一次的产物中存在"))
+        elif rel_path not in files_a:
+            differences.append((rel_path, "只在第二次的产物中存在"))
+        else:
+            size_a = os.path.getsize(files_a[rel_path])
+            size_b = os.path.getsize(files_b[rel_path])
+            if size_a != size_b:
+                differences.append((rel_path, f"大小不同: {format_size(size_a)} / {format_size(size_b)}"))
+            elif hash_file(files_a[rel_path]) != hash_file(files_b[rel_path]):
+                differences.append((rel_path, "内容不同"))
+    return len(all_files), differences
+
+
+class ArtifactCompareThread(QThread):
+    """在后台比较两次打包的产物，用于复现性校验"""
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    compared = pyqtSignal(int, object)  # 文件数, [(相对路径, 差异说明)]
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    def __init__(self, dir_a, dir_b, names=None):
+        super().__init__()
+        self.dir_a = dir_a
+        self.dir_b = dir_b
+        self.names = names
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        self.progress_updated.emit(f"比较两次打包的产物: {self.dir_a} <-> {self.dir_b}", "info")
+        try:
+            count, differences = compare_artifacts(self.dir_a, self.dir_b, self.names, lambda: self.cancelled)
+        except Exception as e:
+            self.finished.emit(False, f"比较产物失败: {str(e)}")
+            return
+        if self.cancelled:
+            self.finished.emit(False, "比较已取消")
+            return
+        self.compared.emit(count, differences)
+        self.finished.emit(True, "比较完成")
+
+
+class HashCache:
+    """文件哈希缓存，大小和修改时间都未变的文件直接使用缓存的SHA-256
+
+    条目按最近使用排序，超过 max_entries 时丢弃最久未用的条目。
+    """
+
+    def __init__(self, cache_path=None, max_entries=50000):
+        self.cache_path = cache_path or os.path.join(get_app_data_dir(), 'hash_cache.json')
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = None
+
+    def load(self):
+        if self.entries is None:
+            self.entries = read_json(self.cache_path, {})
+
+    def get(self, path, st):
+        """返回 stat 结果与缓存一致时的哈希，否则返回 None"""
+        key = os.path.normcase(canonical_path(path))
+        with self.lock:
+            self.load()
+            record = self.entries.pop(key, None)
+            if record is None:
+                return None
+            self.entries[key] = record
+        if record[0] == st.st_size and record[1] == st.st_mtime_ns:
+            return record[2]
+        return None
+
+    def put(self, path, st, digest):
+        key = os.path.normcase(canonical_path(path))
+        with self.lock:
+            self.load()
+            self.entries.pop(key, None)
+            self.entries[key] = [st.st_size, st.st_mtime_ns, digest]
+
+    def save(self):
+        with self.lock:
+            if self.entries is None:
+                return
+            for key in list(self.entries)[:max(0, len(self.entries) - self.max_entries)]:
+                del self.entries[key]
+            try:
+                write_json_atomic(self.cache_path, self.entries)
+            except OSError:
+                pass
+
+
+# 产物清单文件名后缀，清单写在产物旁边：dist/app -> dist/app.manifest.json
+MANIFEST_SUFFIX = '.manifest.json'
+DELTA_SUFFIX = '.delta.zip'
+
+
+def manifest_path(target):
+    return target + MANIFEST_SUFFIX
+
+
+def read_collect_tocs(work_dir):
+    """读取工作目录中各 COLLECT-NN.toc 的 (目标名, 源路径, 类型) 条目，读取失败的跳过
+
+    需要在删除工作目录之前调用。
+    """
+    tocs = []
+    if not work_dir:
+        return tocs
+    for toc_path in sorted(glob.glob(os.path.join(work_dir, '**', 'COLLECT-*.toc'), recursive=True)):
+        try:
+            with open(toc_path, 'r', encoding='utf-8') as f:
+                data = ast.literal_eval(f.read())
+        except (OSError, ValueError, SyntaxError):
+            continue
+        entries = []
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                if len(item) == 3 and all(isinstance(x, str) for x in item):
+                    entries.append(tuple(item))
+                else:
+                    stack.extend(item)
+        tocs.append(entries)
+    return tocs
+
+
+def collect_sources(target, tocs):
+    """找出目录产物中由PyInstaller原样复制的文件及其源文件，返回 {相对路径: 源路径}
+
+    非可执行文件放在内容目录（如 _internal）中，按能否在产物中找到条目确定内容目录。
+    只包括数据文件：二进制文件经过bincache处理（strip、UPX、签名或平台相关的修改），
+    处理后大小可能不变但内容不同，不能复用源文件的哈希。
+    """
+    if not os.path.isdir(target):
+        return {}
+    try:
+        prefixes = [''] + sorted(entry.name for entry in os.scandir(target) if entry.is_dir())
+    except OSError:
+        return {}
+    for entries in tocs:
+        executables = [dest for dest, src, typecode in entries if typecode == 'EXECUTABLE']
+        if not executables or not all(os.path.isfile(os.path.join(target, dest)) for dest in executables):
+            continue
+        samples = [dest for dest, src, typecode in entries if typecode in ('DATA', 'BINARY', 'EXTENSION')][:5]
+        prefix = next((prefix for prefix in prefixes
+                       if all(os.path.isfile(os.path.join(target, prefix, dest)) for dest in samples)), None)
+        if prefix is None:
+            continue
+        sources = {}
+        for dest, src, typecode in entries:
+            if typecode == 'DATA':
+                rel_path = f"{prefix}/{dest}" if prefix else dest
+                sources[rel_path.replace(os.sep, '/')] = src
+        return sources
+    return {}
+
+
+def build_manifest(target, sources=None, cache=None, is_cancelled=None, workers=None):
+    """生成产物清单：每个文件的相对路径、大小和SHA-256，按路径排序
+
+    target 为目录产物或单文件产物。多个文件并行计算哈希（hashlib 计算时释放GIL）；
+    文件本身或其源文件（sources，由 collect_sources 得到）的大小和修改时间未变时复用缓存的哈希。
+    返回 (清单, 复用的文件数)，取消时返回 (None, 0)。
+    """
+    if os.path.isdir(target):
+        files = []
+        for dirpath, dirnames, filenames in os.walk(target):
+            dirnames.sort()
+            for name in filenames:
+                full_path = os.path.join(dirpath, name)
+                if os.path.isfile(full_path):
+                    files.append((os.path.relpath(full_path, target).replace(os.sep, '/'), full_path))
+    else:
+        files = [(os.path.basename(target), target)]
+    sources = sources or {}
+
+    records = {}
+    to_hash = []
+    reused = 0
+    for rel_path, full_path in files:
+        st = os.stat(full_path)
+        digest = cache.get(full_path, st) if cache else None
+        src = sources.get(rel_path)
+        src_st = None
+        if src:
+            try:
+                src_st = os.stat(src)
+            except OSError:
+                src = None
+        if digest is None and src and cache and src_st.st_size == st.st_size:
+            digest = cache.get(src, src_st)
+        if digest is None:
+            to_hash.append((rel_path, full_path, st, src if src and src_st.st_size == st.st_size else None, src_st))
+        else:
+            reused += 1
+            records[rel_path] = {'path': rel_path, 'size': st.st_size, 'sha256': digest}
+            if cache:
+                cache.put(full_path, st, digest)
+
+    def hash_one(item):
+        if is_cancelled and is_cancelled():
+            return item, None
+        return item, hash_file(item[1])
+
+    workers = workers or min(8, os.cpu_count() or 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for (rel_path, full_path, st, src, src_st), digest in executor.map(hash_one, to_hash):
+            if digest is None:
+                continue
+            records[rel_path] = {'path': rel_path, 'size': st.st_size, 'sha256': digest}
+            if cache:
+                cache.put(full_path, st, digest)
+                if src:
+                    cache.put(src, src_st, digest)
+    if is_cancelled and is_cancelled():
+        return None, 0
+
+    manifest = {
+        'format': 1,
+        'algorithm': 'sha256',
+        'name': os.path.basename(target),
+        'type': 'onedir' if os.path.isdir(target) else 'onefile',
+        'file_count': len(records),
+        'total_size': sum(record['size'] for record in records.values()),
+        'files': [records[rel_path] for rel_path in sorted(records)],
+    }
+    return manifest, reused
+
+
+class ReleaseStore:
+    """保存最近几次打包的产物，作为生成差分更新包的基准
+
+    结构:
+        objects/xx/<sha256>                      按内容寻址的文件，多次打包中相同的文件只保存一份
+        builds/<键>/<清单ID>.manifest.json       每个产物最近 keep 次不同的打包，按修改时间排序
+    键由输出目录和产物名决定。多个线程和进程通过 releases/.lock 依次使用。
+    """
+
+    def __init__(self, root=None, keep=3):
+        self.root = root or get_app_data_dir('releases')
+        self.objects_dir = os.path.join(self.root, 'objects')
+        self.builds_dir = os.path.join(self.root, 'builds')
+        self.keep = keep
+
+    @contextmanager
+    def locked(self, is_cancelled=None):
+        """独占使用存储，等待期间取消时返回 False"""
+        with open(os.path.join(self.root, '.lock'), 'a+') as lock_file:
+            while True:
+                try:
+                    lock_file_nonblocking(lock_file)
+                    break
+                except OSError:
+                    if is_cancelled and is_cancelled():
+                        yield False
+                        return
+                    time.sleep(0.2)
+            yield True
+
+    def build_key(self, scope_dir, name):
+        norm = os.path.normcase(canonical_path(scope_dir)) + '/' + name
+        return hashlib.sha1(norm.encode('utf-8')).hexdigest()[:16]
+
+    def object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def manifests(self, key):
+        """某个产物保存的清单路径，最近的在前"""
+        build_dir = os.path.join(self.builds_dir, key)
+        try:
+            paths = [os.path.join(build_dir, name) for name in os.listdir(build_dir) if name.endswith(MANIFEST_SUFFIX)]
+        except OSError:
+            return []
+        return sorted(paths, key=os.path.getmtime, reverse=True)
+
+    def latest(self, key):
+        """最近一次保存的清单，没有时返回 None"""
+        for path in self.manifests(key):
+            manifest = read_json(path)
+            if manifest:
+                return manifest
+        return None
+
+    def add(self, key, target, manifest):
+        """保存产物的文件和清单，删除超出 keep 次的旧清单和不再被引用的文件"""
+        is_dir = manifest['type'] == 'onedir'
+        for record in manifest['files']:
+            obj_path = self.object_path(record['sha256'])
+            if os.path.exists(obj_path):
+                continue
+            os.makedirs(os.path.dirname(obj_path), exist_ok=True)
+            # 复制而不是硬链接：PyInstaller可能原地重写单文件产物
+            tmp_path = f"{obj_path}.tmp-{os.getpid()}-{threading.get_ident()}"
+            shutil.copyfile(artifact_file(target, record['path'], is_dir), tmp_path)
+            os.replace(tmp_path, obj_path)
+        build_dir = os.path.join(self.builds_dir, key)
+        os.makedirs(build_dir, exist_ok=True)
+        write_json_atomic(os.path.join(build_dir, manifest_id(manifest) + MANIFEST_SUFFIX), manifest)
+        for path in self.manifests(key)[self.keep:]:
+            os.remove(path)
+        self.prune_objects()
+
+    def prune_objects(self):
+        """删除不再被任何清单引用的文件（包括中断时留下的临时文件），返回删除数量"""
+        referenced = set()
+        for key in os.listdir(self.builds_dir):
+            for path in self.manifests(key):
+                manifest = read_json(path, {})
+                referenced.update(record['sha256'] for record in manifest.get('files', []))
+        removed = 0
+        if not os.path.isdir(self.objects_dir):
+            return removed
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            for name in os.listdir(prefix_dir):
+                if name not in referenced:
+                    try:
+                        os.remove(os.path.join(prefix_dir, name))
+                        removed += 1
+                    except OSError:
+                        pass
+        return removed
+
+
+class ManifestThread(QThread):
+    """打包成功后在后台为各个产物生成清单，清单写在产物旁边（<产物>.manifest.json）
+
+    release_scope 不为 None 时再与保存的上一次打包比较，在产物旁边生成差分更新包
+    （<产物>-<旧清单ID>-<新清单ID>.delta.zip），然后把本次打包保存为下一次的基准。
+    release_scope 为区分不同项目的输出目录。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    cache = None
+
+    def __init__(self, targets, tocs=None, release_scope=None):
+        super().__init__()
+        self.targets = targets
+        self.tocs = tocs or []
+        self.release_scope = release_scope
+        self.cancelled = False
+        # 哈希缓存在进程内共用，避免多个线程各自读写缓存文件
+        if ManifestThread.cache is None:
+            ManifestThread.cache = HashCache()
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            for target in self.targets:
+                start = time.perf_counter()
+                manifest, reused = build_manifest(target, collect_sources(target, self.tocs), self.cache,
+                                                  lambda: self.cancelled)
+                if manifest is None:
+                    self.finished.emit(False, "生成产物清单已取消")
+                    return
+                write_json_atomic(manifest_path(target), manifest)
+                self.progress_updated.emit(
+                    f"已生成产物清单: {manifest_path(target)}（{manifest['file_count']} 个文件，"
+                    f"{format_size(manifest['total_size'])}，复用 {reused} 个缓存的哈希，"
+                    f"耗时 {format_duration(time.perf_counter() - start)}）", "success")
+                if self.release_scope is not None:
+                    self.make_delta(target, manifest)
+            self.cache.save()
+            self.finished.emit(True, "产物清单已生成")
+        except Exception as e:
+            self.progress_updated.emit(f"生成产物清单失败: {str(e)}", "error")
+            self.finished.emit(False, f"生成产物清单失败: {str(e)}")
+
+    def make_delta(self, target, manifest):
+        """与上一次保存的打包比较生成差分更新包，再把本次打包保存为基准"""
+        store = ReleaseStore()
+        name = os.path.basename(target)
+        key = store.build_key(self.release_scope, name)
+        with store.locked(lambda: self.cancelled) as acquired:
+            if not acquired:
+                return
+            base = store.latest(key)
+            new_id = manifest_id(manifest)
+            if base is None:
+                self.progress_updated.emit(f"{name} 没有保存过之前的打包，本次打包保存为生成差分更新包的基准", "info")
+            elif manifest_id(base) == new_id:
+                self.progress_updated.emit(f"{name} 与上一次保存的打包完全相同，不需要差分更新包", "info")
+            else:
+                start = time.perf_counter()
+                output = os.path.join(os.path.dirname(target), f"{name}-{manifest_id(base)}-{new_id}{DELTA_SUFFIX}")
+                try:
+                    stats = create_delta(base, store.object_path, target, manifest, output,
+                                         is_cancelled=lambda: self.cancelled)
+                except DeltaError as e:
+                    self.progress_updated.emit(f"无法为 {name} 生成差分更新包: {e}", "warning")
+                    stats = None
+                if self.cancelled:
+                    return
+                if stats:
+                    self.progress_updated.emit(
+                        f"已生成差分更新包: {output}（{format_size(stats['bytes'])}，完整产物 "
+                        f"{format_size(manifest['total_size'])}；未变 {stats['keep']} 个，移动 {stats['copy']} 个，"
+                        f"差分 {stats['patch']} 个，新增 {stats['add']} 个，"
+                        f"耗时 {format_duration(time.perf_counter() - start)}）", "success")
+            store.add(key, target, manifest)
+
+
+def resolve_local_module(name, base_dir):
+    """在 base_dir 下查找模块 name 对应的源文件，返回途经的包 __init__.py 和模块文件"""
+    files = []
+    current = base_dir
+    parts = name.split('.') if name else []
+    for index, part in enumerate(parts):
+        package_dir = os.path.join(current, part)
+        init_file = os.path.join(package_dir, '__init__.py')
+        if index == len(parts) - 1 and os.path.isfile(package_dir + '.py'):
+            files.append(package_dir + '.py')
+            break
+        if os.path.isfile(init_file):
+            files.append(init_file)
+        elif not os.path.isdir(package_dir):
+            # 标准库或已安装的包
+            break
+        current = package_dir
+    return files
+
+
+def parse_imports(path):
+    """源文件中导入的模块，返回 [(模块名, 相对导入的基准目录)]，绝对导入的基准目录为 None"""
+    try:
+        with open(path, 'rb') as f:
+            tree = ast.parse(f.read(), path)
+    except (OSError, SyntaxError, ValueError):
+        return []
+    imports = []
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            imports.extend((alias.name, None) for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            module = node.module or ''
+            base_dir = None
+            if node.level:
+                base_dir = os.path.dirname(path)
+                for _ in range(node.level - 1):
+                    base_dir = os.path.dirname(base_dir)
+            # from a import b 中的 b 可能是子模块
+            imports.append((module, base_dir))
+            imports.extend((f"{module}.{alias.name}".lstrip('.'), base_dir)
+                           for alias in node.names if alias.name != '*')
+    return imports
+
+
+def find_local_sources(script, search_dirs=None, limit=2000, cache=None, is_cancelled=None):
+    """入口脚本及通过import可以到达的本地源文件（脚本所在目录和 search_dirs 中的模块）
+
+    只做静态分析，动态导入的模块找不到；标准库和已安装的包不包括在内。
+    cache 为 {路径: (修改时间, 大小, 导入列表)}，多次调用之间传入同一个字典时只重新解析发生变化的文件。
+    """
+    script = canonical_path(script)
+    search_dirs = [os.path.dirname(script)] + [canonical_path(d) for d in search_dirs or []]
+    cache = {} if cache is None else cache
+    result = []
+    seen = set()
+    queue = [script]
+    while queue and len(result) < limit:
+        if is_cancelled and is_cancelled():
+            break
+        path = queue.pop()
+        if path in seen:
+            continue
+        seen.add(path)
+        result.append(path)
+        try:
+            st = os.stat(path)
+        except OSError:
+            continue
+        cached = cache.get(path)
+        if cached and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+            imports = cached[2]
+        else:
+            imports = parse_imports(path)
+            cache[path] = (st.st_mtime_ns, st.st_size, imports)
+        # 每次重新查找模块文件（只需少量stat），新建的模块文件也能找到
+        for name, base_dir in imports:
+            for base in ([base_dir] if base_dir else search_dirs):
+                queue.extend(f for f in resolve_local_module(name, base) if f not in seen)
+    return result
+
+
+# 监视模式最多监视的路径数，Linux上每个路径占用一个inotify监视（默认上限8192，多个程序共用）
+WATCH_MAX_PATHS = 4000
+
+
+class WatchPathsThread(QThread):
+    """在后台收集监视模式需要监视的路径
+
+    源文件逐个监视（内容修改需要文件监视）；附加目录只监视目录本身和各级子目录，
+    报告其中文件的新建、删除和改名（编辑器“写临时文件再改名”的保存方式也会触发），
+    避免为大型资源目录中的每个文件占用一个监视。
+    """
+
+    # 信号定义
+    paths_ready = pyqtSignal(list)  # 需要监视的路径
+
+    def __init__(self, script, data_paths, import_cache):
+        super().__init__()
+        self.script = script
+        self.data_paths = data_paths
+        self.import_cache = import_cache
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        paths = find_local_sources(self.script, cache=self.import_cache, is_cancelled=lambda: self.cancelled)
+        requirements_file = ProjectEnvStore.project_requirements(self.script)
+        if requirements_file:
+            paths.append(requirements_file)
+        for data_path in self.data_paths:
+            if len(paths) >= WATCH_MAX_PATHS or self.cancelled:
+                break
+            if not os.path.isdir(data_path):
+                paths.append(data_path)
+                continue
+            for dirpath, dirnames, filenames in os.walk(data_path):
+                paths.append(dirpath)
+                if len(paths) >= WATCH_MAX_PATHS or self.cancelled:
+                    break
+        if not self.cancelled:
+            self.paths_ready.emit(paths[:WATCH_MAX_PATHS])
+
+
+class SourceWatcher(QObject):
+    """监视脚本可以导入的本地源文件、requirements.txt 和附加文件，短时间内的多次变化合并后只发出一次 changed
+
+    需要监视的路径由 WatchPathsThread 在后台收集，脚本的import关系在多次收集之间复用，
+    只重新解析发生变化的源文件。每次通知时在后台重新收集，新增的import和新建的子目录会自动加入监视。
+    """
+
+    # 信号定义
+    changed = pyqtSignal(list)  # 变化的路径
+    refreshed = pyqtSignal(int)  # 收集完成后监视的路径数
+
+    def __init__(self, debounce_ms=800, parent=None):
+        super().__init__(parent)
+        self.script = None
+        self.data_paths = []
+        self.import_cache = {}
+        self.active = False
+        self.collect_thread = None
+        self.refresh_pending = False
+        self.pending = set()
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.fileChanged.connect(self.on_path_changed)
+        self.watcher.directoryChanged.connect(self.on_path_changed)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(debounce_ms)
+        self.timer.timeout.connect(self.on_timeout)
+
+    def watched_paths(self):
+        return self.watcher.files() + self.watcher.directories()
+
+    def set_inputs(self, script, data_paths):
+        """设置入口脚本和附加文件，正在监视时在后台重新收集"""
+        if script != self.script:
+            self.import_cache = {}
+        self.script = script
+        self.data_paths = list(data_paths)
+        if self.active:
+            self.refresh()
+
+    def start(self):
+        """开始监视，收集完成后发出 refreshed"""
+        self.active = True
+        self.refresh()
+
+    def stop(self):
+        self.active = False
+        self.refresh_pending = False
+        self.timer.stop()
+        self.pending.clear()
+        if self.collect_thread and self.collect_thread.isRunning():
+            self.collect_thread.cancel()
+            self.collect_thread.wait()
+        paths = self.watched_paths()
+        if paths:
+            self.watcher.removePaths(paths)
+
+    def refresh(self):
+        """在后台按最新的输入重新收集路径；正在收集时等它完成后再收集一次"""
+        if self.collect_thread and self.collect_thread.isRunning():
+            self.refresh_pending = True
+            return
+        self.refresh_pending = False
+        if not self.script:
+            self.apply_paths([])
+            return
+        self.collect_thread = WatchPathsThread(self.script, self.data_paths, self.import_cache)
+        self.collect_thread.paths_ready.connect(self.apply_paths)
+        self.collect_thread.finished.connect(self.on_collect_finished)
+        self.collect_thread.start()
+
+    def on_collect_finished(self):
+        if self.refresh_pending and self.active:
+            self.refresh()
+
+    def apply_paths(self, paths):
+        """按收集到的路径列表增删监视"""
+        if not self.active:
+            return
+        paths = {path for path in paths if os.path.exists(path)}
+        current = set(self.watched_paths())
+        if current - paths:
+            self.watcher.removePaths(list(current - paths))
+        if paths - current:
+            self.watcher.addPaths(sorted(paths - current))
+        self.refreshed.emit(len(self.watched_paths()))
+
+    def on_path_changed(self, path):
+        self.pending.add(path)
+        # 重新计时，最后一次变化之后安静 debounce_ms 才通知
+        self.timer.start()
+        # 编辑器常用“写临时文件再改名”的方式保存，原来的监视随旧文件失效，重新添加
+        if os.path.isfile(path):
+            self.watcher.removePath(path)
+            self.watcher.addPath(path)
+
+    def on_timeout(self):
+        changed = sorted(self.pending)
+        self.pending.clear()
+        self.refresh()
+        self.changed.emit(changed)
+
+
+GLOB_CHARS = '*?['
+
+
+def has_glob(pattern):
+    return any(c in pattern for c in GLOB_CHARS)
+
+
+def split_glob(pattern):
+    """把glob模式拆成 (不含通配符的根目录, 相对于根目录的模式)"""
+    pattern = pattern.replace('\\', '/')
+    wildcard = min(pattern.find(c) for c in GLOB_CHARS if c in pattern)
+    slash = pattern.rfind('/', 0, wildcard)
+    if slash < 0:
+        return '.', pattern
+    return pattern[:slash] or '/', pattern[slash + 1:]
+
+
+def glob_to_regex(pattern):
+    """将glob模式转换为正则表达式，** 匹配任意层目录，* 和 ? 不跨越目录"""
+    i = 0
+    result = ''
+    while i < len(pattern):
+        c = pattern[i]
+        if pattern.startswith('**/', i):
+            result += '(?:.*/)?'
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            result += '.*'
+            i += 2
+            continue
+        if c == '*':
+            result += '[^/]*'
+        elif c == '?':
+            result += '[^/]'
+        elif c == '[':
+            end = pattern.find(']', i + 1)
+            if end < 0:
+                result += re.escape(c)
+            else:
+                chars = pattern[i + 1:end]
+                if chars.startswith('!'):
+                    chars = '^' + chars[1:]
+                result += '[' + chars.replace('\\', '\\\\') + ']'
+                i = end
+        else:
+            result += re.escape(c)
+        i += 1
+    return re.compile(result + r'\Z')
+
+
+class FileListCache:
+    """目录文件列表缓存
+
+    glob展开时复用同一目录的文件列表；只检查各子目录的修改时间，
+    没有变化时不再重新遍历，适合反复预览大量资源文件的模式。
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def list_files(self, root, is_cancelled=None):
+        """返回 root 下所有文件的 [(相对路径, 大小)]，相对路径使用 / 分隔；取消时返回 None"""
+        key = os.path.normcase(os.path.abspath(root))
+        with self.lock:
+            cached = self.entries.get(key)
+        if cached and self.is_valid(root, cached[0]):
+            return cached[1]
+
+        dir_mtimes = {}
+        files = []
+        stack = ['']
+        while stack:
+            if is_cancelled and is_cancelled():
+                return None
+            rel_dir = stack.pop()
+            path = os.path.join(root, rel_dir) if rel_dir else root
+            try:
+                dir_mtimes[rel_dir] = os.stat(path).st_mtime_ns
+                with os.scandir(path) as it:
+                    for entry in it:
+                        rel = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append(rel)
+                            elif entry.is_file():
+                                files.append((rel, entry.stat().st_size))
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+        with self.lock:
+            self.entries[key] = (dir_mtimes, files)
+        return files
+
+    @staticmethod
+    def is_valid(root, dir_mtimes):
+        for rel_dir, mtime in dir_mtimes.items():
+            try:
+                if os.stat(os.path.join(root, rel_dir) if rel_dir else root).st_mtime_ns != mtime:
+                    return False
+            except OSError:
+                return False
+        return True
+
+
+def expand_pattern(pattern, cache, is_cancelled=None):
+    """展开文件、目录或glob模式，返回匹配的 [(路径, 大小)]；取消时返回 None"""
+    if not has_glob(pattern):
+        if os.path.isdir(pattern):
+            files = cache.list_files(pattern, is_cancelled)
+            return None if files is None else [(os.path.join(pattern, rel), size) for rel, size in files]
+        try:
+            return [(pattern, os.path.getsize(pattern))]
+        except OSError:
+            return []
+    root, rel_pattern = split_glob(pattern)
+    if not os.path.isdir(root):
+        return []
+    files = cache.list_files(root, is_cancelled)
+    if files is None:
+        return None
+    regex = glob_to_regex(rel_pattern)
+    return [(os.path.join(root, rel), size) for rel, size in files if regex.match(rel)]
+
+
+class GlobExpandThread(QThread):
+    """后台展开资源模式，统计每个模式匹配的文件数和总大小"""
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    expanded_updated = pyqtSignal(dict)  # 模式 -> (文件数, 总大小)
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    def __init__(self, patterns, cache, base_dir='.'):
+        super().__init__()
+        self.patterns = patterns
+        self.cache = cache
+        self.base_dir = base_dir
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            results = {}
+            for pattern in self.patterns:
+                path = pattern if os.path.isabs(pattern) else os.path.join(self.base_dir, pattern)
+                matches = expand_pattern(path, self.cache, lambda: self.cancelled)
+                if matches is None:
+                    self.finished.emit(False, "已取消")
+                    return
+                results[pattern] = (len(matches), sum(size for _, size in matches))
+            self.expanded_updated.emit(results)
+            self.finished.emit(True, f"已展开 {len(results)} 个模式")
+        except Exception as e:
+            self.progress_updated.emit(f"展开模式失败: {str(e)}", "error")
+            self.finished.emit(False, f"展开模式失败: {str(e)}")
+
+
+# 嵌入式Python压缩包文件名，如 python-3.9.13-embed-amd64.zip，
+# slim_runtime.py 生成的精简包带 -slim 后缀
+EMBED_ARCHIVE_PATTERN = re.compile(r'^python-(\d+)\.(\d+)\.(\d+)-embed-(amd64|win32|arm64)(-slim)?\.zip$')
+# 本机解释器支持的次版本范围
+HOST_MINOR_VERSIONS = range(9, 14)
+
+
+def enable_site_in_pth(runtime_dir):
+    """修改嵌入式Python的 pythonXY._pth，启用site模块并添加Lib路径，返回是否修改"""
+    pth_files = glob.glob(os.path.join(runtime_dir, 'python*._pth'))
+    if not pth_files:
+        return False
+    pth_file = pth_files[0]
+    with open(pth_file, 'r', encoding='utf-8') as f:
+        content = f.read()
+
+    # 取消注释import site
+    content = content.replace('#import site', 'import site')
+
+    # 确保Lib目录在路径中，放在当前目录之后
+    if 'Lib' not in content:
+        lines = content.split('\n')
+        for i, line in enumerate(lines):
+            if line.strip() == '.':
+                lines.insert(i + 1, 'Lib')
+                break
+        else:
+            lines.append('Lib')
+        content = '\n'.join(lines)
+
+    with open(pth_file, 'w', encoding='utf-8') as f:
+        f.write(content)
+    return True
+
+
+def program_dir():
+    """程序所在目录，嵌入式Python压缩包放在这里；被打包成exe后仍能找到"""
+    if getattr(sys, 'frozen', False):
+        if hasattr(sys, '_MEIPASS'):
+            # 单文件模式：使用临时解压目录
+            return sys._MEIPASS
+        # 目录模式：使用程序可执行文件目录
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+class RuntimeRegistry:
+    """Python运行时登记表
+
+    登记程序目录中的嵌入式Python压缩包（Windows）和本机的 python3.9 ~ python3.13，
+    每个项目可以选择不同的运行时。压缩包只在第一次使用时解压到程序数据目录，
+    之后直接复用；选择记录和各运行时的启动耗时保存在 runtimes.json 中。
+    """
+
+    def __init__(self, program_dir, registry_path=None, runtimes_root=None):
+        self.program_dir = program_dir
+        self.registry_path = registry_path or os.path.join(get_app_data_dir(), 'runtimes.json')
+        self.runtimes_root = runtimes_root or get_app_data_dir('runtimes')
+        self.lock = threading.Lock()
+        self.data = read_json(self.registry_path, {})
+        self.data.setdefault('projects', {})
+        self.data.setdefault('startup_ms', {})
+        self.runtimes = {}
+        self.discover()
+
+    def discover(self):
+        """查找可用的运行时"""
+        self.runtimes = {}
+        if os.name == 'nt':
+            for path in sorted(glob.glob(os.path.join(self.program_dir, 'python-*-embed-*.zip'))):
+                match = EMBED_ARCHIVE_PATTERN.match(os.path.basename(path))
+                if not match:
+                    continue
+                major, minor, micro, arch, slim = match.groups()
+                version = f"{major}.{minor}.{micro}"
+                runtime_id = f"embed-{version}-{arch}{slim or ''}"
+                # 精简包的清单记录了是否通过重新打包验证，清单中的哈希与精简包一致时才可信
+                manifest = read_json(os.path.splitext(path)[0] + '.json', {}) if slim else {}
+                verified = bool(manifest.get('verified')) and manifest.get('slim_sha256') == hash_file(path)
+                self.runtimes[runtime_id] = {'id': runtime_id, 'kind': 'archive', 'path': path,
+                                             'version': version, 'arch': arch, 'slim': bool(slim),
+                                             'verified': verified}
+
+        hosts = []
+        if not getattr(sys, 'frozen', False):
+            hosts.append(sys.executable)
+        for minor in HOST_MINOR_VERSIONS:
+            path = shutil.which(f"python3.{minor}")
+            if path:
+                hosts.append(path)
+        seen = set()
+        for path in hosts:
+            real_path = os.path.realpath(path)
+            if real_path in seen:
+                continue
+            seen.add(real_path)
+            if path == sys.executable:
+                version = '.'.join(str(v) for v in sys.version_info[:3])
+            else:
+                version = re.search(r'python(3\.\d+)', os.path.basename(path)).group(1)
+            runtime_id = f"host-{version}-{hashlib.sha1(real_path.encode('utf-8')).hexdigest()[:8]}"
+            self.runtimes[runtime_id] = {'id': runtime_id, 'kind': 'host', 'path': path, 'version': version}
+
+    def describe(self, runtime_id):
+        """运行时的显示名称"""
+        runtime = self.runtimes[runtime_id]
+        if runtime['kind'] == 'archive':
+            slim = (' 精简' if runtime['verified'] else ' 精简 未验证') if runtime['slim'] else ''
+            name = f"Python {runtime['version']} (嵌入式 {runtime['arch']}{slim})"
+        else:
+            name = f"Python {runtime['version']} (本机 {runtime['path']})"
+        startup_ms = self.data['startup_ms'].get(runtime_id)
+        if startup_ms is not None:
+            name += f" - 启动 {startup_ms:.0f} ms"
+        return name
+
+    def default_runtime_id(self, system_arch):
+        """默认运行时：与系统架构匹配的3.9嵌入式包（与旧版本行为一致），否则依次退而求其次
+
+        精简包只保留了基准脚本用到的标准库，缺少的模块在打包时只有警告，因此从不默认选用，
+        只能为项目手动选择。
+        """
+        arch = 'amd64' if system_arch == '64bit' else 'win32'
+        archives = [r for r in self.runtimes.values() if r['kind'] == 'archive' and not r['slim']]
+        for candidates in ([r for r in archives if r['arch'] == arch and r['version'].startswith('3.9.')],
+                           [r for r in archives if r['arch'] == arch],
+                           [r for r in self.runtimes.values() if r['kind'] == 'host']):
+            if candidates:
+                return candidates[0]['id']
+        return None
+
+    @staticmethod
+    def project_key(source_file):
+        return os.path.normcase(os.path.abspath(source_file))
+
+    def project_runtime(self, source_file):
+        """项目选择的运行时，没有选择过或已不可用时返回 None"""
+        runtime_id = self.data['projects'].get(self.project_key(source_file))
+        return runtime_id if runtime_id in self.runtimes else None
+
+    def set_project_runtime(self, source_file, runtime_id):
+        with self.lock:
+            self.data['projects'][self.project_key(source_file)] = runtime_id
+            self.save()
+
+    def save(self):
+        try:
+            write_json_atomic(self.registry_path, self.data)
+        except OSError:
+            pass
+
+    def materialize(self, runtime_id, progress=None, runner=None):
+        """准备运行时，返回 (python路径, 运行时目录)
+
+        本机解释器直接使用；压缩包解压到 runtimes/<id>，完成后写入 .ready 标记，
+        之后再次使用时不再解压。先解压到临时目录再改名；解压时持有 runtimes/<id>.lock，
+        多个进程同时准备同一个运行时只解压一次。runner 被取消时抛出 OperationCancelled。
+        """
+        runner = runner or CommandRunner()
+        runtime = self.runtimes[runtime_id]
+        if runtime['kind'] == 'host':
+            if not os.path.exists(runtime['path']):
+                raise FileNotFoundError(f"本机解释器不存在: {runtime['path']}")
+            # pyenv等工具的shim可能指向未安装的版本，运行一次确认可用并取得实际路径
+            result = runner.run([runtime['path'], '-c', 'import sys; print(sys.executable)'], timeout=60)
+            python_path = result.stdout.decode('utf-8', errors='replace').strip()
+            if result.returncode != 0 or not python_path:
+                raise RuntimeError(f"本机解释器无法运行: {runtime['path']}")
+            return python_path, os.path.dirname(python_path)
+
+        target = os.path.join(self.runtimes_root, runtime_id)
+        stat = os.stat(runtime['path'])
+        stamp = f"{stat.st_size}:{stat.st_mtime_ns}"
+        if self.is_extracted(target, stamp):
+            return os.path.join(target, 'python.exe'), target
+
+        # 同时打开的其他打包器进程可能正在解压同一个运行时，等它完成后直接使用
+        with open(target + '.lock', 'a+') as lock_file:
+            waiting = False
+            while True:
+                try:
+                    lock_file_nonblocking(lock_file)
+                    break
+                except OSError:
+                    if not waiting and progress:
+                        progress("其他打包器进程正在解压该运行时，等待完成...")
+                    waiting = True
+                    runner.check()
+                    time.sleep(0.2)
+            if self.is_extracted(target, stamp):
+                return os.path.join(target, 'python.exe'), target
+            return self.extract(runtime, target, stamp, progress, runner)
+
+    @staticmethod
+    def is_extracted(target, stamp):
+        try:
+            with open(os.path.join(target, '.ready'), 'r', encoding='utf-8') as f:
+                return f.read() == stamp
+        except OSError:
+            return False
+
+    def extract(self, runtime, target, stamp, progress, runner):
+        """压缩包不存在已解压的副本，或压缩包已更新时解压
+
+        取消时留下的临时目录由 CleanupThread 在之后清理。
+        """
+        temp_dir = f"{target}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        with zipfile.ZipFile(runtime['path'], 'r') as zip_ref:
+            infos = zip_ref.infolist()
+            last_progress = -1
+            for index, file_info in enumerate(infos, 1):
+                runner.check()
+                zip_ref.extract(file_info, temp_dir)
+                percent = index * 100 // len(infos)
+                # 每达到10%的整数倍时更新一次进度
+                if progress and percent % 10 == 0 and percent > last_progress:
+                    progress(f"解压进度: {percent}% ({index}/{len(infos)}文件)")
+                    last_progress = percent
+
+        if not os.path.exists(os.path.join(temp_dir, 'python.exe')):
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            raise FileNotFoundError("未找到python.exe")
+        if enable_site_in_pth(temp_dir) and progress:
+            progress("已修改._pth文件，启用site模块并添加Lib路径")
+        with open(os.path.join(temp_dir, '.ready'), 'w', encoding='utf-8') as f:
+            f.write(stamp)
+
+        # 压缩包更新后旧的解压目录移入回收目录，在后台删除
+        discard_dir(target)
+        try:
+            os.rename(temp_dir, target)
+        except OSError:
+            # 其他进程已先完成解压
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return os.path.join(target, 'python.exe'), target
+
+    def measure_startup(self, runtime_id, python_path, runs=5, runner=None):
+        """测量解释器空载启动耗时（毫秒，取中位数）并记录"""
+        runner = runner or CommandRunner()
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            runner.run([python_path, '-c', 'pass'], timeout=60)
+            samples.append((time.perf_counter() - start) * 1000)
+        startup_ms = median(samples)
+        with self.lock:
+            self.data['startup_ms'][runtime_id] = startup_ms
+            self.save()
+        return startup_ms
+
+
+def normalize_requirements(lines):
+    """去掉注释和空行并排序，内容相同的依赖列表得到相同的结果"""
+    result = set()
+    for line in lines:
+        line = line.split('#', 1)[0].strip()
+        if line:
+            result.add(re.sub(r'\s+', ' ', line).lower())
+    return sorted(result)
+
+
+class ProjectEnvStore:
+    """本机解释器的项目虚拟环境
+
+    目录结构:
+        wheels/<sha256>.whl        解析出的wheel，按内容寻址
+        packages/xx/<sha256>/...   解开的wheel，按wheel内容寻址，相同的包只保存一份
+        locks/<依赖键>.json         依赖列表锁定后的wheel清单
+        envs/<锁定键>/              虚拟环境，包文件硬链接到 packages（不支持时复制）
+        envs/<锁定键>-<项目键>/      项目手动安装过包的独立环境
+
+    依赖键由解释器和项目的依赖列表计算，锁定键由解释器和锁定的wheel清单计算。
+    依赖列表与之前的项目相同时直接复用已有环境；只有锁定清单相同时，
+    新环境只需创建空的虚拟环境再建立硬链接，不需要下载和解包，也几乎不占额外空间。
+    锁定键相同的环境由多个项目共用，向其中安装包前先用 fork 为项目复制一份独立环境，
+    共用环境的内容始终与锁定清单一致。
+    """
+
+    # 每个环境都需要的包：打包用的PyInstaller，以及供安装其他包使用的pip
+    BASE_REQUIREMENTS = ['pip', 'pyinstaller']
+
+    def __init__(self, root=None, runner=None):
+        self.root = root or get_app_data_dir('envs')
+        self.runner = runner or CommandRunner()
+        self.wheels_dir = os.path.join(self.root, 'wheels')
+        self.packages_dir = os.path.join(self.root, 'packages')
+        self.locks_dir = os.path.join(self.root, 'locks')
+        self.envs_dir = os.path.join(self.root, 'envs')
+        for path in (self.wheels_dir, self.packages_dir, self.locks_dir, self.envs_dir):
+            os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def project_requirements(source_file):
+        """项目的依赖文件：脚本所在目录的 requirements.txt，没有时返回 None"""
+        path = os.path.join(os.path.dirname(os.path.abspath(source_file)), 'requirements.txt')
+        return path if os.path.isfile(path) else None
+
+    def requirements_key(self, runtime_id, requirements_file):
+        lines = list(self.BASE_REQUIREMENTS)
+        if requirements_file:
+            with open(requirements_file, 'r', encoding='utf-8', errors='replace') as f:
+                lines += f.read().splitlines()
+        content = runtime_id + '\n' + '\n'.join(normalize_requirements(lines))
+        return hashlib.sha256(content.encode('utf-8')).hexdigest()[:16]
+
+    @staticmethod
+    def env_python(env_dir):
+        if os.name == 'nt':
+            return os.path.join(env_dir, 'Scripts', 'python.exe')
+        return os.path.join(env_dir, 'bin', 'python')
+
+    def prepare(self, python_path, runtime_id, requirements_file=None, progress=None, source_file=None):
+        """准备项目的虚拟环境，返回环境中的python路径
+
+        项目在当前锁定清单上已有独立环境时使用独立环境。
+        """
+        progress = progress or (lambda message: None)
+        lock_path = os.path.join(self.locks_dir, self.requirements_key(runtime_id, requirements_file) + '.json')
+        lock = read_json(lock_path)
+        if lock is None:
+            progress("首次使用这组依赖，正在解析并下载wheel...")
+            lock = self.resolve(python_path, requirements_file, progress)
+            write_json_atomic(lock_path, lock)
+
+        lock_key = hashlib.sha256(
+            (runtime_id + '\n' + json.dumps(lock, sort_keys=True)).encode('utf-8')).hexdigest()[:16]
+        env_dir = os.path.join(self.envs_dir, lock_key)
+        if source_file:
+            private_dir = self.private_env_dir(env_dir, source_file)
+            if self.env_info(private_dir):
+                progress(f"使用项目独立的虚拟环境: {private_dir}")
+                return self.env_python(private_dir)
+        if self.env_info(env_dir):
+            progress(f"复用项目虚拟环境: {env_dir}")
+            return self.env_python(env_dir)
+
+        # 虚拟环境的 activate 脚本和 scripts 的 #! 行都写入环境的绝对路径，不能先建在临时目录再改名，
+        # 持有 envs/<锁定键>.lock 直接在最终位置创建，.ready 最后写入
+        with open(env_dir + '.lock', 'a+') as lock_file:
+            waiting = False
+            while True:
+                try:
+                    lock_file_nonblocking(lock_file)
+                    break
+                except OSError:
+                    if not waiting:
+                        progress("其他打包器进程正在创建该虚拟环境，等待完成...")
+                    waiting = True
+                    self.runner.check()
+                    time.sleep(0.2)
+            if self.env_info(env_dir):
+                progress(f"复用项目虚拟环境: {env_dir}")
+                return self.env_python(env_dir)
+            self.build_env(python_path, env_dir, lock, progress)
+        return self.env_python(env_dir)
+
+    @staticmethod
+    def private_env_dir(env_dir, source_file):
+        project_hash = hashlib.sha256(RuntimeRegistry.project_key(source_file).encode('utf-8')).hexdigest()[:16]
+        return f"{env_dir}-{project_hash}"
+
+    @staticmethod
+    def env_info(env_dir):
+        """环境已创建完成时返回 .ready 中记录的 {python, lock}，否则返回 None"""
+        info = read_json(os.path.join(env_dir, '.ready'))
+        return info if isinstance(info, dict) else None
+
+    def is_shared(self, python_path):
+        """python_path 是否属于多个项目共用的环境（envs/<锁定键>）"""
+        env_dir = os.path.dirname(os.path.dirname(python_path))
+        return (os.path.normcase(os.path.dirname(env_dir)) == os.path.normcase(self.envs_dir)
+                and '-' not in os.path.basename(env_dir))
+
+    def fork(self, python_path, source_file, progress=None):
+        """安装包之前为项目复制一份独立环境，返回独立环境中的python路径
+
+        python_path 不是共用环境时原样返回。独立环境按同一锁定清单重新创建并硬链接，
+        不复制共用环境本身，activate 脚本和 scripts 的 #! 行都指向独立环境。
+        """
+        progress = progress or (lambda message: None)
+        if not self.is_shared(python_path):
+            return python_path
+        env_dir = os.path.dirname(os.path.dirname(python_path))
+        info = self.env_info(env_dir)
+        if info is None:
+            raise RuntimeError(f"虚拟环境未创建完成: {env_dir}")
+        private_dir = self.private_env_dir(env_dir, source_file)
+        with open(private_dir + '.lock', 'a+') as lock_file:
+            while True:
+                try:
+                    lock_file_nonblocking(lock_file)
+                    break
+                except OSError:
+                    self.runner.check()
+                    time.sleep(0.2)
+            if not self.env_info(private_dir):
+                progress("当前虚拟环境由多个项目共用，正在为项目创建独立环境...")
+                self.build_env(info['python'], private_dir, info['lock'], progress)
+        return self.env_python(private_dir)
+
+    def build_env(self, python_path, env_dir, lock, progress):
+        """在 env_dir 创建虚拟环境并链接锁定的包，调用方需持有该环境的锁
+
+        上次中途退出留下的未完成目录先删除。
+        """
+        start = time.perf_counter()
+        shutil.rmtree(env_dir, ignore_errors=True)
+        self.run([python_path, '-m', 'venv', '--without-pip', env_dir])
+        site_packages = self.site_packages(env_dir)
+        linked = 0
+        for wheel in lock:
+            self.runner.check()
+            linked += self.install_package(self.unpack_wheel(wheel['sha256']), env_dir, site_packages)
+        with open(os.path.join(env_dir, '.ready'), 'w', encoding='utf-8') as f:
+            json.dump({'python': python_path, 'lock': lock}, f)
+        progress(f"已创建项目虚拟环境: {len(lock)} 个包, {linked} 个文件, "
+                 f"耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def run(self, cmd):
+        result = self.runner.run(cmd)
+        if result.returncode != 0:
+            output = (result.stderr or result.stdout).decode('utf-8', errors='replace').strip().splitlines()
+            raise RuntimeError(output[-1] if output else f"命令执行失败: {cmd[2:4]}")
+        return result.stdout
+
+    def resolve(self, python_path, requirements_file, progress):
+        """用pip解析依赖并生成wheel，返回按文件名排序的锁定清单 [{name, sha256}]"""
+        temp_dir = os.path.join(self.root, f"resolve-{os.getpid()}-{threading.get_ident()}")
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        try:
+            cmd = [python_path, '-m', 'pip', 'wheel', '--disable-pip-version-check', '-w', temp_dir]
+            if requirements_file:
+                cmd += ['-r', requirements_file]
+            self.run(cmd + self.BASE_REQUIREMENTS)
+            lock = []
+            for name in sorted(os.listdir(temp_dir)):
+                if not name.endswith('.whl'):
+                    continue
+                path = os.path.join(temp_dir, name)
+                digest = hash_file(path)
+                stored = os.path.join(self.wheels_dir, digest + '.whl')
+                if not os.path.exists(stored):
+                    os.replace(path, stored)
+                lock.append({'name': name, 'sha256': digest})
+                progress(f"已锁定: {name}")
+            return lock
+        finally:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    def unpack_wheel(self, digest):
+        """解开wheel到包目录，已解开时直接返回"""
+        package_dir = os.path.join(self.packages_dir, digest[:2], digest)
+        if os.path.isdir(package_dir):
+            return package_dir
+        temp_dir = f"{package_dir}.tmp-{os.getpid()}-{threading.get_ident()}"
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        with zipfile.ZipFile(os.path.join(self.wheels_dir, digest + '.whl')) as zip_ref:
+            zip_ref.extractall(temp_dir)
+            # zipfile解压时不保留权限，恢复可执行位
+            for info in zip_ref.infolist():
+                mode = info.external_attr >> 16
+                if mode & 0o111 and not info.is_dir():
+                    os.chmod(os.path.join(temp_dir, info.filename), mode & 0o777)
+        try:
+            os.rename(temp_dir, package_dir)
+        except OSError:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        return package_dir
+
+    @staticmethod
+    def site_packages(env_dir):
+        if os.name == 'nt':
+            return os.path.join(env_dir, 'Lib', 'site-packages')
+        return glob.glob(os.path.join(env_dir, 'lib', 'python*', 'site-packages'))[0]
+
+    def install_package(self, package_dir, env_dir, site_packages):
+        """将解开的wheel链接到环境中，返回文件数
+
+        <包>.data 下的 purelib/platlib 放入 site-packages，data 放入环境根目录，
+        scripts 复制到可执行文件目录并改写 #!python。控制台入口脚本不生成，
+        打包时通过 python -m PyInstaller 调用。
+        """
+        count = 0
+        bin_dir = os.path.dirname(self.env_python(env_dir))
+        targets = {'purelib': site_packages, 'platlib': site_packages, 'data': env_dir,
+                   'headers': os.path.join(env_dir, 'include'), 'scripts': bin_dir}
+        for dirpath, dirnames, filenames in os.walk(package_dir):
+            rel_dir = os.path.relpath(dirpath, package_dir)
+            parts = [] if rel_dir == '.' else rel_dir.split(os.sep)
+            if parts and parts[0].endswith('.data'):
+                if len(parts) == 1 or parts[1] not in targets:
+                    continue
+                dst_dir = os.path.join(targets[parts[1]], *parts[2:])
+            else:
+                dst_dir = os.path.join(site_packages, *parts)
+            if filenames:
+                os.makedirs(dst_dir, exist_ok=True)
+            for name in filenames:
+                src = os.path.join(dirpath, name)
+                dst = os.path.join(dst_dir, name)
+                if len(parts) > 1 and parts[1] == 'scripts':
+                    self.install_script(src, dst, self.env_python(env_dir))
+                else:
+                    try:
+                        os.link(src, dst)
+                    except OSError:
+                        shutil.copyfile(src, dst)
+                count += 1
+        return count
+
+    @staticmethod
+    def install_script(src, dst, python_path):
+        with open(src, 'rb') as f:
+            content = f.read()
+        if content.startswith(b'#!python'):
+            content = b'#!' + python_path.encode('utf-8') + content[len(b'#!python'):]
+        with open(dst, 'wb') as f:
+            f.write(content)
+        os.chmod(dst, 0o755)
+
+
+class RuntimePrepareThread(QThread):
+    """后台准备运行时：按需解压并测量启动耗时
+
+    指定了项目脚本且运行时是本机解释器时，再为项目准备独立的虚拟环境。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+    python_path_updated = pyqtSignal(str, str)  # python路径, 运行时目录
+
+    def __init__(self, registry, runtime_id, source_file=None):
+        super().__init__()
+        self.registry = registry
+        self.runtime_id = runtime_id
+        self.source_file = source_file
+        self.runner = CommandRunner()
+
+    def cancel(self):
+        """结束正在运行的解析、下载等子进程，线程随后退出"""
+        self.runner.cancel()
+
+    def run(self):
+        name = self.registry.describe(self.runtime_id)
+        self.progress_updated.emit(f"准备运行时: {name}", "info")
+        progress = lambda message: self.progress_updated.emit(message, "info")
+        try:
+            python_path, runtime_dir = self.registry.materialize(self.runtime_id, progress, self.runner)
+            if self.runtime_id not in self.registry.data['startup_ms']:
+                startup_ms = self.registry.measure_startup(self.runtime_id, python_path, runner=self.runner)
+                self.progress_updated.emit(f"解释器启动耗时: {startup_ms:.0f} ms", "info")
+            if self.source_file and self.registry.runtimes[self.runtime_id]['kind'] == 'host':
+                env_store = ProjectEnvStore(runner=self.runner)
+                requirements_file = env_store.project_requirements(self.source_file)
+                python_path = env_store.prepare(python_path, self.runtime_id, requirements_file, progress,
+                                                self.source_file)
+                runtime_dir = os.path.dirname(os.path.dirname(python_path))
+            self.progress_updated.emit(f"运行时已就绪，可执行文件路径: {python_path}", "success")
+            self.python_path_updated.emit(python_path, runtime_dir)
+            self.finished.emit(True, "运行时已就绪")
+        except OperationCancelled:
+            self.finished.emit(False, "已取消准备运行时")
+        except Exception as e:
+            self.progress_updated.emit(f"准备运行时失败: {str(e)}", "error")
+            self.finished.emit(False, f"准备运行时失败: {str(e)}")
+
+
+class ProjectEnvForkThread(QThread):
+    """后台为项目创建独立的虚拟环境，之后的pip安装不影响共用同一环境的其他项目"""
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+    python_path_updated = pyqtSignal(str)  # 独立环境中的python路径
+
+    def __init__(self, python_path, source_file):
+        super().__init__()
+        self.python_path = python_path
+        self.source_file = source_file
+        self.runner = CommandRunner()
+        # 窗口是否已改用独立环境，由窗口在收到 python_path_updated 时设置
+        self.applied = False
+
+    def cancel(self):
+        self.runner.cancel()
+
+    def run(self):
+        progress = lambda message: self.progress_updated.emit(message, "info")
+        try:
+            python_path = ProjectEnvStore(runner=self.runner).fork(self.python_path, self.source_file, progress)
+            self.python_path_updated.emit(python_path)
+            self.finished.emit(True, "项目虚拟环境已就绪")
+        except OperationCancelled:
+            self.finished.emit(False, "已取消创建项目虚拟环境")
+        except Exception as e:
+            self.progress_updated.emit(f"创建项目虚拟环境失败: {str(e)}", "error")
+            self.finished.emit(False, f"创建项目虚拟环境失败: {str(e)}")
+
+
+def set_process_priority(process, low):
+    """调整子进程优先级：low 为 True 时降到空闲级别
+
+    POSIX上普通用户不能调回原来的优先级，恢复时保持不变，下一个子进程仍以正常优先级启动。
+    """
+    try:
+        if os.name == 'nt':
+            import ctypes
+            # IDLE_PRIORITY_CLASS / NORMAL_PRIORITY_CLASS
+            ctypes.windll.kernel32.SetPriorityClass(int(process._handle), 0x40 if low else 0x20)
+        elif low:
+            os.setpriority(os.PRIO_PROCESS, process.pid, 19)
+    except (OSError, AttributeError):
+        pass
+
+
+def kill_process_tree(process):
+    """结束子进程及其创建的进程（如 compileall -j 的工作进程），避免它们继续占用输出管道
+
+    POSIX上要求子进程以 start_new_session=True 启动，整个进程组一起结束。
+    """
+    try:
+        if os.name == 'nt':
+            subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True,
+                           creationflags=subprocess.CREATE_NO_WINDOW)
+        else:
+            os.killpg(process.pid, signal.SIGKILL)
+    except OSError:
+        pass
+    if process.poll() is None:
+        process.kill()
+
+
+class OperationCancelled(Exception):
+    """后台操作被 CommandRunner.cancel() 取消"""
+
+
+class CommandRunner:
+    """可以从其他线程取消的子进程执行器
+
+    后台线程通过同一个执行器运行各个步骤的子进程，cancel() 结束正在运行的进程树，
+    之后的 run() 和 check() 抛出 OperationCancelled，使线程尽快退出。
+    """
+
+    def __init__(self):
+        self.cancelled = False
+        self.process = None
+        self.lock = threading.Lock()
+
+    def cancel(self):
+        with self.lock:
+            self.cancelled = True
+            if self.process and self.process.poll() is None:
+                kill_process_tree(self.process)
+
+    def check(self):
+        if self.cancelled:
+            raise OperationCancelled()
+
+    def run(self, cmd, timeout=None, cwd=None):
+        """运行命令并返回 subprocess.CompletedProcess（输出为字节串），超时时抛出 subprocess.TimeoutExpired"""
+        kwargs = {}
+        if os.name == 'nt':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+        else:
+            kwargs['start_new_session'] = True
+        with self.lock:
+            self.check()
+            self.process = process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                                      stdin=subprocess.DEVNULL, cwd=cwd, **kwargs)
+        try:
+            stdout, stderr = process.communicate(timeout=timeout)
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process)
+            process.communicate()
+            raise
+        finally:
+            with self.lock:
+                self.process = None
+        self.check()
+        return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+
+
+def child_pid_map():
+    """返回 {父进程号: [子进程号]}；读取 /proc，没有 /proc 时（如macOS）使用 ps"""
+    pairs = []
+    if os.path.isdir('/proc'):
+        for entry in os.listdir('/proc'):
+            if not entry.isdigit():
+                continue
+            try:
+                with open(f'/proc/{entry}/stat', 'rb') as f:
+                    stat = f.read()
+            except OSError:
+                continue
+            # 进程名中可能有空格和括号，从最后一个右括号之后解析：状态、父进程号……
+            fields = stat[stat.rfind(b')') + 2:].split()
+            if len(fields) > 1:
+                pairs.append((int(entry), int(fields[1])))
+    else:
+        try:
+            output = subprocess.run(['ps', '-A', '-o', 'pid=,ppid='], capture_output=True, text=True,
+                                    timeout=10).stdout
+        except (OSError, subprocess.SubprocessError):
+            output = ''
+        for line in output.splitlines():
+            parts = line.split()
+            if len(parts) == 2 and parts[0].isdigit() and parts[1].isdigit():
+                pairs.append((int(parts[0]), int(parts[1])))
+    children = {}
+    for pid, ppid in pairs:
+        children.setdefault(ppid, []).append(pid)
+    return children
+
+
+def kill_pid_tree(pid):
+    """结束进程及其创建的所有子孙进程（UPX、hook 启动的子进程、pip 的构建进程等）
+
+    QProcess 无法让子进程使用单独的进程组，POSIX上先逐轮暂停整棵进程树，
+    直到不再出现新的子进程，再全部结束，避免结束父进程后子进程被托管继续运行。
+    """
+    if not pid:
+        return
+    if os.name == 'nt':
+        subprocess.run(['taskkill', '/F', '/T', '/PID', str(pid)], capture_output=True,
+                       creationflags=subprocess.CREATE_NO_WINDOW)
+        return
+    stopped = set()
+    for _ in range(10):
+        children = child_pid_map()
+        tree = []
+        stack = [pid]
+        while stack:
+            current = stack.pop()
+            tree.append(current)
+            stack.extend(children.get(current, []))
+        new_pids = [current for current in tree if current not in stopped]
+        if not new_pids:
+            break
+        for current in new_pids:
+            try:
+                os.kill(current, signal.SIGSTOP)
+            except OSError:
+                pass
+            stopped.add(current)
+    for current in stopped:
+        try:
+            os.kill(current, signal.SIGKILL)
+        except OSError:
+            pass
+
+
+def kill_qprocess_tree(process):
+    """结束 QProcess 启动的进程树，finished 信号照常发出"""
+    if process.state() == QProcess.NotRunning:
+        return
+    try:
+        kill_pid_tree(process.processId())
+    except OSError:
+        pass
+    process.kill()
+
+
+def discard_partial_outputs(work_dir, dist_paths, since):
+    """清理被取消或超时的打包留下的不完整输出，返回删除的文件和目录数
+
+    工作目录中本次打包写过的文件（可能只写了一半）全部删除，未改动的缓存保留，
+    下次增量打包时PyInstaller发现输出缺失会重新生成这部分；
+    dist_paths 中本次打包改动过的产物整体删除，不留下新旧混合的输出。
+    """
+    # 文件系统时间戳的精度可能只有1秒
+    since -= 1
+    removed = 0
+    if work_dir and os.path.isdir(work_dir):
+        for dirpath, dirnames, filenames in os.walk(work_dir):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    if os.path.getmtime(path) >= since:
+                        os.remove(path)
+                        removed += 1
+                except OSError:
+                    pass
+    for path in dist_paths:
+        try:
+            if os.path.getmtime(path) < since:
+                continue
+            if os.path.isdir(path) and not os.path.islink(path):
+                discard_dir(path)
+            else:
+                os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class RuntimeWarmupThread(QThread):
+    """运行时就绪后在后台预热，减少第一次打包的等待
+
+    依次执行: 确保已安装PyInstaller、预编译 site-packages、预先导入一次PyInstaller、
+    预下载当前项目依赖的wheel。install 为 False 时（未使用项目虚拟环境的本机解释器）
+    不改动该解释器：不安装PyInstaller，也不向其 site-packages 写入预编译的 .pyc。可以随时取消；开始打包时调用 pause()，
+    当前步骤降为空闲优先级，后续步骤等到 resume() 后再继续。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    stage_updated = pyqtSignal(str)  # 当前步骤
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    STAGE_NAMES = {
+        'install': "检查PyInstaller",
+        'compile': "预编译site-packages",
+        'preimport': "预先导入PyInstaller",
+        'prefetch': "预下载项目依赖",
+    }
+
+    def __init__(self, python_path, requirements_file=None, install=True):
+        super().__init__()
+        self.python_path = python_path
+        self.requirements_file = requirements_file
+        self.install = install
+        self.stage = None
+        self.installed = False
+        self.available = False
+        self.cancelled = False
+        self.process = None
+        self.lock = threading.Lock()
+        self.resume_event = threading.Event()
+        self.resume_event.set()
+
+    def cancel(self):
+        self.cancelled = True
+        self.resume_event.set()
+        with self.lock:
+            if self.process and self.process.poll() is None:
+                kill_process_tree(self.process)
+
+    def pause(self):
+        """打包开始时让出资源"""
+        self.resume_event.clear()
+        with self.lock:
+            if self.process and self.process.poll() is None:
+                set_process_priority(self.process, True)
+
+    def resume(self):
+        self.resume_event.set()
+        with self.lock:
+            if self.process and self.process.poll() is None:
+                set_process_priority(self.process, False)
+
+    def run_step(self, cmd):
+        """运行一个步骤的子进程，返回 (退出码, 输出)；取消时返回 None"""
+        kwargs = {}
+        if os.name == 'nt':
+            kwargs['creationflags'] = subprocess.CREATE_NO_WINDOW
+        else:
+            kwargs['start_new_session'] = True
+        with self.lock:
+            if self.cancelled:
+                return None
+            self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                            stdin=subprocess.DEVNULL, **kwargs)
+            if not self.resume_event.is_set():
+                set_process_priority(self.process, True)
+        output, _ = self.process.communicate()
+        with self.lock:
+            returncode = self.process.returncode
+            self.process = None
+        if self.cancelled:
+            return None
+        return returncode, output.decode('utf-8', errors='replace')
+
+    def wait_resumed(self):
+        """暂停期间在步骤之间等待"""
+        while not self.resume_event.wait(0.2):
+            pass
+        return not self.cancelled
+
+    def enter_stage(self, stage):
+        if not self.wait_resumed():
+            return False
+        self.stage = stage
+        self.stage_updated.emit(stage)
+        return True
+
+    def run(self):
+        start = time.perf_counter()
+        steps = [('install', self.ensure_pyinstaller)]
+        if self.install:
+            steps.append(('compile', self.compile_site_packages))
+        steps.append(('preimport', self.preimport_pyinstaller))
+        if self.requirements_file:
+            steps.append(('prefetch', self.prefetch_requirements))
+        try:
+            for stage, step in steps:
+                if not self.enter_stage(stage):
+                    self.finished.emit(False, "预热已取消")
+                    return
+                if not step():
+                    if self.cancelled:
+                        self.finished.emit(False, "预热已取消")
+                        return
+                    self.progress_updated.emit(f"预热步骤未完成: {self.STAGE_NAMES[stage]}", "warning")
+            self.stage = None
+            self.finished.emit(True, f"运行时预热完成，耗时 {format_duration(time.perf_counter() - start)}")
+        except Exception as e:
+            self.stage = None
+            self.finished.emit(False, f"运行时预热失败: {str(e)}")
+
+    def ensure_pyinstaller(self):
+        result = self.run_step([self.python_path, "-m", "pip", "show", "pyinstaller"])
+        if result is None:
+            return False
+        if result[0] == 0:
+            self.available = True
+            return True
+        if not self.install:
+            return True
+        self.progress_updated.emit("预热: PyInstaller未安装，正在后台安装...", "info")
+        result = self.run_step([self.python_path, "-m", "pip", "install", "--no-warn-script-location",
+                                "--disable-pip-version-check", "pyinstaller"])
+        if result is None or result[0] != 0:
+            return False
+        self.installed = self.available = True
+        self.progress_updated.emit("预热: PyInstaller安装成功", "success")
+        return True
+
+    def compile_site_packages(self):
+        result = self.run_step([self.python_path, "-c", "import sysconfig; print(sysconfig.get_paths()['purelib'])"])
+        if result is None or result[0] != 0:
+            return False
+        site_packages = result[1].strip()
+        if not os.path.isdir(site_packages):
+            return True
+        # 个别包中带有不能编译的示例文件，编译失败不影响预热
+        return self.run_step([self.python_path, "-m", "compileall", "-q", "-j", "0", site_packages]) is not None
+
+    def preimport_pyinstaller(self):
+        if not self.available:
+            return True
+        result = self.run_step([self.python_path, "-c",
+                                "import PyInstaller.__main__, PyInstaller.building.build_main"])
+        return result is not None and result[0] == 0
+
+    def prefetch_requirements(self):
+        result = self.run_step([self.python_path, "-m", "pip", "download", "-q", "--disable-pip-version-check",
+                                "-r", self.requirements_file, "-d", get_app_data_dir('wheels')])
+        if result is None or result[0] != 0:
+            return False
+        self.progress_updated.emit("预热: 项目依赖的wheel已下载到本地缓存", "info")
+        return True
+
+
+# 本进程持有的实例锁文件，进程退出（包括崩溃）时由系统释放
+_instance_lock_file = None
+
+
+def lock_file_nonblocking(f):
+    """对已打开的文件加独占锁，已被其他进程锁住时抛出 OSError"""
+    if os.name == 'nt':
+        import msvcrt
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+    else:
+        import fcntl
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+
+
+def acquire_instance_lock():
+    """启动时在 instances/<pid>.lock 上加锁，标记本进程创建的临时目录仍在使用"""
+    global _instance_lock_file
+    if _instance_lock_file is None:
+        path = os.path.join(get_app_data_dir('instances'), f"{os.getpid()}.lock")
+        f = open(path, 'a+')
+        try:
+            lock_file_nonblocking(f)
+        except OSError:
+            f.close()
+            return
+        _instance_lock_file = f
+
+
+def instance_alive(pid):
+    """pid 对应的打包器实例是否仍在运行
+
+    以实例锁判断而不是直接检查进程是否存在，进程号被其他程序复用时也不会误判。
+    """
+    if pid == os.getpid():
+        return True
+    path = os.path.join(get_app_data_dir('instances'), f"{pid}.lock")
+    try:
+        f = open(path, 'a+')
+    except OSError:
+        return False
+    try:
+        lock_file_nonblocking(f)
+    except OSError:
+        f.close()
+        return True
+    # 能加锁说明持有者已退出，删除过期的锁文件
+    f.close()
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+    return False
+
+
+def set_background_io_priority():
+    """将当前线程降为后台优先级，删除大量文件时不影响打包和界面"""
+    try:
+        if os.name == 'nt':
+            import ctypes
+            kernel32 = ctypes.windll.kernel32
+            # THREAD_MODE_BACKGROUND_BEGIN 同时降低CPU和I/O优先级
+            kernel32.SetThreadPriority(kernel32.GetCurrentThread(), 0x00010000)
+        else:
+            # Linux上nice值按线程生效，I/O调度器据此降低磁盘优先级
+            os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), 19)
+    except (OSError, AttributeError):
+        pass
+
+
+def remove_tree_throttled(path, is_cancelled=None, batch=200, pause=0.02):
+    """自底向上删除目录，每删除 batch 个文件暂停一下，限制I/O速率
+
+    返回 (删除的字节数, 是否删除完成)
+    """
+    removed_bytes = 0
+    count = 0
+    for dirpath, dirnames, filenames in os.walk(path, topdown=False):
+        for name in filenames:
+            if is_cancelled and is_cancelled():
+                return removed_bytes, False
+            file_path = os.path.join(dirpath, name)
+            try:
+                size = os.lstat(file_path).st_size
+                try:
+                    os.remove(file_path)
+                except PermissionError:
+                    # Windows上只读文件需要先去掉只读属性
+                    os.chmod(file_path, 0o700)
+                    os.remove(file_path)
+                removed_bytes += size
+            except OSError:
+                pass
+            count += 1
+            if count % batch == 0:
+                time.sleep(pause)
+        for name in dirnames:
+            dir_path = os.path.join(dirpath, name)
+            try:
+                if os.path.islink(dir_path):
+                    os.remove(dir_path)
+                else:
+                    os.rmdir(dir_path)
+            except OSError:
+                pass
+    try:
+        os.rmdir(path)
+    except OSError:
+        return removed_bytes, not os.path.exists(path)
+    return removed_bytes, True
+
+
+_trash_counter = 0
+_trash_lock = threading.Lock()
+
+
+def discard_dir(path):
+    """立即把目录移入回收目录，然后在后台低优先级删除，不阻塞调用方
+
+    回收目录中的名称带有进程号，删除中途程序退出时，下次启动由 CleanupThread 继续删除。
+    无法移动（如跨磁盘）时在原位置后台删除。
+    """
+    global _trash_counter
+    if not os.path.exists(path):
+        return
+    with _trash_lock:
+        _trash_counter += 1
+        target = os.path.join(get_app_data_dir('trash'),
+                              f"{os.path.basename(os.path.normpath(path))}-{os.getpid()}-{_trash_counter}")
+    try:
+        os.rename(path, target)
+    except OSError:
+        target = path
+
+    def remove():
+        set_background_io_priority()
+        remove_tree_throttled(target)
+
+    threading.Thread(target=remove, daemon=True).start()
+
+
+# 临时目录名中的进程号：解压或创建环境时的 <名称>.tmp-<pid>-<线程>，
+# 依赖解析的 resolve-<pid>-<线程>，回收目录中的 <名称>-<pid>-<序号>
+TEMP_DIR_PID_PATTERN = re.compile(r'(?:\.tmp-|^resolve-)(\d+)-\d+$')
+TRASH_PID_PATTERN = re.compile(r'-(\d+)-\d+$')
+SPEC_BUILD_PID_PATTERN = re.compile(r'-\d{8}-\d{6}-(\d+)(?:-\d+)?$')
+# 正在被某个实例清理的目录
+REAPING_PID_PATTERN = re.compile(r'\.reaping-(\d+)$')
+# 旧版本用 tempfile.mkdtemp(prefix='pyinstaller_') 解压的运行时，没有进程号，按时间判断
+LEGACY_RUNTIME_MAX_AGE = 24 * 3600
+# 打包失败时保留的spec工作目录，所属实例退出后再保留一段时间以便排查
+SPEC_BUILD_MAX_AGE = 7 * 24 * 3600
+
+
+class CleanupThread(QThread):
+    """后台清理崩溃或强制退出后遗留的临时目录
+
+    清理对象:
+        trash/                 未删除完的回收目录
+        runtimes/、envs/       中途退出的解压和环境创建临时目录
+        spec_builds/           已退出实例的打包工作目录（保留 SPEC_BUILD_MAX_AGE）
+        verify_builds/         已退出实例的复现性校验打包目录
+        系统临时目录/pyinstaller_*  旧版本每次启动解压的运行时
+
+    通过实例锁判断目录的所属实例是否仍在运行，只删除已退出实例的目录。
+    删除时线程降为后台优先级并限制速率。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    def __init__(self):
+        super().__init__()
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def find_orphans(self):
+        """查找可以删除的目录，返回 [(路径, 说明)]"""
+        now = time.time()
+        data_dir = get_app_data_dir()
+
+        def owner_dead(pattern, name):
+            match = pattern.search(name)
+            return bool(match) and not instance_alive(int(match.group(1)))
+
+        def age(path):
+            try:
+                return now - os.path.getmtime(path)
+            except OSError:
+                return 0
+
+        def is_legacy_runtime(path):
+            return (os.path.isdir(path) and age(path) > LEGACY_RUNTIME_MAX_AGE and
+                    (os.path.exists(os.path.join(path, 'python.exe')) or glob.glob(os.path.join(path, 'python*._pth'))))
+
+        # (匹配模式, 判断是否遗留, 说明)
+        sources = [
+            (os.path.join(data_dir, 'trash', '*'),
+             lambda path, name: owner_dead(TRASH_PID_PATTERN, name), "未删除完的回收目录"),
+            (os.path.join(data_dir, 'runtimes', '*'),
+             lambda path, name: owner_dead(TEMP_DIR_PID_PATTERN, name), "中途退出遗留的临时目录"),
+            (os.path.join(data_dir, 'envs', '*'),
+             lambda path, name: owner_dead(TEMP_DIR_PID_PATTERN, name), "中途退出遗留的临时目录"),
+            (os.path.join(data_dir, 'envs', 'envs', '*'),
+             lambda path, name: owner_dead(TEMP_DIR_PID_PATTERN, name), "中途退出遗留的临时目录"),
+            (os.path.join(data_dir, 'envs', 'packages', '*', '*'),
+             lambda path, name: owner_dead(TEMP_DIR_PID_PATTERN, name), "中途退出遗留的临时目录"),
+            (os.path.join(data_dir, 'verify_builds', '*'),
+             lambda path, name: owner_dead(SPEC_BUILD_PID_PATTERN, name), "中途退出遗留的复现性校验目录"),
+            (os.path.join(data_dir, 'spec_builds', '*'),
+             lambda path, name: age(path) > SPEC_BUILD_MAX_AGE and owner_dead(SPEC_BUILD_PID_PATTERN, name),
+             "过期的打包工作目录"),
+            (os.path.join(tempfile.gettempdir(), 'pyinstaller_*'),
+             lambda path, name: is_legacy_runtime(path), "旧版本遗留的临时运行时"),
+        ]
+        orphans = []
+        for pattern, is_orphan, reason in sources:
+            for path in glob.glob(pattern):
+                name = os.path.basename(path)
+                if REAPING_PID_PATTERN.search(name):
+                    # 上次清理到一半的目录
+                    if owner_dead(REAPING_PID_PATTERN, name):
+                        orphans.append((path, reason))
+                elif is_orphan(path, name):
+                    orphans.append((path, reason))
+        return orphans
+
+    def run(self):
+        set_background_io_priority()
+        try:
+            orphans = self.find_orphans()
+        except Exception as e:
+            self.finished.emit(False, f"查找遗留目录失败: {str(e)}")
+            return
+
+        removed_dirs = 0
+        removed_bytes = 0
+        for path, reason in orphans:
+            if self.cancelled:
+                break
+            # 先改名：Windows上仍被其他进程使用的目录无法改名，跳过；改名后也不会被其他实例重复清理
+            reaping = REAPING_PID_PATTERN.sub('', path) + f".reaping-{os.getpid()}"
+            try:
+                os.rename(path, reaping)
+            except OSError:
+                continue
+            self.progress_updated.emit(f"清理{reason}: {path}", "debug")
+            size, done = remove_tree_throttled(reaping, lambda: self.cancelled)
+            removed_bytes += size
+            removed_dirs += done
+
+        if removed_dirs:
+            self.progress_updated.emit(f"已清理 {removed_dirs} 个遗留目录，释放 {format_size(removed_bytes)}", "info")
+        self.finished.emit(True, "清理完成" if not self.cancelled else "清理已取消")
+
+
+class RuntimeSession(QObject):
+    """前端持有的运行时准备会话，信号与 RuntimePrepareThread 相同
+
+    同一进程中准备相同运行时（本机解释器还要求是同一个项目）的会话共用一个准备线程，
+    后加入的会话不会再解压一次。release() 后不再收到信号。
+    key 与 RuntimeManager.prepare_key 相同，前端用它判断准备结果是否适用于当前的运行时和项目。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+    python_path_updated = pyqtSignal(str, str)  # python路径, 运行时目录
+
+    def __init__(self, shared, key):
+        super().__init__()
+        self.shared = shared
+        self.key = key
+        self.runtime_id = key[0]
+        self.preparing = True
+
+    def isRunning(self):
+        return self.preparing
+
+    def release(self):
+        """退出会话；最后一个会话退出时取消仍在进行的准备"""
+        self.preparing = False
+        self.shared.detach(self)
+
+    def wait(self):
+        """最后一个会话退出后等待准备线程退出（取消后很快结束）"""
+        if not self.shared.sessions:
+            self.shared.thread.wait()
+
+
+class WarmupSession(QObject):
+    """前端持有的预热会话，接口与 RuntimeWarmupThread 相同
+
+    相同解释器和依赖文件的会话共用一个预热线程。任一会话 pause() 时预热暂停，
+    所有会话都 resume() 后继续；cancel() 只退出本会话，最后一个会话退出时才取消预热线程。
+    """
+
+    # 信号定义
+    progress_updated = pyqtSignal(str, str)  # 消息, 级别
+    stage_updated = pyqtSignal(str)  # 当前步骤
+    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
+
+    def __init__(self, shared):
+        super().__init__()
+        self.shared = shared
+        self.paused = False
+        self.attached = True
+
+    @property
+    def stage(self):
+        return self.shared.thread.stage
+
+    @property
+    def installed(self):
+        return self.shared.thread.installed
+
+    def start(self):
+        if not self.shared.thread.isRunning() and not self.shared.thread.isFinished():
+            self.shared.thread.start()
+
+    def isRunning(self):
+        return self.attached and self.shared.thread.isRunning()
+
+    def pause(self):
+        self.paused = True
+        self.shared.update_pause()
+
+    def resume(self):
+        self.paused = False
+        self.shared.update_pause()
+
+    def cancel(self):
+        if self.attached:
+            self.attached = False
+            self.shared.detach(self)
+
+    def wait(self):
+        """最后一个会话取消后等待预热线程退出"""
+        if not self.shared.sessions:
+            self.shared.thread.wait()
+
+
+class SharedThread(QObject):
+    """多个会话共用的后台线程，在主线程中把线程的信号转发给仍然持有的会话
+
+    最后一个会话退出时调用 on_idle；线程结束时调用 on_done，之后的新会话会使用新线程。
+    """
+
+    def __init__(self, thread, on_idle=None, on_done=None):
+        super().__init__()
+        self.thread = thread
+        self.sessions = []
+        self.on_idle = on_idle
+        self.on_done = on_done
+        self.result = None
+        # 绑定到本对象的方法，跨线程的信号排队到主线程执行
+        thread.progress_updated.connect(self.relay_progress)
+        thread.finished.connect(self.relay_finished)
+        if hasattr(thread, 'python_path_updated'):
+            thread.python_path_updated.connect(self.relay_python_path)
+        if hasattr(thread, 'stage_updated'):
+            thread.stage_updated.connect(self.relay_stage)
+
+    def attach(self, session):
+        self.sessions.append(session)
+        return session
+
+    def detach(self, session):
+        if session in self.sessions:
+            self.sessions.remove(session)
+            if not self.sessions and self.on_idle:
+                self.on_idle(self)
+
+    def update_pause(self):
+        if any(session.paused for session in self.sessions):
+            self.thread.pause()
+        else:
+            self.thread.resume()
+
+    def relay_progress(self, message, level):
+        for session in list(self.sessions):
+            session.progress_updated.emit(message, level)
+
+    def relay_python_path(self, python_path, runtime_dir):
+        # 与完成信号一起转发，结果出来之后才加入的会话也能收到
+        self.result = (python_path, runtime_dir)
+
+    def relay_stage(self, stage):
+        for session in list(self.sessions):
+            session.stage_updated.emit(stage)
+
+    def relay_finished(self, success, message):
+        # 线程对象的 run() 已返回，但 isRunning() 可能仍为 True，先等待线程完全退出
+        self.thread.wait()
+        if self.on_done:
+            self.on_done(self)
+        for session in list(self.sessions):
+            if isinstance(session, RuntimeSession):
+                session.preparing = False
+                if self.result:
+                    session.python_path_updated.emit(*self.result)
+            session.finished.emit(success, message)
+
+
+class RuntimeManager(QObject):
+    """进程内共用的运行时管理器
+
+    打包器和Spec编辑器在同一进程中运行（pyinstaller_suite.py）时共用一个运行时登记表，
+    相同运行时只准备一次、预热一次，各自通过引用计数的会话使用。
+    跨进程时由 runtimes/<id>.lock 保证同一运行时只解压一次。
+    """
+
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        if cls._instance is None:
+            cls._instance = cls(RuntimeRegistry(program_dir()))
+        return cls._instance
+
+    def __init__(self, registry):
+        super().__init__()
+        self.registry = registry
+        self.preparations = {}
+        self.warmups = {}
+        self.cleanup_started = False
+
+    def prepare_key(self, runtime_id, source_file):
+        # 只有本机解释器按项目准备虚拟环境，其他运行时与项目无关
+        if source_file and self.registry.runtimes[runtime_id]['kind'] == 'host':
+            return runtime_id, RuntimeRegistry.project_key(source_file)
+        return runtime_id, None
+
+    def acquire(self, runtime_id, source_file=None):
+        """取得运行时准备会话：已有相同的准备正在进行时加入，否则启动新的准备线程"""
+        key = self.prepare_key(runtime_id, source_file)
+        shared = self.preparations.get(key)
+        joined = shared is not None
+        if not joined:
+            thread = RuntimePrepareThread(self.registry, runtime_id, source_file if key[1] else None)
+            shared = SharedThread(thread, on_idle=self.cancel_preparation(key),
+                                  on_done=lambda s: self.forget(self.preparations, key, s))
+            self.preparations[key] = shared
+        session = shared.attach(RuntimeSession(shared, key))
+        if joined:
+            # 会话在事件循环中连接信号，下一轮再通知
+            QTimer.singleShot(0, lambda: session.preparing and session.progress_updated.emit(
+                f"运行时正在由其他窗口准备，等待完成: {self.registry.describe(runtime_id)}", "info"))
+        else:
+            shared.thread.start()
+        return session
+
+    def warmup(self, python_path, requirements_file=None, install=True):
+        """取得预热会话：相同解释器和依赖文件的预热正在进行时加入，调用 start() 才启动"""
+        key = (python_path, requirements_file, install)
+        shared = self.warmups.get(key)
+        if shared is None:
+            shared = SharedThread(RuntimeWarmupThread(python_path, requirements_file, install),
+                                  on_idle=self.cancel_warmup(key),
+                                  on_done=lambda s: self.forget(self.warmups, key, s))
+            self.warmups[key] = shared
+        return shared.attach(WarmupSession(shared))
+
+    def cancel_preparation(self, key):
+        def on_idle(shared):
+            # 没有会话等待的准备（如窗口已关闭）立即取消，之后的新会话重新准备
+            shared.thread.cancel()
+            self.forget(self.preparations, key, shared)
+        return on_idle
+
+    def cancel_warmup(self, key):
+        def on_idle(shared):
+            # 没有会话使用的预热立即取消，之后的新会话启动新的预热
+            shared.thread.cancel()
+            self.forget(self.warmups, key, shared)
+        return on_idle
+
+    @staticmethod
+    def forget(table, key, shared):
+        if table.get(key) is shared:
+            del table[key]
+
+    def claim_cleanup(self):
+        """遗留目录每个进程只需清理一次，第一个调用者返回 True"""
+        if self.cleanup_started:
+            return False
+        self.cleanup_started = True
+        return True
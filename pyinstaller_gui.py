@@ -1,182 +1,640 @@
 import sys
 import os
+import re
+import time
 import subprocess
 import platform
-import zipfile
-import tempfile
+
+# 记录进程启动后最早的时间点，用于 --startup-time 统计首次绘制耗时
+STARTUP_TIME = time.perf_counter()
+
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QLineEdit, QFileDialog, QCheckBox, QComboBox,
     QTextEdit, QGroupBox, QGridLayout, QSpinBox, QListWidget,
     QListWidgetItem, QAbstractItemView, QMessageBox, QSplitter,
-    QTabWidget, QRadioButton, QScrollArea
+    QTabWidget, QRadioButton, QScrollArea, QProgressBar, QListView
+)
+from PyQt5.QtCore import Qt, QProcess, QTimer, QEvent, pyqtSignal
+from PyQt5.QtGui import QFont, QIcon, QColor
+from pyinstaller_common import (
+    StagingThread, DirectoryScanThread, ScanCache, LogView, OutputDecoder, BuildLogStore,
+    LogSearchDialog, BuildHistory, BuildProgressTracker, PHASE_NAMES, StringListModel,
+    ModuleIndex, ModuleIndexThread, ModuleCompleter, DUAL_OUTPUT_DRIVER, format_command,
+    RuntimeManager, RuntimeWarmupThread, ProjectEnvStore, ProjectEnvForkThread, get_app_data_dir,
+    CleanupThread, acquire_instance_lock, ArtifactCompareThread, canonical_path, sorted_unique, source_date_epoch,
+    reproducible_environment, unique_dir_name, discard_dir, SourceWatcher, WATCH_MAX_PATHS,
+    kill_qprocess_tree, discard_partial_outputs, ManifestThread, read_collect_tocs,
+    selected_rows, sorted_view, split_patterns, format_size, format_duration
 )
-from PyQt5.QtCore import Qt, QProcess, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QIcon
 
-class PythonExtractThread(QThread):
-    # 信号定义
-    progress_updated = pyqtSignal(str, str)  # 消息, 级别
-    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
-    python_path_updated = pyqtSignal(str, str)  # python路径, 解压目录
+# 浅色主题样式表
+LIGHT_STYLESHEET = """
+    QMainWindow {
+        background-color: #f0f0f0;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QGroupBox {
+        border: 1px solid #d0d0d0;
+        border-radius: 5px;
+        margin-top: 10px;
+        background-color: white;
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 10px;
+        padding: 0 3px 0 3px;
+        background-color: #f0f0f0;
+    }
     
-    def __init__(self, python_zip):
-        super().__init__()
-        self.python_zip = python_zip
-        self.python_path = None
-        self.extracted_python_dir = None
+    /* 卡片悬浮效果 */
+    QWidget[card="true"] {
+        background-color: white;
+        border-radius: 8px;
+        padding: 15px;
+        border: 1px solid #e0e0e0;
+    }
+    QWidget[card="true"]:hover {
+        border-color: #4CAF50;
+        background-color: #f8fff8;
+    }
     
-    def run(self):
-        """后台解压Python压缩包"""
-        self.progress_updated.emit("开始解压Python压缩包...", "info")
-        
-        if not os.path.exists(self.python_zip):
-            self.progress_updated.emit(f"错误: Python压缩包不存在: {self.python_zip}", "error")
-            self.finished.emit(False, "Python压缩包不存在")
-            return
-        
-        try:
-            # 创建临时目录，避免中文路径导致的编码问题
-            self.extracted_python_dir = tempfile.mkdtemp(prefix='pyinstaller_')
-            self.progress_updated.emit(f"正在解压Python到临时目录: {self.extracted_python_dir}", "info")
-            
-            # 解压压缩包
-            with zipfile.ZipFile(self.python_zip, 'r') as zip_ref:
-                # 获取文件总数用于进度计算
-                total_files = len(zip_ref.infolist())
-                extracted_files = 0
-                last_progress = -1
-                
-                for file_info in zip_ref.infolist():
-                    zip_ref.extract(file_info, self.extracted_python_dir)
-                    extracted_files += 1
-                    
-                    # 计算当前进度百分比
-                    progress = int((extracted_files / total_files) * 100)
-                    
-                    # 每达到10%的整数倍时更新一次进度
-                    if progress % 10 == 0 and progress > last_progress:
-                        self.progress_updated.emit(f"解压进度: {progress}% ({extracted_files}/{total_files}文件)", "info")
-                        last_progress = progress
-            
-            # 找到python.exe路径
-            self.python_path = os.path.join(self.extracted_python_dir, 'python.exe')
-            if not os.path.exists(self.python_path):
-                self.progress_updated.emit("错误: 未找到python.exe", "error")
-                self.finished.emit(False, "未找到python.exe")
-                return
-            
-            # 修改python39._pth文件，启用site模块并添加必要的路径
-            pth_file = os.path.join(self.extracted_python_dir, 'python39._pth')
-            if os.path.exists(pth_file):
-                with open(pth_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # 取消注释import site
-                content = content.replace('#import site', 'import site')
-                
-                # 添加必要的路径配置
-                if 'Lib' not in content:
-                    # 确保Lib目录和Lib/site-packages都在路径中
-                    lines = content.split('\n')
-                    updated = False
-                    for i, line in enumerate(lines):
-                        if line.strip() == '.':
-                            # 在当前目录之后添加Lib目录
-                            lines.insert(i+1, 'Lib')
-                            updated = True
-                            break
-                    if not updated:
-                        # 如果没有找到当前目录，直接添加Lib目录
-                        lines.append('Lib')
-                    content = '\n'.join(lines)
-                
-                with open(pth_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                self.progress_updated.emit("已修改python39._pth，启用site模块并添加Lib路径", "info")
-            
-            self.progress_updated.emit(f"成功解压Python，可执行文件路径: {self.python_path}", "success")
-            self.python_path_updated.emit(self.python_path, self.extracted_python_dir)
-            self.finished.emit(True, "Python解压成功")
-        except Exception as e:
-            self.progress_updated.emit(f"解压Python失败: {str(e)}", "error")
-            self.finished.emit(False, f"解压Python失败: {str(e)}")
+    /* 按钮样式 */
+    QPushButton {
+        background-color: #e0e0e0;
+        border: 1px solid #d0d0d0;
+        border-radius: 3px;
+        padding: 5px 10px;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QPushButton:hover {
+        background-color: #4CAF50;
+        color: white;
+        border-color: #45a049;
+    }
+    QPushButton:pressed {
+        background-color: #3e8e41;
+    }
+    
+    /* 输入框样式 */
+    QLineEdit {
+        border: 1px solid #d0d0d0;
+        border-radius: 3px;
+        padding: 5px;
+        background-color: white;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QLineEdit:hover {
+        border-color: #4CAF50;
+        background-color: #f8fff8;
+    }
+    QLineEdit:focus {
+        border-color: #4CAF50;
+        background-color: white;
+    }
+    
+    /* 复选框样式 */
+    QCheckBox {
+        padding: 5px;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QCheckBox:hover {
+        color: #4CAF50;
+    }
+    
+    /* 单选按钮样式 */
+    QRadioButton {
+        padding: 5px;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QRadioButton:hover {
+        color: #4CAF50;
+    }
+    
+    /* 标签样式 */
+    QLabel {
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    
+    /* 标签页样式 */
+    QTabWidget::pane {
+        border: 1px solid #d0d0d0;
+        background-color: white;
+    }
+    QTabBar::tab {
+        background-color: #e0e0e0;
+        border: 1px solid #d0d0d0;
+        border-bottom-color: transparent;
+        padding: 8px 16px;
+        margin-right: 2px;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QTabBar::tab:hover {
+        background-color: #d0d0d0;
+    }
+    QTabBar::tab:selected {
+        background-color: white;
+        border-bottom-color: white;
+    }
+    
+    /* 列表框样式 */
+    QListView {
+        border: 1px solid #d0d0d0;
+        border-radius: 3px;
+        background-color: white;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QListView:hover {
+        border-color: #4CAF50;
+    }
+    
+    /* 文本编辑框样式 */
+    QTextEdit {
+        border: 1px solid #d0d0d0;
+        border-radius: 3px;
+        background-color: white;
+        font-family: 'Consolas', 'Courier New', monospace;
+    }
+    QTextEdit:hover {
+        border-color: #4CAF50;
+    }
+    
+    /* 滚动区域样式 */
+    QScrollArea {
+        background-color: transparent;
+    }
+    /* 日志输出框 */
+    #logText {
+        background-color: #f8f8f8;
+        border: 1px solid #d0d0d0;
+        border-radius: 3px;
+    }
+"""
+
+# 深色主题样式表
+DARK_STYLESHEET = """
+    QMainWindow {
+        background-color: #121212;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QGroupBox {
+        border: 1px solid #333333;
+        border-radius: 5px;
+        margin-top: 10px;
+        background-color: #1e1e1e;
+        color: #ffffff;
+    }
+    QGroupBox::title {
+        subcontrol-origin: margin;
+        left: 10px;
+        padding: 0 3px 0 3px;
+        background-color: #121212;
+        color: #ffffff;
+    }
+    
+    /* 卡片悬浮效果 */
+    QWidget[card="true"] {
+        background-color: #1e1e1e;
+        border-radius: 8px;
+        padding: 15px;
+        border: 1px solid #333333;
+    }
+    QWidget[card="true"]:hover {
+        border-color: #4CAF50;
+        background-color: #2a2a2a;
+    }
+    
+    /* 按钮样式 */
+    QPushButton {
+        background-color: #333333;
+        border: 1px solid #444444;
+        border-radius: 3px;
+        padding: 5px 10px;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QPushButton:hover {
+        background-color: #4CAF50;
+        color: white;
+        border-color: #45a049;
+    }
+    QPushButton:pressed {
+        background-color: #3e8e41;
+    }
+    
+    /* 输入框样式 */
+    QLineEdit {
+        border: 1px solid #333333;
+        border-radius: 3px;
+        padding: 5px;
+        background-color: #2a2a2a;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QLineEdit:hover {
+        border-color: #4CAF50;
+        background-color: #333333;
+    }
+    QLineEdit:focus {
+        border-color: #4CAF50;
+        background-color: #2a2a2a;
+    }
+    
+    /* 复选框样式 */
+    QCheckBox {
+        padding: 5px;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QCheckBox:hover {
+        color: #4CAF50;
+    }
+    
+    /* 单选按钮样式 */
+    QRadioButton {
+        padding: 5px;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QRadioButton:hover {
+        color: #4CAF50;
+    }
+    
+    /* 标签样式 */
+    QLabel {
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    
+    /* 标签页样式 */
+    QTabWidget::pane {
+        border: 1px solid #333333;
+        background-color: #1e1e1e;
+    }
+    QTabBar::tab {
+        background-color: #333333;
+        border: 1px solid #444444;
+        border-bottom-color: transparent;
+        padding: 8px 16px;
+        margin-right: 2px;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QTabBar::tab:hover {
+        background-color: #444444;
+    }
+    QTabBar::tab:selected {
+        background-color: #1e1e1e;
+        border-bottom-color: #1e1e1e;
+    }
+    
+    /* 列表框样式 */
+    QListView {
+        border: 1px solid #333333;
+        border-radius: 3px;
+        background-color: #2a2a2a;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QListView:hover {
+        border-color: #4CAF50;
+    }
+    
+    /* 文本编辑框样式 */
+    QTextEdit {
+        border: 1px solid #333333;
+        border-radius: 3px;
+        background-color: #2a2a2a;
+        color: #ffffff;
+        font-family: '微软雅黑', '黑体', sans-serif;
+    }
+    QTextEdit:hover {
+        border-color: #4CAF50;
+    }
+    
+    /* 滚动区域样式 */
+    QScrollArea {
+        background-color: transparent;
+    }
+    
+    /* 滚动条样式 */
+    QScrollBar:vertical {
+        background-color: #333333;
+        width: 10px;
+        margin: 0px;
+        border-radius: 5px;
+    }
+    QScrollBar::handle:vertical {
+        background-color: #666666;
+        border-radius: 5px;
+    }
+    QScrollBar::handle:vertical:hover {
+        background-color: #888888;
+    }
+    QScrollBar:horizontal {
+        background-color: #333333;
+        height: 10px;
+        margin: 0px;
+        border-radius: 5px;
+    }
+    QScrollBar::handle:horizontal {
+        background-color: #666666;
+        border-radius: 5px;
+    }
+    QScrollBar::handle:horizontal:hover {
+        background-color: #888888;
+    }
+    
+    /* 日志输出框 */
+    #logText {
+        background-color: #2a2a2a;
+        border: 1px solid #333333;
+        border-radius: 3px;
+    }
+"""
+
+def scope_stylesheet(stylesheet, scope, theme):
+    """把样式表的每条选择器限定到 objectName 为 scope 且 theme 属性匹配的窗口内，
+    这样两套主题可以同时放进应用级样式表，切换主题只需修改窗口的 theme 属性"""
+    stylesheet = re.sub(r'/\*.*?\*/', '', stylesheet, flags=re.S)
+    prefix = f'#{scope}[theme="{theme}"]'
+    
+    def scope_selectors(match):
+        selectors = []
+        for selector in match.group(1).split(','):
+            selector = selector.strip()
+            if selector.startswith('QMainWindow'):
+                # 窗口自身的规则，不是后代选择器
+                selectors.append(f'QMainWindow{prefix}{selector[len("QMainWindow"):]}')
+            else:
+                selectors.append(f'{prefix} {selector}')
+        return '\n    ' + ', '.join(selectors) + ' {'
+    
+    return re.sub(r'([^{}]+)\{', scope_selectors, stylesheet)
+
+# 应用级样式表，只在第一个窗口创建时设置一次
+THEMED_STYLESHEET = (scope_stylesheet(LIGHT_STYLESHEET, 'pyinstallerGui', 'light')
+                     + scope_stylesheet(DARK_STYLESHEET, 'pyinstallerGui', 'dark'))
 
 class PyInstallerGUI(QMainWindow):
-    def __init__(self):
+    # 窗口关闭流程完成（后台线程均已结束）
+    closed = pyqtSignal()
+    
+    def __init__(self, report_startup_time=False, embedded=False):
         super().__init__()
+        self.report_startup_time = report_startup_time
+        self.embedded = embedded
+        self.first_paint_done = False
+        self.dark_mode = False
+        self.tab_builders = {}
+        self.module_index = ModuleIndex()
         self.init_ui()
         self.process = None
+        # 正在运行的打包和PIP进程，可以统一停止，超时后强制结束
+        self.running_processes = []
         self.python_path = None
-        self.extracted_python_dir = None
         self.python_thread = None
+        self.runtime_pending = False
+        # 向共用的虚拟环境安装包前，先为项目创建独立环境，期间提交的安装依次排队
+        self.env_fork_thread = None
+        self.env_fork_actions = []
+        self.staging_thread = None
+        self.scan_threads = {}
+        self.scan_results = {}
+        self.scan_cache = ScanCache()
+        self.log_store = BuildLogStore.instance()
+        self.build_history = BuildHistory()
+        self.build_tracker = None
+        self.build_keys = None
+        self.module_index_thread = None
+        self.module_index_pending = False
+        self.warmup_thread = None
+        self.packaging_pending = None
+        self.cleanup_thread = None
+        self.verify_state = None
+        self.compare_thread = None
+        self.manifest_threads = []
+        # 监视模式：源码变化后自动增量重新打包
+        self.source_watcher = SourceWatcher(parent=self)
+        self.source_watcher.changed.connect(self.on_sources_changed)
+        self.source_watcher.refreshed.connect(self.on_watch_refreshed)
+        self.watch_announce = False
+        self.watch_build = False
+        self.watch_restart = False
         self.close_pending = False
+        # 标记本实例的临时目录仍在使用，避免被其他实例清理
+        acquire_instance_lock()
         # 检测系统信息
         self.detect_system()
-        # 启动后台线程解压Python
-        self.start_python_extract()
-        # 显示窗口
-        self.show()
+        # 启动后台线程准备默认运行时
+        self.start_runtime_prepare()
+        # 显示窗口；作为标签页嵌入时由外层窗口显示
+        if not embedded:
+            self.show()
+        # 启动完成后再在后台清理遗留的临时目录
+        QTimer.singleShot(5000, self.start_cleanup)
+    
+    def start_cleanup(self):
+        """后台清理崩溃或强制退出后遗留的运行时和临时目录"""
+        if self.close_pending or not self.runtime_manager.claim_cleanup():
+            return
+        self.cleanup_thread = CleanupThread()
+        self.cleanup_thread.progress_updated.connect(self.append_log)
+        self.cleanup_thread.start()
     
     def detect_system(self):
-        """检测系统信息，确定使用哪个Python压缩包"""
+        """检测系统信息，登记可用的Python运行时"""
         self.system_arch = platform.architecture()[0]
         self.append_log(f"系统架构: {self.system_arch}", "info")
         
-        # 获取程序所在目录，确保在被打包成exe后仍能找到压缩包
-        if getattr(sys, 'frozen', False):
-            # 程序被打包成exe的情况
-            if hasattr(sys, '_MEIPASS'):
-                # 单文件模式：使用临时解压目录
-                program_dir = sys._MEIPASS
-            else:
-                # 目录模式：使用程序可执行文件目录
-                program_dir = os.path.dirname(sys.executable)
-        else:
-            # 正常运行Python脚本的情况
-            program_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 根据系统架构选择对应的Python压缩包
-        if self.system_arch == '64bit':
-            self.python_zip = os.path.join(program_dir, 'python-3.9.13-embed-amd64.zip')
+        # 与同一进程中的Spec编辑器共用运行时登记表和准备、预热线程
+        self.runtime_manager = RuntimeManager.instance()
+        self.runtime_registry = self.runtime_manager.registry
+        self.runtime_id = self.runtime_registry.default_runtime_id(self.system_arch)
+        self.update_runtime_combo()
+        if self.runtime_id:
+            self.append_log(f"默认Python运行时: {self.runtime_registry.describe(self.runtime_id)}", "info")
         else:
-            self.python_zip = os.path.join(program_dir, 'python-3.9.13-embed-win32.zip')
-        
-        self.append_log(f"将使用Python压缩包: {os.path.basename(self.python_zip)}", "info")
+            self.append_log("未找到可用的Python运行时", "error")
+    
+    def update_runtime_combo(self):
+        """刷新运行时下拉框，选中当前运行时"""
+        self.runtime_combo.blockSignals(True)
+        self.runtime_combo.clear()
+        for runtime_id in self.runtime_registry.runtimes:
+            self.runtime_combo.addItem(self.runtime_registry.describe(runtime_id), runtime_id)
+        index = self.runtime_combo.findData(self.runtime_id)
+        if index >= 0:
+            self.runtime_combo.setCurrentIndex(index)
+        self.runtime_combo.blockSignals(False)
+    
+    def on_runtime_selected(self, index):
+        """切换运行时：记录为当前项目的选择并在后台准备"""
+        runtime_id = self.runtime_combo.itemData(index)
+        if not runtime_id or runtime_id == self.runtime_id:
+            return
+        if self.project_source():
+            self.runtime_registry.set_project_runtime(self.project_source(), runtime_id)
+        self.select_runtime(runtime_id)
     
-    def start_python_extract(self):
-        """启动后台线程解压Python"""
-        # 创建并启动解压线程
-        self.python_thread = PythonExtractThread(self.python_zip)
+    def select_runtime(self, runtime_id):
+        """使用指定的运行时，首次使用时才解压"""
+        self.runtime_id = runtime_id
+        self.cancel_warmup()
+        self.python_path = None
+        self.module_index = ModuleIndex()
+        self.update_runtime_combo()
+        self.start_runtime_prepare()
+    
+    def project_source(self):
+        """当前项目的脚本，用于选择运行时和项目虚拟环境"""
+        source_file = self.source_edit.text().strip()
+        return os.path.abspath(source_file) if source_file and os.path.isfile(source_file) else None
+    
+    def on_project_changed(self):
+        """切换项目：使用该项目上次选择的运行时，本机解释器为项目准备独立的虚拟环境"""
+        source_file = self.project_source()
+        if not source_file:
+            return
+        self.refresh_watch()
+        runtime_id = self.runtime_registry.project_runtime(source_file)
+        if runtime_id and runtime_id != self.runtime_id:
+            self.select_runtime(runtime_id)
+        elif self.runtime_id and self.runtime_registry.runtimes[self.runtime_id]['kind'] == 'host':
+            self.cancel_warmup()
+            self.python_path = None
+            self.module_index = ModuleIndex()
+            self.start_runtime_prepare()
+        elif self.python_path:
+            # 预下载新项目的依赖
+            self.start_warmup()
+    
+    def start_runtime_prepare(self):
+        """启动后台线程准备当前运行时"""
+        if not self.runtime_id:
+            return
+        if self.python_thread and self.python_thread.isRunning():
+            # 正在准备其他运行时，完成后再准备当前选择的运行时
+            self.runtime_pending = True
+            return
+        
+        self.runtime_pending = False
+        if self.python_thread:
+            self.python_thread.release()
+        # 取得准备会话，相同运行时已在准备时共用同一个线程
+        self.python_thread = self.runtime_manager.acquire(self.runtime_id, self.project_source())
         
         # 连接信号
         self.python_thread.progress_updated.connect(self.append_log)
         self.python_thread.python_path_updated.connect(self.on_python_extracted)
         self.python_thread.finished.connect(self.on_python_extract_finished)
-        
-        # 启动线程
-        self.python_thread.start()
     
-    def on_python_extracted(self, python_path, extracted_dir):
-        """Python解压完成后的处理"""
-        self.python_path = python_path
-        self.extracted_python_dir = extracted_dir
+    def on_python_extracted(self, python_path, runtime_dir):
+        """运行时准备完成后的处理"""
+        # 嵌入式包等运行时与项目无关，只有本机解释器要求准备时的项目仍是当前项目
+        if self.python_thread.key == self.runtime_manager.prepare_key(self.runtime_id, self.project_source()):
+            self.python_path = python_path
     
     def on_python_extract_finished(self, success, message):
-        """解压线程完成后的处理"""
+        """准备线程完成后的处理"""
+        # 关闭时会话已退出，不再处理
+        if self.close_pending:
+            return
+        
+        if self.runtime_pending:
+            self.start_runtime_prepare()
+            return
+        
         if success:
-            self.append_log("Python解压完成，软件已准备就绪", "success")
+            self.append_log("Python运行时已就绪，软件已准备就绪", "success")
+            # 显示测得的启动耗时
+            self.update_runtime_combo()
+            self.refresh_module_index()
+            self.start_warmup()
         else:
-            self.append_log(f"Python解压失败: {message}", "error")
+            self.append_log(f"Python运行时准备失败: {message}", "error")
+    
+    def start_warmup(self):
+        """运行时就绪后在后台预热：安装PyInstaller、预编译、预导入、预下载项目依赖"""
+        self.cancel_warmup()
+        if not self.python_path or self.close_pending:
+            return
+        source_file = self.project_source()
+        requirements_file = ProjectEnvStore.project_requirements(source_file) if source_file else None
+        # 本机解释器只在项目虚拟环境中安装，不改动系统的Python
+        install = self.runtime_registry.runtimes[self.runtime_id]['kind'] != 'host' or source_file is not None
+        self.warmup_thread = self.runtime_manager.warmup(self.python_path, requirements_file, install)
+        self.warmup_thread.progress_updated.connect(self.append_log)
+        self.warmup_thread.stage_updated.connect(self.on_warmup_stage)
+        thread = self.warmup_thread
+        thread.finished.connect(lambda success, message: self.on_warmup_finished(thread, success, message))
+        if self.process and self.process.state() != QProcess.NotRunning:
+            # 正在打包时启动的预热直接进入暂停状态
+            self.warmup_thread.pause()
+        self.warmup_thread.start()
+    
+    def cancel_warmup(self):
+        """取消正在进行的预热"""
+        if self.warmup_thread and self.warmup_thread.isRunning():
+            self.warmup_thread.cancel()
+            self.warmup_thread.wait()
+        self.warmup_thread = None
+        if self.packaging_pending:
+            self.packaging_pending = None
+            self.pack_btn.setEnabled(True)
+            self.update_stop_button()
+    
+    def resume_warmup(self):
+        """打包结束后继续预热"""
+        if self.warmup_thread and self.warmup_thread.isRunning():
+            self.warmup_thread.resume()
+    
+    def on_warmup_stage(self, stage):
+        """预热进入下一步骤；等待预热安装PyInstaller的打包在安装步骤结束后继续"""
+        self.append_log(f"预热: {RuntimeWarmupThread.STAGE_NAMES[stage]}", "debug")
+        if stage != 'install' and self.packaging_pending:
+            source_file = self.packaging_pending
+            self.packaging_pending = None
+            self.warmup_thread.pause()
+            self.check_pyinstaller(source_file)
+    
+    def on_warmup_finished(self, thread, success, message):
+        """预热线程完成后的处理"""
+        self.append_log(message, "info" if success else "warning")
+        if thread is not self.warmup_thread:
+            # 已取消的预热
+            return
+        if thread.installed:
+            self.refresh_module_index()
+        if self.packaging_pending:
+            source_file = self.packaging_pending
+            self.packaging_pending = None
+            self.check_pyinstaller(source_file)
+    
+    def refresh_module_index(self):
+        """在后台建立或增量更新运行时的模块索引，用于模块名自动补全"""
+        if not self.python_path or self.close_pending:
+            return
+        if self.module_index_thread and self.module_index_thread.isRunning():
+            # 正在建立索引时又有新的安装，完成后再更新一次
+            self.module_index_pending = True
+            return
         
-        # 检查是否有关闭请求
-        if self.close_pending:
-            self.really_close()
+        self.module_index_pending = False
+        self.module_index_thread = ModuleIndexThread(self.python_path, self.python_path)
+        self.module_index_thread.progress_updated.connect(self.append_log)
+        self.module_index_thread.index_updated.connect(self.on_module_index_updated)
+        self.module_index_thread.finished.connect(self.on_module_index_finished)
+        self.module_index_thread.start()
+    
+    def on_module_index_updated(self, index):
+        """模块索引更新后的处理"""
+        self.module_index = index
     
-    def extract_python(self):
-        """已废弃，使用后台线程解压Python"""
-        pass
+    def on_module_index_finished(self, success, message):
+        """模块索引线程完成后的处理"""
+        if self.module_index_pending:
+            self.refresh_module_index()
     
     def init_ui(self):
         self.setWindowTitle("PyInstaller GUI - Python打包器")
@@ -187,142 +645,12 @@ class PyInstallerGUI(QMainWindow):
         font = QFont("微软雅黑", 9)
         QApplication.setFont(font)
         
-        # 设置全局样式
-        self.setStyleSheet("""
-            QMainWindow {
-                background-color: #f0f0f0;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QGroupBox {
-                border: 1px solid #d0d0d0;
-                border-radius: 5px;
-                margin-top: 10px;
-                background-color: white;
-            }
-            QGroupBox::title {
-                subcontrol-origin: margin;
-                left: 10px;
-                padding: 0 3px 0 3px;
-                background-color: #f0f0f0;
-            }
-            
-            /* 卡片悬浮效果 */
-            QWidget[card="true"] {
-                background-color: white;
-                border-radius: 8px;
-                padding: 15px;
-                border: 1px solid #e0e0e0;
-            }
-            QWidget[card="true"]:hover {
-                border-color: #4CAF50;
-                background-color: #f8fff8;
-            }
-            
-            /* 按钮样式 */
-            QPushButton {
-                background-color: #e0e0e0;
-                border: 1px solid #d0d0d0;
-                border-radius: 3px;
-                padding: 5px 10px;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QPushButton:hover {
-                background-color: #4CAF50;
-                color: white;
-                border-color: #45a049;
-            }
-            QPushButton:pressed {
-                background-color: #3e8e41;
-            }
-            
-            /* 输入框样式 */
-            QLineEdit {
-                border: 1px solid #d0d0d0;
-                border-radius: 3px;
-                padding: 5px;
-                background-color: white;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QLineEdit:hover {
-                border-color: #4CAF50;
-                background-color: #f8fff8;
-            }
-            QLineEdit:focus {
-                border-color: #4CAF50;
-                background-color: white;
-            }
-            
-            /* 复选框样式 */
-            QCheckBox {
-                padding: 5px;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QCheckBox:hover {
-                color: #4CAF50;
-            }
-            
-            /* 单选按钮样式 */
-            QRadioButton {
-                padding: 5px;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QRadioButton:hover {
-                color: #4CAF50;
-            }
-            
-            /* 标签样式 */
-            QLabel {
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            
-            /* 标签页样式 */
-            QTabWidget::pane {
-                border: 1px solid #d0d0d0;
-                background-color: white;
-            }
-            QTabBar::tab {
-                background-color: #e0e0e0;
-                border: 1px solid #d0d0d0;
-                border-bottom-color: transparent;
-                padding: 8px 16px;
-                margin-right: 2px;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QTabBar::tab:hover {
-                background-color: #d0d0d0;
-            }
-            QTabBar::tab:selected {
-                background-color: white;
-                border-bottom-color: white;
-            }
-            
-            /* 列表框样式 */
-            QListWidget {
-                border: 1px solid #d0d0d0;
-                border-radius: 3px;
-                background-color: white;
-                font-family: '微软雅黑', '黑体', sans-serif;
-            }
-            QListWidget:hover {
-                border-color: #4CAF50;
-            }
-            
-            /* 文本编辑框样式 */
-            QTextEdit {
-                border: 1px solid #d0d0d0;
-                border-radius: 3px;
-                background-color: white;
-                font-family: 'Consolas', 'Courier New', monospace;
-            }
-            QTextEdit:hover {
-                border-color: #4CAF50;
-            }
-            
-            /* 滚动区域样式 */
-            QScrollArea {
-                background-color: transparent;
-            }
-        """)
+        # 设置全局样式：两套主题都在应用级样式表中，窗口通过 theme 属性选择
+        self.setObjectName('pyinstallerGui')
+        self.setProperty('theme', 'light')
+        app = QApplication.instance()
+        if THEMED_STYLESHEET not in app.styleSheet():
+            app.setStyleSheet(app.styleSheet() + THEMED_STYLESHEET)
         
         # 主布局
         central_widget = QWidget()
@@ -346,29 +674,72 @@ class PyInstallerGUI(QMainWindow):
         self.tabs.addTab(self.basic_tab, "基本设置")
         self.setup_basic_tab()
         
+        # 其余标签页在首次切换到时才创建，加快启动
         # 附加文件标签
         self.files_tab = QWidget()
         self.tabs.addTab(self.files_tab, "附加文件")
-        self.setup_files_tab()
+        self.tab_builders[self.files_tab] = self.setup_files_tab
         
         # 附加库标签
         self.additional_libs_tab = QWidget()
         self.tabs.addTab(self.additional_libs_tab, "附加库")
-        self.setup_additional_libs_tab()
+        self.tab_builders[self.additional_libs_tab] = self.setup_additional_libs_tab
         
         # 高级设置标签
         self.advanced_tab = QWidget()
         self.tabs.addTab(self.advanced_tab, "高级设置")
-        self.setup_advanced_tab()
+        self.tab_builders[self.advanced_tab] = self.setup_advanced_tab
+        
+        self.tabs.currentChanged.connect(lambda index: self.ensure_tab_built(self.tabs.widget(index)))
+        
+        # 打包进度和预计剩余时间
+        progress_layout = QHBoxLayout()
+        self.build_progress = QProgressBar()
+        self.build_progress.setTextVisible(True)
+        progress_layout.addWidget(self.build_progress)
+        self.build_eta_label = QLabel("")
+        progress_layout.addWidget(self.build_eta_label)
+        self.build_progress.hide()
+        self.build_eta_label.hide()
+        left_layout.addLayout(progress_layout)
+        
+        self.eta_timer = QTimer(self)
+        self.eta_timer.setInterval(1000)
+        self.eta_timer.timeout.connect(self.update_build_progress)
         
         # 按钮布局
         button_layout = QHBoxLayout()
         button_layout.addStretch()
         
+        self.dark_mode_btn = QPushButton("深色模式")
+        self.dark_mode_btn.clicked.connect(self.toggle_dark_mode)
+        button_layout.addWidget(self.dark_mode_btn)
+        
         self.clear_log_btn = QPushButton("清除日志")
         self.clear_log_btn.clicked.connect(self.clear_log)
         button_layout.addWidget(self.clear_log_btn)
         
+        self.watch_cb = QCheckBox("监视模式")
+        self.watch_cb.setToolTip("监视脚本可以导入的本地源文件、附加文件和 requirements.txt，"
+                                 "保存后自动增量重新打包，正在进行的打包会被取消")
+        self.watch_cb.toggled.connect(self.toggle_watch_mode)
+        button_layout.addWidget(self.watch_cb)
+        
+        button_layout.addWidget(QLabel("超时:"))
+        self.timeout_spin = QSpinBox()
+        self.timeout_spin.setRange(0, 1440)
+        self.timeout_spin.setValue(60)
+        self.timeout_spin.setSuffix(" 分钟")
+        self.timeout_spin.setSpecialValueText("不限")
+        self.timeout_spin.setToolTip("打包和PIP任务运行超过该时间后强制结束整个进程树，对之后开始的任务生效")
+        button_layout.addWidget(self.timeout_spin)
+        
+        self.stop_btn = QPushButton("停止")
+        self.stop_btn.setToolTip("结束正在进行的打包和PIP任务（包括它们启动的子进程），删除打包留下的不完整输出")
+        self.stop_btn.setEnabled(False)
+        self.stop_btn.clicked.connect(self.stop_jobs)
+        button_layout.addWidget(self.stop_btn)
+        
         self.pack_btn = QPushButton("开始打包")
         self.pack_btn.setStyleSheet("background-color: #4CAF50; color: white; font-weight: bold; padding: 8px 20px;")
         self.pack_btn.clicked.connect(self.start_packaging)
@@ -385,14 +756,23 @@ class PyInstallerGUI(QMainWindow):
         right_layout.addWidget(log_label)
         
         # 日志输出
-        self.log_text = QTextEdit()
-        self.log_text.setReadOnly(True)
-        self.log_text.setStyleSheet("background-color: #f8f8f8; border: 1px solid #d0d0d0; border-radius: 3px;")
-        self.log_text.setAcceptRichText(True)
+        self.log_text = LogView()
+        self.log_text.setObjectName('logText')
         font = QFont("微软雅黑", 9)
         self.log_text.setFont(font)
         right_layout.addWidget(self.log_text)
         
+        # 历史日志搜索
+        log_search_layout = QHBoxLayout()
+        self.log_search_edit = QLineEdit()
+        self.log_search_edit.setPlaceholderText("在历史打包和PIP日志中搜索")
+        self.log_search_edit.returnPressed.connect(self.search_logs)
+        log_search_layout.addWidget(self.log_search_edit)
+        log_search_btn = QPushButton("搜索历史日志")
+        log_search_btn.clicked.connect(self.search_logs)
+        log_search_layout.addWidget(log_search_btn)
+        right_layout.addLayout(log_search_layout)
+        
         # 添加到分割器
         splitter.addWidget(left_widget)
         splitter.addWidget(right_widget)
@@ -400,6 +780,32 @@ class PyInstallerGUI(QMainWindow):
         # 设置分割比例
         splitter.setSizes([600, 600])
     
+    def ensure_tab_built(self, tab):
+        """标签页首次使用时创建其内容"""
+        builder = self.tab_builders.pop(tab, None)
+        if builder:
+            builder()
+    
+    def ensure_all_tabs_built(self):
+        """打包等操作需要读取所有标签页的设置，先创建尚未创建的标签页"""
+        for tab in list(self.tab_builders):
+            self.ensure_tab_built(tab)
+    
+    def event(self, event):
+        """首次绘制时输出启动耗时"""
+        if event.type() == QEvent.Paint and not self.first_paint_done:
+            self.first_paint_done = True
+            if self.report_startup_time:
+                QTimer.singleShot(0, self.log_startup_time)
+        return super().event(event)
+    
+    def log_startup_time(self):
+        """输出从进程启动到首次绘制的耗时"""
+        elapsed = (time.perf_counter() - STARTUP_TIME) * 1000
+        message = f"启动耗时: 首次绘制 {elapsed:.0f} ms"
+        print(message)
+        self.append_log(message, "info")
+    
     def setup_basic_tab(self):
         # 创建滚动区域
         scroll_area = QScrollArea()
@@ -453,6 +859,13 @@ class PyInstallerGUI(QMainWindow):
         browse_btn.clicked.connect(self.browse_icon)
         card1_layout.addWidget(browse_btn, 3, 4, 1, 1)
         
+        # Python运行时，每个项目可以选择不同版本，首次使用时才解压
+        card1_layout.addWidget(QLabel("Python运行时:"), 4, 0, 1, 1)
+        self.runtime_combo = QComboBox()
+        self.runtime_combo.setToolTip("打包所用的Python版本，按项目记住选择；启动耗时为解释器空载启动的实测值")
+        self.runtime_combo.currentIndexChanged.connect(self.on_runtime_selected)
+        card1_layout.addWidget(self.runtime_combo, 4, 1, 1, 4)
+        
         layout.addWidget(card1)
         
         # 卡片2: 打包模式
@@ -470,6 +883,10 @@ class PyInstallerGUI(QMainWindow):
         
         self.folder_rb = QRadioButton("目录 (-D)")
         type_layout.addWidget(self.folder_rb)
+        
+        self.dual_rb = QRadioButton("单文件+目录")
+        self.dual_rb.setToolTip("一次分析同时生成目录版和单文件版（程序名加 _onefile 后缀），比分别打包两次快约一半")
+        type_layout.addWidget(self.dual_rb)
         type_layout.addStretch()
         card2_layout.addLayout(type_layout)
         
@@ -566,11 +983,25 @@ class PyInstallerGUI(QMainWindow):
         # 附加文件列表
         layout.addWidget(QLabel("附加文件和目录:"))
         
-        self.files_list = QListWidget()
+        self.files_model = StringListModel(self)
+        # 监视模式下附加文件增删时更新监视的路径
+        self.files_model.rowsInserted.connect(self.refresh_watch)
+        self.files_model.rowsRemoved.connect(self.refresh_watch)
+        self.files_model.modelReset.connect(self.refresh_watch)
+        self.files_list = QListView()
+        self.files_list.setModel(self.files_model)
+        self.files_list.setUniformItemSizes(True)
         self.files_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.files_list.setMinimumHeight(200)
+        self.files_list.selectionModel().currentChanged.connect(self.update_scan_summary)
         layout.addWidget(self.files_list)
         
+        # 目录扫描预览
+        self.scan_summary_label = QLabel("选中目录后显示其大小、文件数和最大的子目录")
+        self.scan_summary_label.setWordWrap(True)
+        self.scan_summary_label.setStyleSheet("color: #666;")
+        layout.addWidget(self.scan_summary_label)
+        
         # 文件操作按钮
         btn_layout = QHBoxLayout()
         
@@ -586,8 +1017,38 @@ class PyInstallerGUI(QMainWindow):
         remove_btn.clicked.connect(self.remove_files)
         btn_layout.addWidget(remove_btn)
         
+        self.cancel_scan_btn = QPushButton("取消扫描")
+        self.cancel_scan_btn.setEnabled(False)
+        self.cancel_scan_btn.clicked.connect(self.cancel_directory_scans)
+        btn_layout.addWidget(self.cancel_scan_btn)
+        
         btn_layout.addStretch()
         layout.addLayout(btn_layout)
+        
+        # 增量暂存卡片
+        staging_card = QWidget()
+        staging_card.setProperty("card", True)
+        staging_layout = QGridLayout(staging_card)
+        staging_layout.setSpacing(10)
+        
+        self.staging_cb = QCheckBox("增量暂存目录（按内容去重，只复制发生变化的文件）")
+        self.staging_cb.setChecked(True)
+        staging_layout.addWidget(self.staging_cb, 0, 0, 1, 2)
+        
+        staging_layout.addWidget(QLabel("包含模式:"), 1, 0, 1, 1)
+        self.staging_include_edit = QLineEdit()
+        self.staging_include_edit.setPlaceholderText("留空表示全部包含，多个模式用逗号分隔，如: *.png, models/*")
+        staging_layout.addWidget(self.staging_include_edit, 1, 1, 1, 1)
+        
+        staging_layout.addWidget(QLabel("排除模式:"), 2, 0, 1, 1)
+        self.staging_exclude_edit = QLineEdit()
+        self.staging_exclude_edit.setPlaceholderText("多个模式用逗号分隔，如: __pycache__, *.pyc, .git")
+        staging_layout.addWidget(self.staging_exclude_edit, 2, 1, 1, 1)
+        
+        self.staging_cb.toggled.connect(self.staging_include_edit.setEnabled)
+        self.staging_cb.toggled.connect(self.staging_exclude_edit.setEnabled)
+        
+        layout.addWidget(staging_card)
     
     def setup_additional_libs_tab(self):
         """设置附加库标签页"""
@@ -614,7 +1075,11 @@ class PyInstallerGUI(QMainWindow):
         
         card1_layout.addWidget(QLabel("附加库列表:"))
         
-        self.additional_libs_list = QListWidget()
+        self.additional_libs_model = StringListModel(self)
+        self.additional_libs_list = QListView()
+        self.additional_libs_view = sorted_view(self.additional_libs_model)
+        self.additional_libs_list.setModel(self.additional_libs_view)
+        self.additional_libs_list.setUniformItemSizes(True)
         self.additional_libs_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.additional_libs_list.setMinimumHeight(200)
         card1_layout.addWidget(self.additional_libs_list)
@@ -631,6 +1096,7 @@ class PyInstallerGUI(QMainWindow):
         add_lib_layout = QHBoxLayout()
         self.lib_name_edit = QLineEdit()
         self.lib_name_edit.setPlaceholderText("输入库名称，如: psutil, requests")
+        ModuleCompleter(self.lib_name_edit, lambda: self.module_index, multiple=False)
         add_lib_layout.addWidget(self.lib_name_edit)
         
         add_lib_btn = QPushButton("添加")
@@ -650,6 +1116,10 @@ class PyInstallerGUI(QMainWindow):
         remove_lib_btn.clicked.connect(self.remove_additional_libs)
         batch_layout.addWidget(remove_lib_btn)
         
+        sort_libs_btn = QPushButton("排序")
+        sort_libs_btn.clicked.connect(lambda: self.additional_libs_view.sort(0))
+        batch_layout.addWidget(sort_libs_btn)
+        
         clear_libs_btn = QPushButton("清空列表")
         clear_libs_btn.clicked.connect(self.clear_additional_libs)
         batch_layout.addWidget(clear_libs_btn)
@@ -725,6 +1195,20 @@ class PyInstallerGUI(QMainWindow):
         self.spec_only_cb = QCheckBox("仅生成spec文件，不打包")
         card1_layout.addWidget(self.spec_only_cb, 4, 0, 1, 2)
         
+        # 复现性校验
+        self.verify_cb = QCheckBox("复现性校验：在独立目录中再打包一次，逐文件比较两次的产物")
+        card1_layout.addWidget(self.verify_cb, 5, 0, 1, 2)
+        
+        # 产物清单
+        self.manifest_cb = QCheckBox("生成产物清单：打包成功后记录每个文件的路径、大小和SHA-256，写入 <产物>.manifest.json")
+        self.manifest_cb.setChecked(True)
+        card1_layout.addWidget(self.manifest_cb, 6, 0, 1, 2)
+        
+        # 差分更新包
+        self.delta_cb = QCheckBox("生成差分更新包：与上一次保存的打包比较，只打包发生变化的文件和二进制差分")
+        self.manifest_cb.toggled.connect(self.delta_cb.setEnabled)
+        card1_layout.addWidget(self.delta_cb, 7, 0, 1, 2)
+        
         layout.addWidget(card1)
         
         # UPX和压缩选项卡片
@@ -767,12 +1251,14 @@ class PyInstallerGUI(QMainWindow):
         card3_layout.addWidget(QLabel("隐藏导入模块:"), 0, 0, 1, 1)
         self.hidden_import_edit = QLineEdit()
         self.hidden_import_edit.setPlaceholderText("多个模块用逗号分隔")
+        ModuleCompleter(self.hidden_import_edit, lambda: self.module_index)
         card3_layout.addWidget(self.hidden_import_edit, 0, 1, 1, 3)
         
         # 排除模块
         card3_layout.addWidget(QLabel("排除模块:"), 1, 0, 1, 1)
         self.exclude_edit = QLineEdit()
         self.exclude_edit.setPlaceholderText("多个模块用逗号分隔")
+        ModuleCompleter(self.exclude_edit, lambda: self.module_index)
         card3_layout.addWidget(self.exclude_edit, 1, 1, 1, 3)
         
         # 工作目录
@@ -825,6 +1311,7 @@ class PyInstallerGUI(QMainWindow):
             # 自动填充程序名称
             if not self.name_edit.text():
                 self.name_edit.setText(os.path.splitext(os.path.basename(file_path))[0])
+            self.on_project_changed()
     
     def browse_output(self):
         dir_path = QFileDialog.getExistingDirectory(self, "选择输出目录", ".")
@@ -853,13 +1340,12 @@ class PyInstallerGUI(QMainWindow):
         lib_name = self.lib_name_edit.text().strip()
         if lib_name:
             # 检查是否已存在
-            for i in range(self.additional_libs_list.count()):
-                if self.additional_libs_list.item(i).text() == lib_name:
-                    QMessageBox.warning(self, "警告", f"库 '{lib_name}' 已存在于列表中！")
-                    return
+            if lib_name in self.additional_libs_model:
+                QMessageBox.warning(self, "警告", f"库 '{lib_name}' 已存在于列表中！")
+                return
             
             # 添加到列表
-            self.additional_libs_list.addItem(lib_name)
+            self.additional_libs_model.add(lib_name)
             self.lib_name_edit.clear()
     
     def import_additional_libs(self):
@@ -870,19 +1356,9 @@ class PyInstallerGUI(QMainWindow):
                 with open(file_path, 'r', encoding='utf-8') as f:
                     libs = f.read().split('\n')
                 
-                added_count = 0
-                for lib in libs:
-                    lib_name = lib.strip()
-                    if lib_name and not lib_name.startswith('#'):
-                        # 检查是否已存在
-                        exists = False
-                        for i in range(self.additional_libs_list.count()):
-                            if self.additional_libs_list.item(i).text() == lib_name:
-                                exists = True
-                                break
-                        if not exists:
-                            self.additional_libs_list.addItem(lib_name)
-                            added_count += 1
+                # 批量添加，重复项由模型的哈希索引过滤
+                lib_names = [lib.strip() for lib in libs if lib.strip() and not lib.strip().startswith('#')]
+                added_count = self.additional_libs_model.add_many(lib_names)
                 
                 QMessageBox.information(self, "成功", f"已从文件导入 {added_count} 个附加库！")
             except Exception as e:
@@ -890,34 +1366,106 @@ class PyInstallerGUI(QMainWindow):
     
     def remove_additional_libs(self):
         """移除选中的附加库"""
-        selected_items = self.additional_libs_list.selectedItems()
-        if selected_items:
-            for item in selected_items:
-                self.additional_libs_list.takeItem(self.additional_libs_list.row(item))
+        self.additional_libs_model.remove_rows(selected_rows(self.additional_libs_list))
     
     def clear_additional_libs(self):
         """清空附加库列表"""
-        if self.additional_libs_list.count() > 0:
+        if len(self.additional_libs_model) > 0:
             reply = QMessageBox.question(self, "确认", "确定要清空所有附加库吗？",
                                          QMessageBox.Yes | QMessageBox.No, QMessageBox.No)
             if reply == QMessageBox.Yes:
-                self.additional_libs_list.clear()
+                self.additional_libs_model.clear()
     
     def add_file(self):
         file_paths, _ = QFileDialog.getOpenFileNames(self, "选择文件", "", "All Files (*)")
-        for file_path in file_paths:
-            item = QListWidgetItem(file_path)
-            self.files_list.addItem(item)
+        self.files_model.add_many(file_paths)
     
     def add_directory(self):
         dir_path = QFileDialog.getExistingDirectory(self, "选择目录", ".")
-        if dir_path:
-            item = QListWidgetItem(dir_path)
-            self.files_list.addItem(item)
+        if dir_path and self.files_model.add(dir_path):
+            self.files_model.set_item_data(dir_path, Qt.ToolTipRole, "正在扫描...")
+            self.start_directory_scan(dir_path)
     
     def remove_files(self):
-        for item in self.files_list.selectedItems():
-            self.files_list.takeItem(self.files_list.row(item))
+        for path in self.files_model.remove_rows(selected_rows(self.files_list)):
+            if path in self.scan_threads:
+                self.scan_threads[path].cancel()
+            self.scan_results.pop(path, None)
+    
+    def start_directory_scan(self, dir_path):
+        """启动后台线程扫描目录大小和文件数"""
+        if dir_path in self.scan_threads:
+            return
+        
+        thread = DirectoryScanThread(dir_path, self.scan_cache)
+        thread.progress_updated.connect(self.on_directory_scan_progress)
+        thread.scan_updated.connect(self.on_directory_scanned)
+        thread.finished.connect(lambda success, message: self.on_directory_scan_finished(dir_path, success, message))
+        self.scan_threads[dir_path] = thread
+        self.cancel_scan_btn.setEnabled(True)
+        thread.start()
+    
+    def cancel_directory_scans(self):
+        """取消所有正在进行的目录扫描"""
+        for thread in self.scan_threads.values():
+            thread.cancel()
+    
+    def current_file_path(self):
+        """附加文件列表中当前选中的路径"""
+        index = self.files_list.currentIndex()
+        return index.data() if index.isValid() else None
+    
+    def on_directory_scan_progress(self, dir_path, total_size, file_count):
+        """扫描进度更新"""
+        self.files_model.set_item_data(dir_path, Qt.ToolTipRole,
+                                       f"正在扫描... 已统计 {file_count} 个文件，{format_size(total_size)}")
+        if self.current_file_path() == dir_path:
+            self.scan_summary_label.setText(f"{dir_path}\n正在扫描... 已统计 {file_count} 个文件，{format_size(total_size)}")
+    
+    def on_directory_scanned(self, dir_path, result):
+        """目录扫描完成后显示统计信息"""
+        self.scan_results[dir_path] = result
+        summary = self.format_scan_summary(dir_path, result)
+        self.files_model.set_item_data(dir_path, Qt.ToolTipRole, summary)
+        if result['suspicious']:
+            self.files_model.set_item_data(dir_path, Qt.ForegroundRole, QColor("#FF9800"))
+        
+        self.append_log(f"目录 {dir_path}: {result['file_count']} 个文件，共 {format_size(result['total_size'])}", "info")
+        if result['suspicious']:
+            self.append_log(f"⚠ 目录 {dir_path} 中包含通常不应打包的子目录: {', '.join(result['suspicious'][:10])}", "warning")
+        self.update_scan_summary()
+    
+    def on_directory_scan_finished(self, dir_path, success, message):
+        """扫描线程结束后的处理"""
+        self.scan_threads.pop(dir_path, None)
+        self.cancel_scan_btn.setEnabled(bool(self.scan_threads))
+        if not success:
+            self.files_model.set_item_data(dir_path, Qt.ToolTipRole, message)
+            self.append_log(f"目录 {dir_path}: {message}", "warning")
+    
+    def format_scan_summary(self, dir_path, result):
+        """生成目录扫描结果的文字说明"""
+        lines = [f"{dir_path}",
+                 f"共 {result['file_count']} 个文件，{result['dir_count']} 个子目录，总大小 {format_size(result['total_size'])}"]
+        if result['subtrees']:
+            lines.append("最大的子目录: " + "，".join(
+                f"{name} ({format_size(size)}, {count} 个文件)" for name, size, count in result['subtrees']))
+        if result['suspicious']:
+            lines.append("⚠ 可能误打包的目录: " + ", ".join(result['suspicious'][:10]))
+        return "\n".join(lines)
+    
+    def update_scan_summary(self, *args):
+        """显示当前选中目录的扫描结果"""
+        path = self.current_file_path()
+        if not path:
+            self.scan_summary_label.setText("选中目录后显示其大小、文件数和最大的子目录")
+            return
+        if path in self.scan_results:
+            self.scan_summary_label.setText(self.format_scan_summary(path, self.scan_results[path]))
+        elif path in self.scan_threads:
+            self.scan_summary_label.setText(f"{path}\n正在扫描...")
+        else:
+            self.scan_summary_label.setText(path)
     
     def clear_log(self):
         self.log_text.clear()
@@ -939,6 +1487,45 @@ class PyInstallerGUI(QMainWindow):
             elif file_path.endswith('.txt'):
                 self.import_requirements_file(file_path)
     
+    def run_in_project_env(self, action):
+        """在项目自己的环境中执行pip安装
+
+        本机解释器的项目虚拟环境可能由依赖相同的多个项目共用，直接安装会影响其他项目，
+        先在后台为当前项目创建独立环境，切换 python_path 后再执行 action。
+        """
+        source_file = self.project_source()
+        if not source_file or not ProjectEnvStore().is_shared(self.python_path):
+            action()
+            return
+        self.env_fork_actions.append(action)
+        if self.env_fork_thread and self.env_fork_thread.isRunning():
+            return
+        self.env_fork_thread = ProjectEnvForkThread(self.python_path, source_file)
+        self.env_fork_thread.progress_updated.connect(self.append_log)
+        self.env_fork_thread.python_path_updated.connect(self.on_env_forked)
+        self.env_fork_thread.finished.connect(self.on_env_fork_finished)
+        self.env_fork_thread.start()
+    
+    def on_env_forked(self, python_path):
+        """独立环境创建完成，项目和运行时都没有切换时改用独立环境"""
+        thread = self.env_fork_thread
+        thread.applied = thread.python_path == self.python_path and thread.source_file == self.project_source()
+        if thread.applied:
+            self.python_path = python_path
+            self.append_log(f"项目已使用独立的虚拟环境: {python_path}", "info")
+    
+    def on_env_fork_finished(self, success, message):
+        actions, self.env_fork_actions = self.env_fork_actions, []
+        if self.close_pending:
+            return
+        if not success:
+            self.append_log(f"{message}，已取消 {len(actions)} 个安装任务", "error")
+        elif self.env_fork_thread.applied:
+            for action in actions:
+                action()
+        else:
+            self.append_log("项目或运行时已切换，已取消排队的安装任务", "warning")
+    
     def install_wheel(self):
         """打开文件选择器安装whl包"""
         file_paths, _ = QFileDialog.getOpenFileNames(self, "选择WHL包", "", "WHL Files (*.whl);;All Files (*)")
@@ -951,13 +1538,17 @@ class PyInstallerGUI(QMainWindow):
             QMessageBox.warning(self, "警告", "请先开始打包，以便解压Python环境！")
             return
         
-        self.log_text.append(f"正在安装WHL包: {os.path.basename(file_path)}")
+        self.run_in_project_env(lambda: self.start_wheel_install(file_path))
+    
+    def start_wheel_install(self, file_path):
+        self.append_log(f"正在安装WHL包: {os.path.basename(file_path)}", "info")
         cmd = [self.python_path, "-m", "pip", "install", file_path]
         
         process = QProcess()
         process.setProcessChannelMode(QProcess.MergedChannels)
         process.readyReadStandardOutput.connect(lambda: self.read_process_output(process))
         process.finished.connect(lambda exit_code: self.on_process_finished(exit_code, "WHL包安装完成"))
+        self.track_process(process, "pip", f"安装WHL包 {os.path.basename(file_path)}", cmd)
         process.start(cmd[0], cmd[1:])
     
     def import_requirements(self):
@@ -972,13 +1563,18 @@ class PyInstallerGUI(QMainWindow):
             QMessageBox.warning(self, "警告", "请先开始打包，以便解压Python环境！")
             return
         
-        self.log_text.append(f"正在导入依赖文件: {os.path.basename(file_path)}")
-        cmd = [self.python_path, "-m", "pip", "install", "-r", file_path]
+        self.run_in_project_env(lambda: self.start_requirements_install(file_path))
+    
+    def start_requirements_install(self, file_path):
+        self.append_log(f"正在导入依赖文件: {os.path.basename(file_path)}", "info")
+        # 优先使用预热时下载的wheel
+        cmd = [self.python_path, "-m", "pip", "install", "--find-links", get_app_data_dir('wheels'), "-r", file_path]
         
         process = QProcess()
         process.setProcessChannelMode(QProcess.MergedChannels)
         process.readyReadStandardOutput.connect(lambda: self.read_process_output(process))
         process.finished.connect(lambda exit_code: self.on_process_finished(exit_code, "依赖安装完成"))
+        self.track_process(process, "pip", f"导入依赖文件 {os.path.basename(file_path)}", cmd)
         process.start(cmd[0], cmd[1:])
     
     def detect_dependencies(self):
@@ -988,20 +1584,23 @@ class PyInstallerGUI(QMainWindow):
             QMessageBox.warning(self, "警告", "请先选择有效的Python脚本！")
             return
         
-        self.log_text.append(f"正在检测脚本依赖: {os.path.basename(source_file)}")
+        self.append_log(f"正在检测脚本依赖: {os.path.basename(source_file)}", "info")
         
-        # 确保Python环境已解压
-        if not hasattr(self, 'python_path') or not self.python_path:
-            self.log_text.append("正在解压Python环境...")
-            if not self.extract_python():
-                return
+        # 确保Python运行时已就绪
+        if not self.python_path:
+            self.append_log("Python运行时尚未就绪，请稍候再试", "warning")
+            return
         
+        self.run_in_project_env(lambda: self.start_pipreqs_install(source_file))
+    
+    def start_pipreqs_install(self, source_file):
         # 使用解压的Python安装pipreqs
         cmd = [self.python_path, "-m", "pip", "install", "pipreqs"]
         process = QProcess()
         process.setProcessChannelMode(QProcess.MergedChannels)
         process.readyReadStandardOutput.connect(lambda: self.read_process_output(process))
         process.finished.connect(lambda exit_code: self.generate_requirements(source_file, exit_code))
+        self.track_process(process, "pip", "安装pipreqs", cmd)
         process.start(cmd[0], cmd[1:])
     
     def generate_requirements(self, source_file, exit_code):
@@ -1013,17 +1612,19 @@ class PyInstallerGUI(QMainWindow):
             process.setProcessChannelMode(QProcess.MergedChannels)
             process.readyReadStandardOutput.connect(lambda: self.read_process_output(process))
             process.finished.connect(lambda exit_code: self.on_requirements_generated(exit_code, source_file))
+            self.track_process(process, "pip", "生成requirements.txt", cmd)
             process.start(cmd[0], cmd[1:])
     
     def on_requirements_generated(self, exit_code, source_file):
         """依赖文件生成完成后的处理"""
         if exit_code == 0:
             req_file = os.path.join(os.path.dirname(source_file), "requirements.txt")
-            self.log_text.append(f"依赖文件生成成功: {req_file}")
+            self.append_log(f"依赖文件生成成功: {req_file}", "success")
             
             # 自动安装生成的依赖
-            self.log_text.append("正在安装检测到的依赖...")
-            install_cmd = [self.python_path, "-m", "pip", "install", "-r", req_file]
+            self.append_log("正在安装检测到的依赖...", "info")
+            install_cmd = [self.python_path, "-m", "pip", "install", "--find-links", get_app_data_dir('wheels'),
+                           "-r", req_file]
             install_process = QProcess()
             install_process.setProcessChannelMode(QProcess.MergedChannels)
             
@@ -1035,15 +1636,18 @@ class PyInstallerGUI(QMainWindow):
             install_process.setProcessEnvironment(env)
             
             install_process.readyReadStandardOutput.connect(lambda: self.read_process_output(install_process))
-            install_process.finished.connect(lambda exit_code: self.on_dependencies_installed(exit_code, req_file, source_file))
+            install_process.finished.connect(lambda exit_code: self.on_dependencies_installed(
+                exit_code, req_file, source_file, install_process.cancel_reason))
+            self.track_process(install_process, "pip", "安装检测到的依赖", install_cmd)
             install_process.start(install_cmd[0], install_cmd[1:])
         else:
-            self.log_text.append("依赖检测失败")
+            self.append_log("依赖检测失败", "error")
     
-    def on_dependencies_installed(self, exit_code, req_file, source_file):
+    def on_dependencies_installed(self, exit_code, req_file, source_file, cancel_reason=None):
         """依赖安装完成后的处理"""
-        if exit_code == 0:
-            self.log_text.append("依赖安装成功！")
+        if exit_code == 0 and not cancel_reason:
+            self.append_log("依赖安装成功！", "success")
+            self.refresh_module_index()
             
             # 读取requirements.txt内容，将依赖添加到隐藏导入列表
             try:
@@ -1059,6 +1663,7 @@ class PyInstallerGUI(QMainWindow):
                         dep_names.append(dep_name)
                 
                 # 将依赖添加到隐藏导入列表
+                self.ensure_tab_built(self.advanced_tab)
                 if dep_names:
                     current_hidden = self.hidden_import_edit.text().strip()
                     hidden_imports = set(current_hidden.split(',')) if current_hidden else set()
@@ -1070,14 +1675,15 @@ class PyInstallerGUI(QMainWindow):
                     
                     # 更新隐藏导入输入框
                     self.hidden_import_edit.setText(','.join(hidden_imports))
-                    self.log_text.append(f"已将 {len(dep_names)} 个检测到的依赖添加到隐藏导入列表")
+                    self.append_log(f"已将 {len(dep_names)} 个检测到的依赖添加到隐藏导入列表", "info")
             except Exception as e:
-                self.log_text.append(f"读取依赖文件失败: {str(e)}")
+                self.append_log(f"读取依赖文件失败: {str(e)}", "error")
             
             QMessageBox.information(self, "成功", "依赖检测和安装完成！")
         else:
-            self.log_text.append("依赖安装失败！")
-            QMessageBox.warning(self, "警告", "依赖安装失败，请查看日志获取详细信息！")
+            self.append_log("依赖安装失败！", "error")
+            if cancel_reason != 'cancelled':
+                QMessageBox.warning(self, "警告", "依赖安装失败，请查看日志获取详细信息！")
     
     def install_pip_package(self):
         """通过PIP安装包"""
@@ -1090,7 +1696,10 @@ class PyInstallerGUI(QMainWindow):
             QMessageBox.warning(self, "警告", "请先开始打包，以便解压Python环境！")
             return
         
-        self.log_text.append(f"正在安装PIP包: {package_name}")
+        self.run_in_project_env(lambda: self.start_pip_install(package_name))
+    
+    def start_pip_install(self, package_name):
+        self.append_log(f"正在安装PIP包: {package_name}", "info")
         cmd = [self.python_path, "-m", "pip", "install", package_name]
         
         process = QProcess()
@@ -1105,373 +1714,137 @@ class PyInstallerGUI(QMainWindow):
         
         process.readyReadStandardOutput.connect(lambda: self.read_process_output(process))
         process.finished.connect(lambda exit_code: self.on_process_finished(exit_code, f"PIP包 {package_name} 安装完成"))
+        self.track_process(process, "pip", f"安装PIP包 {package_name}", cmd)
         process.start(cmd[0], cmd[1:])
     
     def append_log(self, message, level="info"):
-        """添加彩色日志输出"""
-        # 根据日志级别设置颜色
-        color_map = {
-            "info": "#333333",
-            "success": "#4CAF50",
-            "warning": "#FF9800",
-            "error": "#F44336",
-            "debug": "#2196F3"
-        }
-        
-        color = color_map.get(level, "#333333")
-        html = f"<span style='color: {color}; font-family: 微软雅黑, 黑体, sans-serif;'>{message}</span>"
-        self.log_text.append(html)
-        self.log_text.verticalScrollBar().setValue(self.log_text.verticalScrollBar().maximum())
+        """添加彩色日志输出，由日志视图批量刷新并按级别着色"""
+        self.log_text.append_message(message, level)
+    
+    def track_process(self, process, kind, title, cmd):
+        """跟踪进程输出：创建增量解码器和磁盘日志，登记到可停止的任务中并开始超时计时"""
+        job_log = self.log_store.start_job(kind, title)
+        job_log.write_line("$ " + format_command(cmd))
+        process.job_log = job_log
+        process.decoder = OutputDecoder()
+        process.output_finished = False
+        process.kind = kind
+        process.title = title
+        process.cancel_reason = None  # None, 'cancelled', 'timeout', 'restart'
+        process.started_at = time.time()
+        # 输出通道关闭早于 finished 信号，保证结束提示出现在最后一行输出之后
+        process.readChannelFinished.connect(lambda: self.finish_process_output(process))
+        process.finished.connect(lambda exit_code, exit_status: self.finish_process_output(process, exit_code))
+        process.finished.connect(lambda exit_code, exit_status: self.untrack_process(process))
+        process.errorOccurred.connect(lambda error: error == QProcess.FailedToStart and self.untrack_process(process))
+        
+        process.timeout_timer = None
+        minutes = self.timeout_spin.value()
+        if minutes:
+            process.timeout_timer = QTimer(self)
+            process.timeout_timer.setSingleShot(True)
+            process.timeout_timer.timeout.connect(lambda: self.on_process_timeout(process, minutes))
+            process.timeout_timer.start(minutes * 60 * 1000)
+        self.running_processes.append(process)
+        self.stop_btn.setEnabled(True)
+    
+    def untrack_process(self, process):
+        """进程结束后停止超时计时"""
+        if process.timeout_timer:
+            process.timeout_timer.stop()
+        # 打包进程的停止结果由 process_finished 输出
+        if process.cancel_reason == 'cancelled' and process.kind != 'build':
+            self.append_log(f"已停止: {process.title}", "warning")
+        if process in self.running_processes:
+            self.running_processes.remove(process)
+        self.update_stop_button()
+    
+    def update_stop_button(self):
+        staging = self.staging_thread is not None and self.staging_thread.isRunning()
+        self.stop_btn.setEnabled(bool(self.running_processes) or staging or bool(self.packaging_pending))
+    
+    def on_process_timeout(self, process, minutes):
+        """任务超时，结束整个进程树"""
+        if process.state() == QProcess.NotRunning:
+            return
+        self.append_log(f"⚠ {process.title} 已运行超过 {minutes} 分钟，强制结束", "error")
+        process.cancel_reason = 'timeout'
+        kill_qprocess_tree(process)
+    
+    def stop_jobs(self):
+        """停止正在进行的打包流程和PIP任务"""
+        self.append_log("正在停止任务...", "warning")
+        if self.packaging_pending:
+            # 还在等待预热安装PyInstaller，尚未开始打包
+            self.packaging_pending = None
+            self.pack_btn.setEnabled(True)
+        if self.staging_thread and self.staging_thread.isRunning():
+            self.staging_thread.cancel()
+        if self.compare_thread and self.compare_thread.isRunning():
+            self.compare_thread.cancel()
+        for process in list(self.running_processes):
+            if process.state() != QProcess.NotRunning:
+                process.cancel_reason = 'cancelled'
+                kill_qprocess_tree(process)
+        self.update_stop_button()
+    
+    def handle_process_lines(self, process, lines):
+        """将解码后的输出行写入日志视图和磁盘日志"""
+        if not lines:
+            return
+        self.log_text.append_lines(lines)
+        track_phases = process is self.process and self.build_tracker is not None
+        for line, level in lines:
+            process.job_log.write_line(line)
+            if track_phases and self.build_tracker.feed_line(line):
+                self.update_build_progress()
+    
+    def finish_process_output(self, process, exit_code=None):
+        """进程结束时输出剩余内容，得到退出码后关闭磁盘日志，可重复调用"""
+        if not getattr(process, 'output_finished', True):
+            process.output_finished = True
+            self.read_process_output(process)
+            self.handle_process_lines(process, process.decoder.flush())
+        if exit_code is not None:
+            process.job_log.close(exit_code)
+    
+    def search_logs(self):
+        """打开历史日志搜索窗口"""
+        dialog = LogSearchDialog(self.log_store, self.log_search_edit.text().strip(), self)
+        dialog.show()
     
     def read_process_output(self, process):
-        """读取进程输出"""
-        output = process.readAllStandardOutput().data().decode("utf-8", errors="replace")
-        self.append_log(output, "debug")
+        """读取进程输出，按完整行解码和分类"""
+        data = process.readAllStandardOutput().data()
+        self.handle_process_lines(process, process.decoder.feed(data))
     
     def on_process_finished(self, exit_code, message):
         """进程完成后的处理"""
         if exit_code == 0:
             self.append_log(f"✅ {message}", "success")
+            self.refresh_module_index()
         else:
             self.append_log(f"❌ {message} 失败", "error")
     
-    def cleanup_python_env(self):
-        """清理临时解压的Python环境"""
-        if hasattr(self, 'extracted_python_dir') and self.extracted_python_dir and os.path.exists(self.extracted_python_dir):
-            try:
-                import shutil
-                shutil.rmtree(self.extracted_python_dir)
-                self.append_log(f"✅ 已清理临时Python环境: {self.extracted_python_dir}", "success")
-                self.extracted_python_dir = None
-                self.python_path = None
-            except Exception as e:
-                self.append_log(f"❌ 清理临时Python环境失败: {str(e)}", "error")
-    
     def toggle_dark_mode(self):
         """切换深色/浅色模式"""
         self.dark_mode = not self.dark_mode
         self.update_stylesheet()
     
     def update_stylesheet(self):
-        """更新样式表"""
-        if self.dark_mode:
-            # 深色模式样式
-            self.setStyleSheet("""
-                QMainWindow {
-                    background-color: #121212;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QGroupBox {
-                    border: 1px solid #333333;
-                    border-radius: 5px;
-                    margin-top: 10px;
-                    background-color: #1e1e1e;
-                    color: #ffffff;
-                }
-                QGroupBox::title {
-                    subcontrol-origin: margin;
-                    left: 10px;
-                    padding: 0 3px 0 3px;
-                    background-color: #121212;
-                    color: #ffffff;
-                }
-                
-                /* 卡片悬浮效果 */
-                QWidget[card="true"] {
-                    background-color: #1e1e1e;
-                    border-radius: 8px;
-                    padding: 15px;
-                    border: 1px solid #333333;
-                }
-                QWidget[card="true"]:hover {
-                    border-color: #4CAF50;
-                    background-color: #2a2a2a;
-                }
-                
-                /* 按钮样式 */
-                QPushButton {
-                    background-color: #333333;
-                    border: 1px solid #444444;
-                    border-radius: 3px;
-                    padding: 5px 10px;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QPushButton:hover {
-                    background-color: #4CAF50;
-                    color: white;
-                    border-color: #45a049;
-                }
-                QPushButton:pressed {
-                    background-color: #3e8e41;
-                }
-                
-                /* 输入框样式 */
-                QLineEdit {
-                    border: 1px solid #333333;
-                    border-radius: 3px;
-                    padding: 5px;
-                    background-color: #2a2a2a;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QLineEdit:hover {
-                    border-color: #4CAF50;
-                    background-color: #333333;
-                }
-                QLineEdit:focus {
-                    border-color: #4CAF50;
-                    background-color: #2a2a2a;
-                }
-                
-                /* 复选框样式 */
-                QCheckBox {
-                    padding: 5px;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QCheckBox:hover {
-                    color: #4CAF50;
-                }
-                
-                /* 单选按钮样式 */
-                QRadioButton {
-                    padding: 5px;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QRadioButton:hover {
-                    color: #4CAF50;
-                }
-                
-                /* 标签样式 */
-                QLabel {
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                
-                /* 标签页样式 */
-                QTabWidget::pane {
-                    border: 1px solid #333333;
-                    background-color: #1e1e1e;
-                }
-                QTabBar::tab {
-                    background-color: #333333;
-                    border: 1px solid #444444;
-                    border-bottom-color: transparent;
-                    padding: 8px 16px;
-                    margin-right: 2px;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QTabBar::tab:hover {
-                    background-color: #444444;
-                }
-                QTabBar::tab:selected {
-                    background-color: #1e1e1e;
-                    border-bottom-color: #1e1e1e;
-                }
-                
-                /* 列表框样式 */
-                QListWidget {
-                    border: 1px solid #333333;
-                    border-radius: 3px;
-                    background-color: #2a2a2a;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QListWidget:hover {
-                    border-color: #4CAF50;
-                }
-                
-                /* 文本编辑框样式 */
-                QTextEdit {
-                    border: 1px solid #333333;
-                    border-radius: 3px;
-                    background-color: #2a2a2a;
-                    color: #ffffff;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QTextEdit:hover {
-                    border-color: #4CAF50;
-                }
-                
-                /* 滚动区域样式 */
-                QScrollArea {
-                    background-color: transparent;
-                }
-                
-                /* 滚动条样式 */
-                QScrollBar:vertical {
-                    background-color: #333333;
-                    width: 10px;
-                    margin: 0px;
-                    border-radius: 5px;
-                }
-                QScrollBar::handle:vertical {
-                    background-color: #666666;
-                    border-radius: 5px;
-                }
-                QScrollBar::handle:vertical:hover {
-                    background-color: #888888;
-                }
-                QScrollBar:horizontal {
-                    background-color: #333333;
-                    height: 10px;
-                    margin: 0px;
-                    border-radius: 5px;
-                }
-                QScrollBar::handle:horizontal {
-                    background-color: #666666;
-                    border-radius: 5px;
-                }
-                QScrollBar::handle:horizontal:hover {
-                    background-color: #888888;
-                }
-            """)
-            self.log_text.setStyleSheet("background-color: #2a2a2a; border: 1px solid #333333; border-radius: 3px;")
-            self.dark_mode_btn.setText("浅色模式")
-        else:
-            # 浅色模式样式
-            self.setStyleSheet("""
-                QMainWindow {
-                    background-color: #f0f0f0;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QGroupBox {
-                    border: 1px solid #d0d0d0;
-                    border-radius: 5px;
-                    margin-top: 10px;
-                    background-color: white;
-                }
-                QGroupBox::title {
-                    subcontrol-origin: margin;
-                    left: 10px;
-                    padding: 0 3px 0 3px;
-                    background-color: #f0f0f0;
-                }
-                
-                /* 卡片悬浮效果 */
-                QWidget[card="true"] {
-                    background-color: white;
-                    border-radius: 8px;
-                    padding: 15px;
-                    border: 1px solid #e0e0e0;
-                }
-                QWidget[card="true"]:hover {
-                    border-color: #4CAF50;
-                    background-color: #f8fff8;
-                }
-                
-                /* 按钮样式 */
-                QPushButton {
-                    background-color: #e0e0e0;
-                    border: 1px solid #d0d0d0;
-                    border-radius: 3px;
-                    padding: 5px 10px;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QPushButton:hover {
-                    background-color: #4CAF50;
-                    color: white;
-                    border-color: #45a049;
-                }
-                QPushButton:pressed {
-                    background-color: #3e8e41;
-                }
-                
-                /* 输入框样式 */
-                QLineEdit {
-                    border: 1px solid #d0d0d0;
-                    border-radius: 3px;
-                    padding: 5px;
-                    background-color: white;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QLineEdit:hover {
-                    border-color: #4CAF50;
-                    background-color: #f8fff8;
-                }
-                QLineEdit:focus {
-                    border-color: #4CAF50;
-                    background-color: white;
-                }
-                
-                /* 复选框样式 */
-                QCheckBox {
-                    padding: 5px;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QCheckBox:hover {
-                    color: #4CAF50;
-                }
-                
-                /* 单选按钮样式 */
-                QRadioButton {
-                    padding: 5px;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QRadioButton:hover {
-                    color: #4CAF50;
-                }
-                
-                /* 标签样式 */
-                QLabel {
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                
-                /* 标签页样式 */
-                QTabWidget::pane {
-                    border: 1px solid #d0d0d0;
-                    background-color: white;
-                }
-                QTabBar::tab {
-                    background-color: #e0e0e0;
-                    border: 1px solid #d0d0d0;
-                    border-bottom-color: transparent;
-                    padding: 8px 16px;
-                    margin-right: 2px;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QTabBar::tab:hover {
-                    background-color: #d0d0d0;
-                }
-                QTabBar::tab:selected {
-                    background-color: white;
-                    border-bottom-color: white;
-                }
-                
-                /* 列表框样式 */
-                QListWidget {
-                    border: 1px solid #d0d0d0;
-                    border-radius: 3px;
-                    background-color: white;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QListWidget:hover {
-                    border-color: #4CAF50;
-                }
-                
-                /* 文本编辑框样式 */
-                QTextEdit {
-                    border: 1px solid #d0d0d0;
-                    border-radius: 3px;
-                    background-color: white;
-                    font-family: '微软雅黑', '黑体', sans-serif;
-                }
-                QTextEdit:hover {
-                    border-color: #4CAF50;
-                }
-                
-                /* 滚动区域样式 */
-                QScrollArea {
-                    background-color: transparent;
-                }
-            """)
-            self.log_text.setStyleSheet("background-color: #f8f8f8; border: 1px solid #d0d0d0; border-radius: 3px;")
-            self.dark_mode_btn.setText("深色模式")
+        """切换 theme 属性并重新 polish 窗口及其已创建的子控件，不再重新设置和解析样式表。
+        Qt 不会因祖先属性变化自动重新匹配后代选择器，所以子控件也要重新 polish"""
+        self.setProperty('theme', 'dark' if self.dark_mode else 'light')
+        style = self.style()
+        for widget in [self] + self.findChildren(QWidget):
+            style.unpolish(widget)
+            style.polish(widget)
+        self.update()
+        self.dark_mode_btn.setText("浅色模式" if self.dark_mode else "深色模式")
     
     def start_packaging(self):
+        self.ensure_all_tabs_built()
+        
         # 检查必要参数
         source_file = self.source_edit.text().strip()
         if not source_file:
@@ -1482,17 +1855,28 @@ class PyInstallerGUI(QMainWindow):
             QMessageBox.warning(self, "警告", "指定的Python脚本不存在！")
             return
         
-        # Python环境已经在启动时解压，无需再次解压
+        # 运行时在选择后于后台准备
         if not self.python_path or not os.path.exists(self.python_path):
-            self.append_log("Python环境异常，重新解压...", "warning")
-            if not self.extract_python():
-                return
+            self.append_log("Python运行时尚未就绪，请稍候再试", "warning")
+            return
         
         # 设置控制台编码为UTF-8
         os.environ['PYTHONIOENCODING'] = 'utf-8'
         os.environ['PYTHONUTF8'] = '1'
         
-        # 检查并安装PyInstaller
+        # 打包期间暂停预热；预热正在安装PyInstaller时等它装完，避免两个pip同时安装
+        if self.warmup_thread and self.warmup_thread.isRunning():
+            if self.warmup_thread.stage == 'install':
+                self.append_log("等待后台预热安装PyInstaller完成...", "info")
+                self.packaging_pending = source_file
+                self.pack_btn.setEnabled(False)
+                self.update_stop_button()
+                return
+            self.warmup_thread.pause()
+        self.check_pyinstaller(source_file)
+    
+    def check_pyinstaller(self, source_file):
+        """检查并安装PyInstaller，然后继续打包"""
         self.append_log("检查PyInstaller是否已安装...", "info")
         check_pyinstaller_cmd = [self.python_path, "-m", "pip", "show", "pyinstaller"]
         check_process = QProcess()
@@ -1507,31 +1891,51 @@ class PyInstallerGUI(QMainWindow):
             install_process = QProcess()
             install_process.setProcessChannelMode(QProcess.MergedChannels)
             install_process.readyReadStandardOutput.connect(lambda: self.read_process_output(install_process))
-            install_process.finished.connect(lambda exit_code: self.on_pyinstaller_installed(exit_code, source_file))
+            install_process.finished.connect(
+                lambda exit_code: self.on_pyinstaller_installed(exit_code, source_file, install_process.cancel_reason))
+            self.track_process(install_process, "pip", "安装PyInstaller", install_cmd)
             install_process.start(install_cmd[0], install_cmd[1:])
             return
         else:
             self.append_log("PyInstaller已安装，开始打包...", "info")
             self.continue_packaging(source_file)
     
-    def on_pyinstaller_installed(self, exit_code, source_file):
+    def on_pyinstaller_installed(self, exit_code, source_file, cancel_reason=None):
         """PyInstaller安装完成后的处理"""
-        if exit_code == 0:
+        if exit_code == 0 and not cancel_reason:
             self.append_log("PyInstaller安装成功！", "success")
+            self.refresh_module_index()
             self.continue_packaging(source_file)
         else:
             self.append_log("PyInstaller安装失败！", "error")
-            QMessageBox.critical(self, "错误", "PyInstaller安装失败，请查看日志获取详细信息。")
+            if cancel_reason != 'cancelled':
+                QMessageBox.critical(self, "错误", "PyInstaller安装失败，请查看日志获取详细信息。")
             self.pack_btn.setEnabled(True)
+            self.resume_warmup()
     
-    def continue_packaging(self, source_file):
+    def continue_packaging(self, source_file, staged_dirs=None):
         """继续打包流程"""
+        # 附加目录先在后台增量暂存，完成后再回到这里构建命令
+        if staged_dirs is None and self.staging_cb.isChecked():
+            directories = []
+            for file_path in self.files_model:
+                if os.path.isdir(file_path):
+                    directories.append(file_path)
+            if directories:
+                self.start_staging(source_file, directories)
+                return
+        staged_dirs = staged_dirs or {}
+        
         # 构建PyInstaller命令 - 注意模块名区分大小写，必须使用大写PyInstaller
         cmd = [self.python_path, "-m", "PyInstaller"]
         
         # 基本参数
         if self.single_file_rb.isChecked():
             cmd.append("-F")
+        elif self.dual_rb.isChecked():
+            # 通过启动脚本在目录模式spec中追加单文件EXE，一次打包得到两种产物
+            program_name = self.name_edit.text().strip() or os.path.splitext(os.path.basename(source_file))[0]
+            cmd = [self.python_path, "-c", DUAL_OUTPUT_DRIVER, f"{program_name}_onefile", "-D"]
         else:
             cmd.append("-D")
         
@@ -1541,16 +1945,21 @@ class PyInstallerGUI(QMainWindow):
         if self.name_edit.text().strip():
             cmd.extend(["-n", self.name_edit.text().strip()])
         
+        # 路径统一转为规范的绝对路径，同样的设置总是生成相同的命令
         if self.icon_edit.text().strip():
-            cmd.extend(["-i", self.icon_edit.text().strip()])
+            cmd.extend(["-i", canonical_path(self.icon_edit.text().strip())])
         
         if self.output_edit.text().strip():
-            cmd.extend(["--distpath", self.output_edit.text().strip()])
+            cmd.extend(["--distpath", canonical_path(self.output_edit.text().strip())])
         
-        # 高级参数
-        if self.clean_cb.isChecked():
+        # 高级参数；监视模式的重新打包复用工作目录中的分析缓存，只重新处理变化的部分
+        if self.clean_cb.isChecked() and not self.watch_build:
             cmd.append("--clean")
         
+        if self.watch_build and not self.spec_only_cb.isChecked():
+            # 输出目录已存在时不询问是否覆盖
+            cmd.append("--noconfirm")
+        
         if self.spec_only_cb.isChecked():
             # -y 参数用于覆盖现有文件，没有直接生成spec文件的参数
             # 生成spec文件是PyInstaller的默认行为，不需要额外参数
@@ -1560,31 +1969,8 @@ class PyInstallerGUI(QMainWindow):
             cmd.append("-d")
             cmd.append("all")
         
-        # 隐藏导入
-        hidden_imports = self.hidden_import_edit.text().strip()
-        
-        # 添加附加库列表中的库到隐藏导入
-        additional_libs = []
-        for i in range(self.additional_libs_list.count()):
-            lib_name = self.additional_libs_list.item(i).text().strip()
-            if lib_name:
-                additional_libs.append(lib_name)
-        
-        # 合并所有隐藏导入
-        all_hidden_imports = set()
-        
-        # 添加手动输入的隐藏导入
-        if hidden_imports:
-            for imp in hidden_imports.split(","):
-                imp = imp.strip()
-                if imp:
-                    all_hidden_imports.add(imp)
-        
-        # 添加附加库
-        for lib in additional_libs:
-            all_hidden_imports.add(lib)
-        
-        # 添加到命令中
+        # 隐藏导入：手动输入的和附加库列表合并，去重后排序，参数顺序不随输入顺序变化
+        all_hidden_imports = sorted_unique(self.hidden_import_edit.text().split(",") + list(self.additional_libs_model))
         for imp in all_hidden_imports:
             cmd.extend(["--hidden-import", imp])
         
@@ -1592,14 +1978,12 @@ class PyInstallerGUI(QMainWindow):
         if self.noupx_cb.isChecked():
             cmd.append("--noupx")
         
-        upx_exclude = self.upx_exclude_edit.text().strip()
-        if upx_exclude:
-            for exclude in upx_exclude.split(","):
-                cmd.extend(["--upx-exclude", exclude.strip()])
+        for exclude in sorted_unique(self.upx_exclude_edit.text().split(",")):
+            cmd.extend(["--upx-exclude", exclude])
         
         upx_dir = self.upx_dir_edit.text().strip()
         if upx_dir:
-            cmd.extend(["--upx-dir", upx_dir])
+            cmd.extend(["--upx-dir", canonical_path(upx_dir)])
         
         # 添加优化级别
         optimize_level = self.optimize_combo.currentIndex()
@@ -1607,22 +1991,23 @@ class PyInstallerGUI(QMainWindow):
             cmd.extend(["--optimize", str(optimize_level)])
         
         # 排除模块
-        exclude_modules = self.exclude_edit.text().strip()
-        if exclude_modules:
-            for mod in exclude_modules.split(","):
-                cmd.extend(["--exclude-module", mod.strip()])
+        for mod in sorted_unique(self.exclude_edit.text().split(",")):
+            cmd.extend(["--exclude-module", mod])
         
         # 工作目录
         if self.workpath_edit.text().strip():
-            cmd.extend(["--workpath", self.workpath_edit.text().strip()])
+            cmd.extend(["--workpath", canonical_path(self.workpath_edit.text().strip())])
         
-        # 附加文件
-        for i in range(self.files_list.count()):
-            file_path = self.files_list.item(i).text()
+        # 附加文件，按目标位置和源路径排序
+        add_data = set()
+        for file_path in self.files_model:
             if os.path.isfile(file_path):
-                cmd.extend(["--add-data", f"{file_path};."])
+                add_data.add((".", canonical_path(file_path)))
             elif os.path.isdir(file_path):
-                cmd.extend(["--add-data", f"{file_path};{os.path.basename(file_path)}"])
+                data_dir = staged_dirs.get(file_path, file_path)
+                add_data.add((os.path.basename(os.path.normpath(file_path)), canonical_path(data_dir)))
+        for dest, src in sorted(add_data):
+            cmd.extend(["--add-data", f"{src};{dest}"])
         
         # 附加参数
         extra_args = self.extra_args_edit.text().strip()
@@ -1630,38 +2015,352 @@ class PyInstallerGUI(QMainWindow):
             cmd.extend(extra_args.split())
         
         # 添加源文件
+        source_file = canonical_path(source_file)
         cmd.append(source_file)
         
+        # 固定的时间戳取自源码，同样的输入每次打包得到相同的产物
+        epoch = source_date_epoch([source_file] + list(self.files_model))
+        self.verify_state = None
+        if self.verify_cb.isChecked() and not self.spec_only_cb.isChecked() and not self.watch_build:
+            dist_dir = canonical_path(self.output_edit.text().strip() or "dist")
+            self.verify_state = {'stage': 'first', 'source_file': source_file, 'cmd': cmd,
+                                 'epoch': epoch, 'dist_dir': dist_dir}
+        
         # 显示命令
         self.append_log("执行命令:", "info")
-        self.append_log(" ".join(cmd), "debug")
+        self.append_log(format_command(cmd), "debug")
+        self.append_log(f"SOURCE_DATE_EPOCH={epoch} PYTHONHASHSEED=0", "debug")
         self.append_log("\n开始打包...\n", "info")
         
         # 禁用打包按钮
         self.pack_btn.setEnabled(False)
-        
-        # 执行命令
+        self.run_build(source_file, cmd, epoch)
+    
+    def run_build(self, source_file, cmd, epoch, title=None):
+        """启动打包进程"""
+        # 打包会删除并重新生成输出目录，先结束还在读取旧产物的清单线程
+        self.cancel_manifests()
         self.process = QProcess()
         self.process.setProcessChannelMode(QProcess.MergedChannels)
         
-        # 设置环境变量，确保命令行输出为UTF-8
+        # 设置环境变量，确保命令行输出为UTF-8，并固定哈希种子和时间戳
         from PyQt5.QtCore import QProcessEnvironment
         env = QProcessEnvironment.systemEnvironment()
         env.insert("PYTHONIOENCODING", "utf-8")
         env.insert("PYTHONUTF8", "1")
-        self.process.setProcessEnvironment(env)
+        self.process.setProcessEnvironment(reproducible_environment(env, epoch))
         
         self.process.readyReadStandardOutput.connect(self.read_output)
         self.process.finished.connect(self.process_finished)
+        self.track_process(self.process, "build", title or f"打包 {os.path.basename(source_file)}", cmd)
+        self.process.outputs = self.build_outputs(cmd)
+        self.start_build_progress(source_file, cmd)
         self.process.start(cmd[0], cmd[1:])
     
+    def build_outputs(self, cmd):
+        """从打包命令得到本次打包的工作目录、可能的产物路径，以及各产物是否应为目录，同名参数以后出现的为准"""
+        options = {}
+        for flag, value in zip(cmd, cmd[1:]):
+            if flag in ('-n', '--name'):
+                options['name'] = value
+            elif flag in ('--workpath', '--distpath'):
+                options[flag] = value
+        name = options.get('name') or os.path.splitext(os.path.basename(cmd[-1]))[0]
+        names = [name]
+        if cmd[1] == '-c':
+            # 单文件+目录：启动脚本的第一个参数是单文件版的程序名
+            names.append(cmd[3])
+        work_dir = os.path.join(canonical_path(options.get('--workpath', 'build')), name)
+        dist_root = canonical_path(options.get('--distpath', 'dist'))
+        # 可能的产物及其是否为目录：单文件为文件，目录模式和macOS的 .app 为目录
+        onefile_names = [cmd[3]] if cmd[1] == '-c' else [name] if '-F' in cmd else []
+        artifacts = []
+        for item in names:
+            for suffix in ('', '.exe', '.app'):
+                artifacts.append((os.path.join(dist_root, item + suffix), item not in onefile_names or suffix == '.app'))
+        return work_dir, [path for path, is_dir in artifacts], artifacts
+    
+    def discard_build_outputs(self, process):
+        """删除被停止的打包留下的不完整输出，保证下次增量打包可用"""
+        work_dir, dist_paths, artifacts = process.outputs
+        removed = discard_partial_outputs(work_dir, dist_paths, process.started_at)
+        if removed:
+            self.append_log(f"已删除本次打包写入的 {removed} 个不完整的文件和目录，下次打包时重新生成", "info")
+    
+    def start_manifest(self, outputs, release=True):
+        """在后台为本次打包的产物生成清单，源文件未变的文件复用缓存的哈希
+
+        release 为 True 且勾选了差分更新包时，再与上一次保存的打包生成差分更新包
+        """
+        if not self.manifest_cb.isChecked() or self.spec_only_cb.isChecked():
+            return
+        work_dir, dist_paths, artifacts = outputs
+        targets = [path for path, is_dir in artifacts if os.path.exists(path) and os.path.isdir(path) == is_dir]
+        if not targets:
+            return
+        self.manifest_threads = [thread for thread in self.manifest_threads if thread.isRunning()]
+        release_scope = None
+        if release and self.delta_cb.isChecked():
+            release_scope = os.path.dirname(targets[0])
+        thread = ManifestThread(targets, read_collect_tocs(work_dir), release_scope)
+        thread.progress_updated.connect(self.append_log)
+        self.manifest_threads.append(thread)
+        thread.start()
+    
+    def cancel_manifests(self):
+        for thread in self.manifest_threads:
+            thread.cancel()
+            thread.wait()
+        self.manifest_threads = []
+    
+    def start_verify_build(self):
+        """复现性校验：在独立的输出和工作目录中从头再打包一次"""
+        verify = self.verify_state
+        verify['stage'] = 'second'
+        root = get_app_data_dir('verify_builds')
+        name = f"{os.path.splitext(os.path.basename(verify['source_file']))[0]}-{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+        verify['verify_dir'] = os.path.join(root, unique_dir_name(root, name))
+        verify['verify_dist'] = os.path.join(verify['verify_dir'], 'dist')
+        # 后出现的同名参数覆盖前面的，输出和工作目录指向校验目录
+        cmd = verify['cmd'][:-1] + ["--distpath", verify['verify_dist'],
+                                    "--workpath", os.path.join(verify['verify_dir'], 'build'), verify['cmd'][-1]]
+        self.append_log("复现性校验: 开始第二次打包", "info")
+        self.append_log(format_command(cmd), "debug")
+        self.run_build(verify['source_file'], cmd, verify['epoch'], "复现性校验打包")
+        # 校验打包是全新构建，耗时不计入历史记录
+        self.build_keys = None
+    
+    def start_artifact_compare(self):
+        """比较两次打包的产物"""
+        verify = self.verify_state
+        names = os.listdir(verify['verify_dist']) if os.path.isdir(verify['verify_dist']) else []
+        self.compare_thread = ArtifactCompareThread(verify['dist_dir'], verify['verify_dist'], names)
+        self.compare_thread.progress_updated.connect(self.append_log)
+        self.compare_thread.compared.connect(self.on_artifacts_compared)
+        self.compare_thread.finished.connect(self.on_artifact_compare_finished)
+        self.compare_thread.start()
+    
+    def on_artifacts_compared(self, count, differences):
+        """输出复现性校验结果"""
+        if not differences:
+            self.append_log(f"✅ 复现性校验通过: 两次打包的 {count} 个文件完全相同", "success")
+            QMessageBox.information(self, "成功", f"打包完成，复现性校验通过！\n\n两次打包的 {count} 个文件完全相同。")
+            return
+        self.append_log(f"⚠ 复现性校验未通过: {count} 个文件中有 {len(differences)} 个不同", "warning")
+        for rel_path, reason in differences[:20]:
+            self.append_log(f"  {rel_path}: {reason}", "warning")
+        if len(differences) > 20:
+            self.append_log(f"  ……另有 {len(differences) - 20} 个", "warning")
+        QMessageBox.warning(self, "复现性校验", f"打包完成，但两次打包的产物有 {len(differences)} 个文件不同。\n\n"
+                                               "请查看日志中的文件列表。")
+    
+    def on_artifact_compare_finished(self, success, message):
+        """比较完成后删除校验目录，恢复打包按钮"""
+        if not success:
+            self.append_log(message, "error")
+        if self.verify_state:
+            discard_dir(self.verify_state['verify_dir'])
+            if success:
+                self.start_manifest(self.verify_state['outputs'])
+        self.verify_state = None
+        self.pack_btn.setEnabled(True)
+        self.resume_warmup()
+    
+    def toggle_watch_mode(self, enabled):
+        """开启或关闭监视模式"""
+        if not enabled:
+            self.source_watcher.stop()
+            self.append_log("监视模式已关闭", "info")
+            return
+        self.ensure_all_tabs_built()
+        if not self.project_source():
+            QMessageBox.warning(self, "警告", "请先选择要打包的Python脚本！")
+            self.watch_cb.setChecked(False)
+            return
+        self.watch_announce = True
+        self.source_watcher.set_inputs(self.project_source(), self.files_model)
+        self.source_watcher.start()
+    
+    def on_watch_refreshed(self, count):
+        """监视的路径在后台收集完成，开启监视模式后的第一次收集输出监视的数量"""
+        if not self.watch_announce:
+            return
+        self.watch_announce = False
+        self.append_log(f"监视模式已开启: 监视 {count} 个文件和目录，保存后自动重新打包", "info")
+        if count >= WATCH_MAX_PATHS:
+            self.append_log(f"监视的路径超过 {WATCH_MAX_PATHS} 个，部分附加文件的变化不会触发重新打包", "warning")
+    
+    def refresh_watch(self, *args):
+        """脚本或附加文件变化后更新监视的路径（在后台收集）"""
+        if self.watch_cb.isChecked():
+            self.source_watcher.set_inputs(self.project_source(), self.files_model)
+    
+    def on_sources_changed(self, paths):
+        """监视的文件发生变化：取消正在进行的打包，用最新的源码增量重新打包"""
+        if not self.watch_cb.isChecked() or self.close_pending:
+            return
+        names = ", ".join(os.path.basename(path) for path in paths[:5])
+        more = f" 等 {len(paths)} 个" if len(paths) > 5 else ""
+        self.append_log(f"监视模式: {names}{more} 已变化", "info")
+        if self.process and self.process.state() != QProcess.NotRunning:
+            self.append_log("监视模式: 取消正在进行的打包，改为打包最新的源码", "warning")
+            self.watch_restart = True
+            self.process.cancel_reason = 'restart'
+            kill_qprocess_tree(self.process)
+            return
+        warmup_installing = self.warmup_thread and self.warmup_thread.isRunning() and self.warmup_thread.stage == 'install'
+        if not self.pack_btn.isEnabled() or not self.python_path or warmup_installing:
+            # 正在暂存目录、安装PyInstaller或准备运行时，稍后再试
+            self.source_watcher.timer.start()
+            return
+        self.start_watch_build()
+    
+    def start_watch_build(self):
+        """监视模式触发的打包：复用上次的工作目录，不清理缓存，不弹出结果对话框"""
+        source_file = self.project_source()
+        if not source_file:
+            return
+        self.watch_build = True
+        self.pack_btn.setEnabled(False)
+        if self.warmup_thread and self.warmup_thread.isRunning():
+            self.warmup_thread.pause()
+        self.continue_packaging(source_file)
+    
+    def start_staging(self, source_file, directories):
+        """启动后台线程增量暂存附加目录"""
+        self.append_log(f"开始增量暂存 {len(directories)} 个附加目录...", "info")
+        self.pack_btn.setEnabled(False)
+        
+        self.staging_thread = StagingThread(
+            directories,
+            split_patterns(self.staging_include_edit.text()),
+            split_patterns(self.staging_exclude_edit.text())
+        )
+        self.staging_thread.progress_updated.connect(self.append_log)
+        self.staging_thread.staged_updated.connect(lambda staged: self.continue_packaging(source_file, staged))
+        self.staging_thread.finished.connect(self.on_staging_finished)
+        self.staging_thread.start()
+        self.update_stop_button()
+    
+    def on_staging_finished(self, success, message):
+        """暂存线程完成后的处理"""
+        self.update_stop_button()
+        if not success:
+            self.append_log(f"附加目录暂存失败: {message}", "error")
+            self.pack_btn.setEnabled(True)
+            self.resume_warmup()
+    
     def read_output(self):
-        output = self.process.readAllStandardOutput().data().decode("utf-8", errors="replace")
-        self.append_log(output, "debug")
+        self.read_process_output(self.process)
+    
+    def start_build_progress(self, source_file, cmd):
+        """根据历史记录开始预估打包进度"""
+        self.build_keys = BuildHistory.make_keys(source_file, cmd[1:-1])
+        estimate = self.build_history.estimate(*self.build_keys)
+        self.build_tracker = BuildProgressTracker(estimate)
+        if estimate:
+            self.append_log(f"根据 {estimate['runs']} 次历史记录，预计打包耗时 {format_duration(estimate['total'])}", "info")
+            self.build_progress.setRange(0, 1000)
+        else:
+            self.build_progress.setRange(0, 0)
+        self.build_progress.show()
+        self.build_eta_label.show()
+        self.update_build_progress()
+        self.eta_timer.start()
+    
+    def update_build_progress(self):
+        """刷新进度条和预计剩余时间"""
+        tracker = self.build_tracker
+        if tracker is None:
+            return
+        elapsed = tracker.elapsed()
+        remaining = tracker.remaining()
+        phase_name = PHASE_NAMES[tracker.phase]
+        if remaining is None:
+            self.build_eta_label.setText(f"{phase_name} | 已用时 {format_duration(elapsed)} | 暂无历史记录")
+            return
+        
+        self.build_progress.setValue(int(1000 * elapsed / max(elapsed + remaining, 1)))
+        self.build_progress.setFormat(f"{phase_name} %p%")
+        self.build_eta_label.setText(f"已用时 {format_duration(elapsed)} | 预计剩余 {format_duration(remaining)}")
+        if tracker.is_slow() and not tracker.slow_warned:
+            tracker.slow_warned = True
+            self.append_log(f"⚠ 本次打包已用时 {format_duration(elapsed)}，明显慢于历史中位数 "
+                            f"{format_duration(tracker.estimate['total'])}，当前阶段: {phase_name}", "warning")
+    
+    def finish_build_progress(self, exit_code):
+        """结束计时，成功时记录历史并检查性能回退"""
+        self.eta_timer.stop()
+        self.build_progress.hide()
+        self.build_eta_label.hide()
+        tracker = self.build_tracker
+        self.build_tracker = None
+        if tracker is None:
+            return
+        
+        durations, total = tracker.finish()
+        self.append_log("各阶段耗时: " + "，".join(
+            f"{PHASE_NAMES[key]} {format_duration(seconds)}" for key, seconds in durations.items()), "info")
+        if exit_code != 0 or self.build_keys is None:
+            return
+        regressions = tracker.regressions(durations, total)
+        if regressions:
+            self.append_log("⚠ 本次打包明显慢于历史记录，可能存在性能回退:", "warning")
+            for message in regressions:
+                self.append_log(f"  {message}", "warning")
+        self.build_history.record(*self.build_keys, durations, total)
     
     def process_finished(self, exit_code, exit_status):
-        if exit_code == 0:
+        # 先输出剩余内容，再汇总警告和错误
+        self.finish_process_output(self.process, exit_code)
+        counts = self.process.decoder.counts
+        self.append_log(f"\n打包输出共 {counts['warning']} 条警告，{counts['error']} 条错误", "info")
+        if exit_code != 0 and self.process.decoder.error_lines:
+            self.append_log("最近的错误:", "error")
+            for line in self.process.decoder.error_lines:
+                self.append_log(f"  {line}", "error")
+        self.finish_build_progress(exit_code)
+        cancel_reason = self.process.cancel_reason
+        if cancel_reason:
+            self.discard_build_outputs(self.process)
+        
+        if self.watch_restart:
+            # 被更新的源码取代的打包
+            self.watch_restart = False
+            self.append_log("\n已取消，开始打包最新的源码...", "info")
+            self.start_watch_build()
+            return
+        if cancel_reason:
+            self.finish_stopped_build(cancel_reason)
+            return
+        if self.watch_build:
+            self.watch_build = False
+            if exit_code == 0:
+                self.append_log(f"\n✅ 监视模式: 重新打包成功 ({time.strftime('%H:%M:%S')})", "success")
+                self.start_manifest(self.process.outputs, release=False)
+            else:
+                self.append_log(f"\n❌ 监视模式: 重新打包失败，退出码: {exit_code}", "error")
+            self.pack_btn.setEnabled(True)
+            self.resume_warmup()
+            return
+        
+        verify = self.verify_state
+        if verify and exit_code == 0:
+            if verify['stage'] == 'first':
+                self.append_log("\n✅ 打包成功！", "success")
+                verify['outputs'] = self.process.outputs
+                self.start_verify_build()
+            else:
+                self.start_artifact_compare()
+            return
+        self.verify_state = None
+        if verify and verify['stage'] == 'second':
+            discard_dir(verify['verify_dir'])
+            self.append_log(f"\n❌ 复现性校验的第二次打包失败，退出码: {exit_code}", "error")
+            QMessageBox.critical(self, "错误", "打包完成，但复现性校验的第二次打包失败！请查看日志获取详细信息。")
+        elif exit_code == 0:
             self.append_log("\n✅ 打包成功！", "success")
+            self.start_manifest(self.process.outputs)
             QMessageBox.information(self, "成功", "打包完成！")
         else:
             self.append_log(f"\n❌ 打包失败，退出码: {exit_code}", "error")
@@ -1669,6 +2368,25 @@ class PyInstallerGUI(QMainWindow):
         
         # 启用打包按钮
         self.pack_btn.setEnabled(True)
+        self.resume_warmup()
+    
+    def finish_stopped_build(self, cancel_reason):
+        """打包被停止或超时后恢复界面，复现性校验不再继续"""
+        verify = self.verify_state
+        self.verify_state = None
+        if verify and verify['stage'] == 'second':
+            discard_dir(verify['verify_dir'])
+        watch_build = self.watch_build
+        self.watch_build = False
+        if cancel_reason == 'timeout':
+            self.append_log("\n❌ 打包超时，已强制结束", "error")
+            if not watch_build and not self.close_pending:
+                QMessageBox.critical(self, "错误", "打包超时，已强制结束！\n\n"
+                                                   f"可以在窗口底部调大超时时间（当前 {self.timeout_spin.value()} 分钟）。")
+        else:
+            self.append_log("\n打包已停止", "warning")
+        self.pack_btn.setEnabled(True)
+        self.resume_warmup()
     
     def closeEvent(self, event):
         """软件关闭时清理Python环境"""
@@ -1676,31 +2394,56 @@ class PyInstallerGUI(QMainWindow):
         
         # 禁用窗口关闭，直到清理完成
         event.ignore()
-        
-        # 检查解压线程是否正在运行
+        self.close_pending = True
+        
+        # 后台线程都可以取消，取消后很快退出；中断留下的临时目录由下次启动的 CleanupThread 清理
+        
+        # 取消正在进行的暂存和目录扫描
+        if self.staging_thread and self.staging_thread.isRunning():
+            self.staging_thread.cancel()
+            self.staging_thread.wait()
+        for thread in list(self.scan_threads.values()):
+            thread.cancel()
+            thread.wait()
+        if self.module_index_thread and self.module_index_thread.isRunning():
+            # 扫描在每个目录检查取消，很快退出；只等待有限时间，不阻塞关闭
+            self.module_index_thread.cancel()
+            self.module_index_thread.wait(2000)
+        if self.env_fork_thread and self.env_fork_thread.isRunning():
+            self.env_fork_thread.cancel()
+            self.env_fork_thread.wait()
+        self.cancel_warmup()
+        self.source_watcher.stop()
+        # 结束正在进行的打包和PIP任务及其子进程；进程树已同步结束，不等待 finished 信号，直接清理打包的不完整输出
+        for process in list(self.running_processes):
+            if process.state() != QProcess.NotRunning:
+                process.cancel_reason = 'cancelled'
+                kill_qprocess_tree(process)
+                if process.kind == 'build':
+                    self.discard_build_outputs(process)
+        if self.compare_thread and self.compare_thread.isRunning():
+            self.compare_thread.cancel()
+            self.compare_thread.wait()
+        self.cancel_manifests()
+        if self.cleanup_thread and self.cleanup_thread.isRunning():
+            # 清理可以随时中断，剩余部分下次启动时继续
+            self.cleanup_thread.cancel()
+            self.cleanup_thread.wait()
+        
+        # 取消仍在进行的运行时准备（如解析项目依赖），其他窗口仍在使用时不受影响
         if self.python_thread and self.python_thread.isRunning():
-            self.append_log("等待Python解压完成...", "info")
-            self.close_pending = True
-        else:
-            # 开始清理
-            self.really_close()
+            self.python_thread.release()
+            self.python_thread.wait()
+        self.really_close()
     
     def really_close(self):
         """执行实际的关闭操作"""
-        # 清理临时解压的Python环境
-        if hasattr(self, 'extracted_python_dir') and self.extracted_python_dir and os.path.exists(self.extracted_python_dir):
-            try:
-                import shutil
-                shutil.rmtree(self.extracted_python_dir)
-                self.append_log(f"✅ 已清理临时Python环境: {self.extracted_python_dir}", "success")
-            except Exception as e:
-                self.append_log(f"❌ 清理临时Python环境失败: {str(e)}", "error")
-        
+        self.log_store.flush_all()
         self.append_log("软件已关闭", "info")
-        # 执行实际的关闭操作
-        QApplication.quit()
+        self.closed.emit()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
-    window = PyInstallerGUI()
+    window = PyInstallerGUI(report_startup_time="--startup-time" in sys.argv)
+    window.closed.connect(app.quit)
     sys.exit(app.exec_())
\ No newline at end of file
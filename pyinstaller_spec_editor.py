@@ -1,113 +1,74 @@
 import sys
 import os
-import zipfile
-import tempfile
-import shutil
+import re
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QPushButton, QLineEdit, QFileDialog, QCheckBox, QComboBox,
     QTextEdit, QGroupBox, QGridLayout, QListWidget,
     QListWidgetItem, QAbstractItemView, QMessageBox, QInputDialog,
-    QScrollArea
+    QScrollArea, QListView, QSpinBox, QSplitter, QProgressBar
 )
-from PyQt5.QtCore import Qt, QProcess, QThread, pyqtSignal
-from PyQt5.QtGui import QFont, QIcon
-
-class PythonExtractThread(QThread):
-    # 信号定义
-    progress_updated = pyqtSignal(str)  # 消息
-    finished = pyqtSignal(bool, str)  # 成功标志, 结果信息
-    python_path_updated = pyqtSignal(str, str)  # python路径, 解压目录
-    
-    def __init__(self, python_zip):
-        super().__init__()
-        self.python_zip = python_zip
-        self.python_path = None
-        self.extracted_python_dir = None
-    
-    def run(self):
-        """后台解压Python压缩包"""
-        self.progress_updated.emit("开始解压Python压缩包...")
-        
-        if not os.path.exists(self.python_zip):
-            self.progress_updated.emit(f"错误: Python压缩包不存在: {self.python_zip}")
-            self.finished.emit(False, "Python压缩包不存在")
-            return
-        
-        try:
-            # 创建临时目录，避免中文路径导致的编码问题
-            self.extracted_python_dir = tempfile.mkdtemp(prefix='pyinstaller_')
-            self.progress_updated.emit(f"正在解压Python到临时目录: {self.extracted_python_dir}")
-            
-            # 解压压缩包
-            with zipfile.ZipFile(self.python_zip, 'r') as zip_ref:
-                # 获取文件总数用于进度计算
-                total_files = len(zip_ref.infolist())
-                extracted_files = 0
-                last_progress = -1
-                
-                for file_info in zip_ref.infolist():
-                    zip_ref.extract(file_info, self.extracted_python_dir)
-                    extracted_files += 1
-                    
-                    # 计算当前进度百分比
-                    progress = int((extracted_files / total_files) * 100)
-                    
-                    # 每达到10%的整数倍时更新一次进度
-                    if progress % 10 == 0 and progress > last_progress:
-                        self.progress_updated.emit(f"解压进度: {progress}% ({extracted_files}/{total_files}文件)")
-                        last_progress = progress
-            
-            # 找到python.exe路径
-            self.python_path = os.path.join(self.extracted_python_dir, 'python.exe')
-            if not os.path.exists(self.python_path):
-                self.progress_updated.emit("错误: 未找到python.exe")
-                self.finished.emit(False, "未找到python.exe")
-                return
-            
-            # 修改python39._pth文件，启用site模块
-            pth_file = os.path.join(self.extracted_python_dir, 'python39._pth')
-            if os.path.exists(pth_file):
-                with open(pth_file, 'r', encoding='utf-8') as f:
-                    content = f.read()
-                
-                # 取消注释import site
-                content = content.replace('#import site', 'import site')
-                
-                # 添加Lib目录到路径
-                if 'Lib' not in content:
-                    lines = content.split('\n')
-                    updated = False
-                    for i, line in enumerate(lines):
-                        if line.strip() == '.':
-                            lines.insert(i+1, 'Lib')
-                            updated = True
-                            break
-                    if not updated:
-                        lines.append('Lib')
-                    content = '\n'.join(lines)
-                
-                with open(pth_file, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                
-                self.progress_updated.emit("已修改python39._pth，启用site模块并添加Lib路径")
-            
-            self.progress_updated.emit(f"成功解压Python，可执行文件路径: {self.python_path}")
-            self.python_path_updated.emit(self.python_path, self.extracted_python_dir)
-            self.finished.emit(True, "Python解压成功")
-        except Exception as e:
-            self.progress_updated.emit(f"解压Python失败: {str(e)}")
-            self.finished.emit(False, f"解压Python失败: {str(e)}")
+from PyQt5.QtCore import Qt, QProcess, QTimer, pyqtSignal
+from PyQt5.QtGui import QFont, QIcon, QColor
+from pyinstaller_common import (
+    BuildLogStore, StringListModel, sorted_view, ModuleIndex, ModuleIndexThread, ModuleCompleter, SpecBuildScheduler,
+    LogView, OutputDecoder, BuildHistory, BuildProgressTracker, PHASE_NAMES, selected_rows, format_duration,
+    format_size, merge_savings, FileListCache, GlobExpandThread, has_glob, RuntimeManager, ProjectEnvStore,
+    CleanupThread, acquire_instance_lock, ArtifactCompareThread, canonical_path, sorted_unique, unique_paths,
+    source_date_epoch, discard_dir, ManifestThread, read_collect_tocs, MANIFEST_SUFFIX, DELTA_SUFFIX
+)
+
+# 数据文件和二进制文件条目的显示格式: 源 -> 目标目录
+RESOURCE_SEPARATOR = " -> "
+
+# spec中使用glob模式时生成的展开函数，模式在打包时才展开，spec中不写入逐个文件
+SPEC_GLOB_HELPERS = '''import glob
+import os
+
+
+def _glob_paths(pattern):
+    """展开glob模式，** 匹配任意层目录"""
+    return sorted(glob.glob(pattern, recursive=True))
+
+
+def _glob_files(pattern, dest):
+    """展开glob模式中的文件，目标路径保留相对于模式根目录的子目录结构"""
+    wildcard = min(pattern.find(c) for c in '*?[' if c in pattern)
+    root = os.path.dirname(pattern[:wildcard])
+    return [(path, os.path.normpath(os.path.join(dest, os.path.relpath(os.path.dirname(path), root))))
+            for path in _glob_paths(pattern) if os.path.isfile(path)]
+
+
+'''
 
 class PyInstallerSpecEditor(QMainWindow):
-    def __init__(self):
+    # 窗口关闭流程完成（后台线程均已结束）
+    closed = pyqtSignal()
+
+    def __init__(self, embedded=False):
         super().__init__()
+        self.embedded = embedded
+        self.module_index = ModuleIndex()
+        self.module_index_thread = None
+        self.module_index_pending = False
+        self.file_list_cache = FileListCache()
+        self.glob_threads = []
+        self.compare_threads = []
+        self.manifest_threads = []
         self.init_ui()
-        self.process = None
         self.python_path = None
-        self.extracted_python_dir = None
         self.python_thread = None
+        self.runtime_pending = False
+        self.warmup_thread = None
         self.close_pending = False
+        self.log_store = BuildLogStore.instance()
+        self.build_history = BuildHistory()
+        self.build_scheduler = SpecBuildScheduler(self.max_builds_spin.value(), parent=self,
+                                                  timeout=self.timeout_spin.value() * 60)
+        self.build_scheduler.job_started.connect(self.on_build_started)
+        self.build_scheduler.job_finished.connect(self.on_build_finished)
+        self.max_builds_spin.valueChanged.connect(self.build_scheduler.set_max_concurrent)
+        self.timeout_spin.valueChanged.connect(lambda minutes: self.build_scheduler.set_timeout(minutes * 60))
         self.spec_data = {
             'analysis': {
                 'scripts': [],
@@ -136,75 +97,193 @@ class PyInstallerSpecEditor(QMainWindow):
                 'name': ''
             }
         }
+        self.cleanup_thread = None
+        # 标记本实例的临时目录仍在使用，避免被其他实例清理
+        acquire_instance_lock()
         self.detect_system()
-        # 启动后台线程解压Python
-        self.start_python_extract()
-        # 显示窗口
-        self.show()
+        # 启动后台线程准备默认运行时
+        self.start_runtime_prepare()
+        # 显示窗口；作为标签页嵌入时由外层窗口显示
+        if not embedded:
+            self.show()
+        # 启动完成后再在后台清理遗留的临时目录
+        QTimer.singleShot(5000, self.start_cleanup)
+
+    def start_cleanup(self):
+        """后台清理崩溃或强制退出后遗留的运行时和临时目录"""
+        if self.close_pending or not self.runtime_manager.claim_cleanup():
+            return
+        self.cleanup_thread = CleanupThread()
+        self.cleanup_thread.progress_updated.connect(self.append_log)
+        self.cleanup_thread.start()
 
     def detect_system(self):
-        """检测系统架构，选择对应的Python压缩包"""
+        """检测系统架构，登记可用的Python运行时"""
         import platform
         self.system_arch = platform.architecture()[0]
-        print(f"系统架构: {self.system_arch}")
-        
-        # 获取程序所在目录，确保在被打包成exe后仍能找到压缩包
-        if getattr(sys, 'frozen', False):
-            # 程序被打包成exe的情况
-            if hasattr(sys, '_MEIPASS'):
-                # 单文件模式：使用临时解压目录
-                program_dir = sys._MEIPASS
-            else:
-                # 目录模式：使用程序可执行文件目录
-                program_dir = os.path.dirname(sys.executable)
-        else:
-            # 正常运行Python脚本的情况
-            program_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # 根据系统架构选择对应的Python压缩包
-        if self.system_arch == '64bit':
-            self.python_zip = os.path.join(program_dir, 'python-3.9.13-embed-amd64.zip')
+        self.append_log(f"系统架构: {self.system_arch}", "info")
+        
+        # 与同一进程中的打包器共用运行时登记表和准备、预热线程
+        self.runtime_manager = RuntimeManager.instance()
+        self.runtime_registry = self.runtime_manager.registry
+        self.runtime_id = self.runtime_registry.default_runtime_id(self.system_arch)
+        self.update_runtime_combo()
+        if self.runtime_id:
+            self.append_log(f"默认Python运行时: {self.runtime_registry.describe(self.runtime_id)}", "info")
         else:
-            self.python_zip = os.path.join(program_dir, 'python-3.9.13-embed-win32.zip')
-        
-        print(f"使用Python压缩包: {os.path.basename(self.python_zip)}")
+            self.append_log("未找到可用的Python运行时", "error")
+
+    def update_runtime_combo(self):
+        """刷新运行时下拉框，选中当前运行时"""
+        self.runtime_combo.blockSignals(True)
+        self.runtime_combo.clear()
+        for runtime_id in self.runtime_registry.runtimes:
+            self.runtime_combo.addItem(self.runtime_registry.describe(runtime_id), runtime_id)
+        index = self.runtime_combo.findData(self.runtime_id)
+        if index >= 0:
+            self.runtime_combo.setCurrentIndex(index)
+        self.runtime_combo.blockSignals(False)
+
+    def on_runtime_selected(self, index):
+        """切换运行时：记录为当前项目（第一个脚本）的选择并在后台准备"""
+        runtime_id = self.runtime_combo.itemData(index)
+        if not runtime_id or runtime_id == self.runtime_id:
+            return
+        if self.project_source():
+            self.runtime_registry.set_project_runtime(self.project_source(), runtime_id)
+        self.select_runtime(runtime_id)
+
+    def select_runtime(self, runtime_id):
+        """使用指定的运行时，首次使用时才解压；已提交的打包任务不受影响"""
+        self.runtime_id = runtime_id
+        self.cancel_warmup()
+        self.python_path = None
+        self.module_index = ModuleIndex()
+        self.update_runtime_combo()
+        self.start_runtime_prepare()
+
+    def project_source(self):
+        """当前项目（第一个脚本），用于选择运行时和项目虚拟环境"""
+        return os.path.abspath(next(iter(self.scripts_model))) if len(self.scripts_model) else None
+
+    def on_project_changed(self):
+        """切换项目：使用该项目上次选择的运行时，本机解释器为项目准备独立的虚拟环境"""
+        runtime_id = self.runtime_registry.project_runtime(self.project_source())
+        if runtime_id and runtime_id != self.runtime_id:
+            self.select_runtime(runtime_id)
+        elif self.runtime_id and self.runtime_registry.runtimes[self.runtime_id]['kind'] == 'host':
+            self.cancel_warmup()
+            self.python_path = None
+            self.module_index = ModuleIndex()
+            self.start_runtime_prepare()
+        elif self.python_path:
+            # 预下载新项目的依赖
+            self.start_warmup()
 
-    def start_python_extract(self):
-        """启动后台线程解压Python"""
-        # 创建并启动解压线程
-        self.python_thread = PythonExtractThread(self.python_zip)
+    def start_runtime_prepare(self):
+        """启动后台线程准备当前运行时"""
+        if not self.runtime_id:
+            return
+        if self.python_thread and self.python_thread.isRunning():
+            # 正在准备其他运行时，完成后再准备当前选择的运行时
+            self.runtime_pending = True
+            return
+        
+        self.runtime_pending = False
+        if self.python_thread:
+            self.python_thread.release()
+        # 取得准备会话，相同运行时已在准备时共用同一个线程
+        self.python_thread = self.runtime_manager.acquire(self.runtime_id, self.project_source())
         
         # 连接信号
         self.python_thread.progress_updated.connect(self.append_log)
         self.python_thread.python_path_updated.connect(self.on_python_extracted)
         self.python_thread.finished.connect(self.on_python_extract_finished)
-        
-        # 启动线程
-        self.python_thread.start()
     
-    def on_python_extracted(self, python_path, extracted_dir):
-        """Python解压完成后的处理"""
-        self.python_path = python_path
-        self.extracted_python_dir = extracted_dir
+    def on_python_extracted(self, python_path, runtime_dir):
+        """运行时准备完成后的处理"""
+        # 嵌入式包等运行时与项目无关，只有本机解释器要求准备时的项目仍是当前项目
+        if self.python_thread.key == self.runtime_manager.prepare_key(self.runtime_id, self.project_source()):
+            self.python_path = python_path
     
     def on_python_extract_finished(self, success, message):
-        """解压线程完成后的处理"""
+        """准备线程完成后的处理"""
+        # 关闭时会话已退出，不再处理
+        if self.close_pending:
+            return
+        
+        if self.runtime_pending:
+            self.start_runtime_prepare()
+            return
+        
         if success:
-            self.append_log("Python解压完成，软件已准备就绪")
+            self.append_log("Python运行时已就绪，软件已准备就绪", "success")
+            # 显示测得的启动耗时
+            self.update_runtime_combo()
+            self.start_module_index()
+            self.start_warmup()
         else:
-            self.append_log(f"Python解压失败: {message}")
+            self.append_log(f"Python运行时准备失败: {message}", "error")
+    
+    def start_warmup(self):
+        """运行时就绪后在后台预热：安装PyInstaller、预编译、预导入、预下载项目依赖"""
+        self.cancel_warmup()
+        if not self.python_path or self.close_pending:
+            return
+        source_file = self.project_source()
+        requirements_file = ProjectEnvStore.project_requirements(source_file) if source_file else None
+        # 本机解释器只在项目虚拟环境中安装，不改动系统的Python
+        install = self.runtime_registry.runtimes[self.runtime_id]['kind'] != 'host' or source_file is not None
+        self.warmup_thread = self.runtime_manager.warmup(self.python_path, requirements_file, install)
+        self.warmup_thread.progress_updated.connect(self.append_log)
+        thread = self.warmup_thread
+        thread.finished.connect(lambda success, message: self.on_warmup_finished(thread, success, message))
+        if self.build_scheduler.running:
+            # 正在打包时启动的预热直接进入暂停状态
+            self.warmup_thread.pause()
+        self.warmup_thread.start()
+    
+    def cancel_warmup(self):
+        """取消正在进行的预热"""
+        if self.warmup_thread and self.warmup_thread.isRunning():
+            self.warmup_thread.cancel()
+            self.warmup_thread.wait()
+        self.warmup_thread = None
+    
+    def on_warmup_finished(self, thread, success, message):
+        """预热线程完成后的处理"""
+        self.append_log(message, "info" if success else "warning")
+        if thread is self.warmup_thread and thread.installed:
+            self.start_module_index()
+    
+    def start_module_index(self):
+        """在后台建立运行时的模块索引，用于隐藏导入的自动补全"""
+        if not self.python_path or self.close_pending:
+            return
+        if self.module_index_thread and self.module_index_thread.isRunning():
+            # 正在建立索引时又安装了PyInstaller，完成后再更新一次
+            self.module_index_pending = True
+            return
         
-        # 检查是否有关闭请求
-        if self.close_pending:
-            self.really_close()
+        self.module_index_pending = False
+        self.module_index_thread = ModuleIndexThread(self.python_path, self.python_path)
+        self.module_index_thread.progress_updated.connect(self.append_log)
+        self.module_index_thread.index_updated.connect(self.on_module_index_updated)
+        self.module_index_thread.finished.connect(self.on_module_index_finished)
+        self.module_index_thread.start()
+    
+    def on_module_index_updated(self, index):
+        """模块索引更新后的处理"""
+        self.module_index = index
     
-    def extract_python(self):
-        """已废弃，使用后台线程解压Python"""
-        pass
+    def on_module_index_finished(self, success, message):
+        """模块索引线程完成后的处理"""
+        if self.module_index_pending:
+            self.start_module_index()
     
-    def append_log(self, message):
+    def append_log(self, message, level="info"):
         """添加日志输出"""
-        print(message)
+        self.log_text.append_message(message, level)
 
     def init_ui(self):
         """初始化UI界面"""
@@ -298,7 +377,7 @@ class PyInstallerSpecEditor(QMainWindow):
                 font-family: '微软雅黑', '黑体', sans-serif;
             }
             /* 列表样式 */
-            QListWidget {
+            QListView {
                 border: 1px solid #d0d0d0;
                 border-radius: 3px;
                 font-family: '微软雅黑', '黑体', sans-serif;
@@ -316,11 +395,41 @@ class PyInstallerSpecEditor(QMainWindow):
         title_label.setAlignment(Qt.AlignCenter)
         main_layout.addWidget(title_label)
         
+        # 上方为spec编辑区域，下方为打包日志
+        splitter = QSplitter(Qt.Vertical)
+        main_layout.addWidget(splitter)
+        
         # 滚动区域
         scroll_area = QScrollArea()
         scroll_area.setWidgetResizable(True)
         scroll_area.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
-        main_layout.addWidget(scroll_area)
+        splitter.addWidget(scroll_area)
+        
+        # 日志面板
+        log_panel = QWidget()
+        log_layout = QVBoxLayout(log_panel)
+        log_layout.setContentsMargins(0, 0, 0, 0)
+        
+        progress_layout = QHBoxLayout()
+        self.build_progress = QProgressBar()
+        self.build_progress.setTextVisible(True)
+        progress_layout.addWidget(self.build_progress)
+        self.build_eta_label = QLabel("")
+        progress_layout.addWidget(self.build_eta_label)
+        self.build_progress.hide()
+        self.build_eta_label.hide()
+        log_layout.addLayout(progress_layout)
+        
+        self.log_text = LogView()
+        log_layout.addWidget(self.log_text)
+        splitter.addWidget(log_panel)
+        splitter.setStretchFactor(0, 3)
+        splitter.setStretchFactor(1, 1)
+        
+        # 每秒刷新一次预计剩余时间
+        self.eta_timer = QTimer(self)
+        self.eta_timer.setInterval(1000)
+        self.eta_timer.timeout.connect(self.update_build_progress)
         
         # 滚动内容
         scroll_content = QWidget()
@@ -333,6 +442,10 @@ class PyInstallerSpecEditor(QMainWindow):
         analysis_card = self.create_analysis_card()
         scroll_layout.addWidget(analysis_card)
         
+        # 资源与排除卡片
+        resources_card = self.create_resources_card()
+        scroll_layout.addWidget(resources_card)
+        
         # PYZ类卡片
         pyz_card = self.create_pyz_card()
         scroll_layout.addWidget(pyz_card)
@@ -345,12 +458,61 @@ class PyInstallerSpecEditor(QMainWindow):
         collect_card = self.create_collect_card()
         scroll_layout.addWidget(collect_card)
         
+        # MERGE多程序卡片
+        merge_card = self.create_merge_card()
+        scroll_layout.addWidget(merge_card)
+        
         scroll_layout.addStretch()
         
         # 底部按钮
         btn_layout = QHBoxLayout()
+        
+        btn_layout.addWidget(QLabel("Python运行时:"))
+        self.runtime_combo = QComboBox()
+        self.runtime_combo.setToolTip("打包所用的Python版本，按项目（第一个脚本）记住选择；启动耗时为解释器空载启动的实测值")
+        self.runtime_combo.currentIndexChanged.connect(self.on_runtime_selected)
+        btn_layout.addWidget(self.runtime_combo)
+        
+        btn_layout.addWidget(QLabel("同时打包数:"))
+        self.max_builds_spin = QSpinBox()
+        self.max_builds_spin.setRange(1, 8)
+        self.max_builds_spin.setValue(2)
+        self.max_builds_spin.setToolTip("超出数量的打包任务会排队等待")
+        btn_layout.addWidget(self.max_builds_spin)
+        
+        btn_layout.addWidget(QLabel("超时:"))
+        self.timeout_spin = QSpinBox()
+        self.timeout_spin.setRange(0, 1440)
+        self.timeout_spin.setValue(60)
+        self.timeout_spin.setSuffix(" 分钟")
+        self.timeout_spin.setSpecialValueText("不限")
+        self.timeout_spin.setToolTip("打包任务运行超过该时间后强制结束整个进程树，对之后开始的任务生效")
+        btn_layout.addWidget(self.timeout_spin)
+        
+        self.verify_cb = QCheckBox("复现性校验")
+        self.verify_cb.setToolTip("同一个spec打包两次，各自使用全新的工作目录，逐文件比较两次的产物")
+        btn_layout.addWidget(self.verify_cb)
+        
+        self.manifest_cb = QCheckBox("产物清单")
+        self.manifest_cb.setChecked(True)
+        self.manifest_cb.setToolTip("打包成功后记录每个文件的路径、大小和SHA-256，写入 <产物>.manifest.json")
+        btn_layout.addWidget(self.manifest_cb)
+        
+        self.delta_cb = QCheckBox("差分包")
+        self.delta_cb.setToolTip("与同名spec上一次保存的打包比较，在产物旁边生成只包含变化部分的差分更新包")
+        self.manifest_cb.toggled.connect(self.delta_cb.setEnabled)
+        btn_layout.addWidget(self.delta_cb)
+        
+        self.build_status_label = QLabel("")
+        btn_layout.addWidget(self.build_status_label)
         btn_layout.addStretch()
         
+        self.stop_builds_btn = QPushButton("停止打包")
+        self.stop_builds_btn.setToolTip("结束正在运行和排队的打包任务，删除它们不完整的输出")
+        self.stop_builds_btn.setEnabled(False)
+        self.stop_builds_btn.clicked.connect(self.stop_builds)
+        btn_layout.addWidget(self.stop_builds_btn)
+        
         cancel_btn = QPushButton("取消")
         cancel_btn.clicked.connect(self.close)
         btn_layout.addWidget(cancel_btn)
@@ -382,7 +544,11 @@ class PyInstallerSpecEditor(QMainWindow):
         scripts_layout.addWidget(QLabel("主脚本列表，包含应用程序的入口脚本："))
         
         scripts_list_layout = QHBoxLayout()
-        self.scripts_list = QListWidget()
+        self.scripts_model = StringListModel(self)
+        self.scripts_list = QListView()
+        self.scripts_list.setModel(self.scripts_model)
+        self.scripts_list.setUniformItemSizes(True)
+        self.scripts_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.scripts_list.setMinimumHeight(100)
         scripts_list_layout.addWidget(self.scripts_list)
         
@@ -406,7 +572,11 @@ class PyInstallerSpecEditor(QMainWindow):
         pathex_layout.addWidget(QLabel("Python解释器的额外搜索路径，用于查找模块："))
         
         pathex_list_layout = QHBoxLayout()
-        self.pathex_list = QListWidget()
+        self.pathex_model = StringListModel(self)
+        self.pathex_list = QListView()
+        self.pathex_list.setModel(self.pathex_model)
+        self.pathex_list.setUniformItemSizes(True)
+        self.pathex_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.pathex_list.setMinimumHeight(100)
         pathex_list_layout.addWidget(self.pathex_list)
         
@@ -430,7 +600,12 @@ class PyInstallerSpecEditor(QMainWindow):
         hidden_imports_layout.addWidget(QLabel("动态导入的模块，PyInstaller无法自动检测到的依赖："))
         
         hidden_imports_list_layout = QHBoxLayout()
-        self.hidden_imports_list = QListWidget()
+        self.hidden_imports_model = StringListModel(self)
+        self.hidden_imports_list = QListView()
+        self.hidden_imports_view = sorted_view(self.hidden_imports_model)
+        self.hidden_imports_list.setModel(self.hidden_imports_view)
+        self.hidden_imports_list.setUniformItemSizes(True)
+        self.hidden_imports_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
         self.hidden_imports_list.setMinimumHeight(100)
         hidden_imports_list_layout.addWidget(self.hidden_imports_list)
         
@@ -439,10 +614,18 @@ class PyInstallerSpecEditor(QMainWindow):
         add_hidden_btn.clicked.connect(self.add_hidden_import)
         hidden_imports_btn_layout.addWidget(add_hidden_btn)
         
+        import_hidden_btn = QPushButton("从文件导入")
+        import_hidden_btn.clicked.connect(self.import_hidden_imports)
+        hidden_imports_btn_layout.addWidget(import_hidden_btn)
+        
         remove_hidden_btn = QPushButton("移除选中")
         remove_hidden_btn.clicked.connect(self.remove_hidden_import)
         hidden_imports_btn_layout.addWidget(remove_hidden_btn)
         
+        sort_hidden_btn = QPushButton("排序")
+        sort_hidden_btn.clicked.connect(lambda: self.hidden_imports_view.sort(0))
+        hidden_imports_btn_layout.addWidget(sort_hidden_btn)
+        
         hidden_imports_btn_layout.addStretch()
         hidden_imports_list_layout.addLayout(hidden_imports_btn_layout)
         hidden_imports_layout.addLayout(hidden_imports_list_layout)
@@ -450,6 +633,124 @@ class PyInstallerSpecEditor(QMainWindow):
         
         return card
 
+    def create_resources_card(self):
+        """创建资源与排除卡片（binaries、datas、excludes、hookspath、runtime_hooks）"""
+        card = QWidget()
+        card.setProperty("card", True)
+        layout = QVBoxLayout(card)
+        
+        # 标题
+        title = QLabel("Analysis类 - 资源文件与排除模块")
+        title.setStyleSheet("font-weight: bold; font-size: 12px; margin-bottom: 10px;")
+        layout.addWidget(title)
+        
+        note = QLabel("可输入文件、目录或glob模式（如 assets/**/*.png），多个用逗号分隔；相对路径以第一个主脚本所在目录为准。\n"
+                      "目录生成Tree，glob模式在打包时展开，spec中不会写入逐个文件的列表。")
+        note.setWordWrap(True)
+        note.setStyleSheet("color: #666;")
+        layout.addWidget(note)
+        
+        self.datas_model, self.datas_list = self.create_pattern_group(
+            layout, "数据文件 (datas)", "文件、目录或glob模式", with_dest=True)
+        self.binaries_model, self.binaries_list = self.create_pattern_group(
+            layout, "二进制文件 (binaries)", "DLL/SO文件、目录或glob模式", with_dest=True)
+        self.excludes_model, self.excludes_list = self.create_pattern_group(
+            layout, "排除模块 (excludes)", "模块名，多个用逗号分隔", module_names=True)
+        self.hookspath_model, self.hookspath_list = self.create_pattern_group(
+            layout, "钩子目录 (hookspath)", "目录或glob模式")
+        self.runtime_hooks_model, self.runtime_hooks_list = self.create_pattern_group(
+            layout, "运行时钩子 (runtime_hooks)", "脚本文件或glob模式，如 hooks/rthook_*.py")
+        
+        return card
+
+    def create_pattern_group(self, layout, title, placeholder, with_dest=False, module_names=False):
+        """创建一个支持批量模式输入的列表分组，返回 (模型, 列表视图)"""
+        group = QGroupBox(title)
+        group_layout = QVBoxLayout(group)
+        
+        model = StringListModel(self)
+        list_view = QListView()
+        list_view.setModel(model)
+        list_view.setUniformItemSizes(True)
+        list_view.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        list_view.setMinimumHeight(80)
+        group_layout.addWidget(list_view)
+        
+        input_layout = QHBoxLayout()
+        pattern_edit = QLineEdit()
+        pattern_edit.setPlaceholderText(placeholder)
+        input_layout.addWidget(pattern_edit, 3)
+        if module_names:
+            ModuleCompleter(pattern_edit, lambda: self.module_index)
+        
+        dest_edit = None
+        if with_dest:
+            dest_edit = QLineEdit()
+            dest_edit.setPlaceholderText("目标目录，默认 .")
+            input_layout.addWidget(dest_edit, 1)
+        
+        add_btn = QPushButton("添加")
+        add_btn.clicked.connect(lambda: self.add_patterns(model, pattern_edit, dest_edit, not module_names))
+        pattern_edit.returnPressed.connect(add_btn.click)
+        input_layout.addWidget(add_btn)
+        
+        if not module_names:
+            browse_btn = QPushButton("浏览目录")
+            browse_btn.clicked.connect(lambda: self.browse_pattern_dir(pattern_edit))
+            input_layout.addWidget(browse_btn)
+        
+        remove_btn = QPushButton("移除选中")
+        remove_btn.clicked.connect(lambda: model.remove_rows(selected_rows(list_view)))
+        input_layout.addWidget(remove_btn)
+        group_layout.addLayout(input_layout)
+        
+        layout.addWidget(group)
+        return model, list_view
+
+    def browse_pattern_dir(self, pattern_edit):
+        """选择目录填入模式输入框"""
+        dir_path = QFileDialog.getExistingDirectory(self, "选择目录", self.resource_base_dir())
+        if dir_path:
+            pattern_edit.setText(dir_path)
+
+    def add_patterns(self, model, pattern_edit, dest_edit, expand):
+        """批量添加逗号分隔的模式，并在后台统计每个模式匹配的文件"""
+        patterns = [p.strip() for p in pattern_edit.text().split(',') if p.strip()]
+        if not patterns:
+            return
+        dest = (dest_edit.text().strip() or '.') if dest_edit is not None else None
+        texts = [f"{p}{RESOURCE_SEPARATOR}{dest}" if dest is not None else p for p in patterns]
+        model.add_many(texts)
+        pattern_edit.clear()
+        if expand:
+            self.start_glob_expand(model, dict(zip(patterns, texts)))
+
+    def start_glob_expand(self, model, items):
+        """后台展开模式，完成后在条目提示中显示匹配的文件数和大小"""
+        thread = GlobExpandThread(list(items), self.file_list_cache, self.resource_base_dir())
+        thread.progress_updated.connect(self.append_log)
+        thread.expanded_updated.connect(lambda results: self.on_patterns_expanded(model, items, results))
+        thread.finished.connect(lambda success, message: self.glob_threads.remove(thread))
+        self.glob_threads.append(thread)
+        thread.start()
+
+    def on_patterns_expanded(self, model, items, results):
+        """显示模式匹配结果，没有匹配任何文件的条目标为橙色"""
+        for pattern, (count, size) in results.items():
+            text = items[pattern]
+            if text not in model:
+                continue
+            model.set_item_data(text, Qt.ToolTipRole, f"匹配 {count} 个文件，共 {format_size(size)}")
+            model.set_item_data(text, Qt.ForegroundRole, QColor("#FF9800") if count == 0 else None)
+            if count == 0:
+                self.append_log(f"模式 {pattern} 没有匹配任何文件", "warning")
+
+    def resource_base_dir(self):
+        """相对资源路径的基准目录：第一个主脚本所在目录"""
+        for script in self.scripts_model:
+            return os.path.dirname(os.path.abspath(script))
+        return os.getcwd()
+
     def create_pyz_card(self):
         """创建PYZ类卡片"""
         card = QWidget()
@@ -511,6 +812,14 @@ class PyInstallerSpecEditor(QMainWindow):
         self.upx_cb = QCheckBox("使用UPX压缩 (upx)")
         self.upx_cb.setChecked(True)
         basic_layout.addWidget(self.upx_cb, 4, 0, 1, 2)
+        
+        basic_layout.addWidget(QLabel("打包模式:"), 5, 0)
+        self.package_mode_combo = QComboBox()
+        self.package_mode_combo.addItem("目录 (onedir)", "onedir")
+        self.package_mode_combo.addItem("单文件 (onefile)", "onefile")
+        self.package_mode_combo.addItem("单文件+目录 (共用一次分析)", "dual")
+        self.package_mode_combo.setToolTip("单文件+目录模式下，单文件版程序名加 _onefile 后缀")
+        basic_layout.addWidget(self.package_mode_combo, 5, 1)
         layout.addWidget(basic_group)
         
         # 临时文件位置
@@ -557,40 +866,79 @@ class PyInstallerSpecEditor(QMainWindow):
         
         return card
 
+    def create_merge_card(self):
+        """创建MERGE多程序打包卡片"""
+        card = QWidget()
+        card.setProperty("card", True)
+        layout = QVBoxLayout(card)
+        
+        # 标题
+        title = QLabel("MERGE - 多程序共享依赖")
+        title.setStyleSheet("font-weight: bold; font-size: 12px; margin-bottom: 10px;")
+        layout.addWidget(title)
+        
+        self.merge_cb = QCheckBox("每个主脚本生成独立的程序，通过MERGE共享依赖")
+        layout.addWidget(self.merge_cb)
+        
+        merge_note = QLabel("- 每个脚本单独分析，程序名和输出文件夹名取脚本文件名\n"
+                            "- 多个程序共用的模块和二进制文件只保存在第一个程序中\n"
+                            "- 打包完成后报告与分别打包相比节省的磁盘空间和时间\n"
+                            "- 单文件+目录模式下不使用MERGE")
+        merge_note.setStyleSheet("color: #666; margin-left: 10px;")
+        layout.addWidget(merge_note)
+        
+        return card
+
     def add_script(self):
         """添加脚本文件"""
         file_paths, _ = QFileDialog.getOpenFileNames(self, "选择Python脚本", "", "Python Files (*.py);;All Files (*)")
-        for file_path in file_paths:
-            if file_path not in [self.scripts_list.item(i).text() for i in range(self.scripts_list.count())]:
-                self.scripts_list.addItem(file_path)
+        was_empty = not len(self.scripts_model)
+        self.scripts_model.add_many(file_paths)
+        if was_empty and len(self.scripts_model):
+            self.on_project_changed()
 
     def remove_script(self):
         """移除选中的脚本文件"""
-        for item in self.scripts_list.selectedItems():
-            self.scripts_list.takeItem(self.scripts_list.row(item))
+        self.scripts_model.remove_rows(selected_rows(self.scripts_list))
 
     def add_pathex(self):
         """添加搜索路径"""
         dir_path = QFileDialog.getExistingDirectory(self, "选择模块搜索路径", ".")
-        if dir_path and dir_path not in [self.pathex_list.item(i).text() for i in range(self.pathex_list.count())]:
-            self.pathex_list.addItem(dir_path)
+        if dir_path:
+            self.pathex_model.add(dir_path)
 
     def remove_pathex(self):
         """移除选中的搜索路径"""
-        for item in self.pathex_list.selectedItems():
-            self.pathex_list.takeItem(self.pathex_list.row(item))
+        self.pathex_model.remove_rows(selected_rows(self.pathex_list))
 
     def add_hidden_import(self):
         """添加隐藏导入模块"""
-        module_name, ok = QInputDialog.getText(self, "添加隐藏导入", "输入模块名:")
-        if ok and module_name:
-            if module_name not in [self.hidden_imports_list.item(i).text() for i in range(self.hidden_imports_list.count())]:
-                self.hidden_imports_list.addItem(module_name)
+        dialog = QInputDialog(self)
+        dialog.setWindowTitle("添加隐藏导入")
+        dialog.setLabelText("输入模块名:")
+        dialog.setInputMode(QInputDialog.TextInput)
+        line_edit = dialog.findChild(QLineEdit)
+        if line_edit:
+            ModuleCompleter(line_edit, lambda: self.module_index, multiple=False)
+        module_name = dialog.textValue() if dialog.exec_() == QInputDialog.Accepted else ""
+        if module_name.strip():
+            self.hidden_imports_model.add(module_name.strip())
+
+    def import_hidden_imports(self):
+        """从文本文件批量导入隐藏导入模块，每行一个"""
+        file_path, _ = QFileDialog.getOpenFileName(self, "选择模块列表文件", "", "Text Files (*.txt);;All Files (*)")
+        if file_path:
+            try:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    modules = [line.strip() for line in f if line.strip() and not line.strip().startswith('#')]
+                added_count = self.hidden_imports_model.add_many(modules)
+                QMessageBox.information(self, "成功", f"已从文件导入 {added_count} 个隐藏导入模块！")
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"导入隐藏导入模块失败: {str(e)}")
 
     def remove_hidden_import(self):
         """移除选中的隐藏导入模块"""
-        for item in self.hidden_imports_list.selectedItems():
-            self.hidden_imports_list.takeItem(self.hidden_imports_list.row(item))
+        self.hidden_imports_model.remove_rows(selected_rows(self.hidden_imports_list))
 
     def browse_icon(self):
         """浏览图标文件"""
@@ -613,131 +961,508 @@ class PyInstallerSpecEditor(QMainWindow):
     def generate_spec_content(self):
         """生成spec文件内容"""
         # 收集数据
-        scripts = [self.scripts_list.item(i).text() for i in range(self.scripts_list.count())]
-        pathex = [self.pathex_list.item(i).text() for i in range(self.pathex_list.count())]
-        hiddenimports = [self.hidden_imports_list.item(i).text() for i in range(self.hidden_imports_list.count())]
+        scripts = list(self.scripts_model)
         
         # 生成spec文件内容
         spec_content = f"""# -*- mode: python ; coding: utf-8 -*-
 
-block_cipher = {repr(self.cipher_edit.text() if self.cipher_edit.text() else None)}
+{self.spec_glob_helpers()}block_cipher = {repr(self.cipher_edit.text() if self.cipher_edit.text() else None)}
+
+
+"""
+        mode = self.package_mode_combo.currentData()
+        if self.use_merge():
+            # 每个脚本独立分析，MERGE后共享的模块和二进制文件只保存一份
+            targets = self.merge_targets()
+            for index, (script, name) in enumerate(targets):
+                spec_content += self.spec_analysis(f"a{index}", [canonical_path(script)])
+            # 元组依次为 Analysis、脚本名和程序相对于输出目录的路径（onedir模式下在同名文件夹中）
+            spec_content += "MERGE(\n" + "".join(
+                f"    (a{index}, {repr(os.path.splitext(os.path.basename(script))[0])}, "
+                f"{repr(name if mode == 'onefile' else name + '/' + name)}),\n"
+                for index, (script, name) in enumerate(targets)) + ")\n"
+            for index, (script, name) in enumerate(targets):
+                spec_content += self.spec_program(str(index), f"a{index}", name, name, mode)
+        else:
+            # 脚本顺序决定主程序，只规范化路径不排序
+            spec_content += self.spec_analysis("a", unique_paths(scripts))
+            spec_content += self.spec_program("", "a",
+                                              self.exe_name_edit.text() if self.exe_name_edit.text() else 'app',
+                                              self.collect_name_edit.text() if self.collect_name_edit.text() else 'app',
+                                              mode)
+        return spec_content
+
+    def use_merge(self):
+        """是否按多程序MERGE生成spec，单文件+目录模式下两种产物的依赖路径不同，不使用MERGE"""
+        return (self.merge_cb.isChecked() and len(self.scripts_model) > 1
+                and self.package_mode_combo.currentData() != 'dual')
+
+    def merge_targets(self):
+        """多程序打包时每个脚本对应的 (脚本, 程序名)，程序名取脚本文件名"""
+        targets = []
+        used_names = set()
+        for script in self.scripts_model:
+            base = os.path.splitext(os.path.basename(script))[0] or 'app'
+            name = base
+            counter = 1
+            while name in used_names:
+                counter += 1
+                name = f"{base}_{counter}"
+            used_names.add(name)
+            targets.append((script, name))
+        return targets
+
+    def resource_entries(self, model):
+        """解析数据文件或二进制文件条目为 [(源路径, 目标目录)]
+
+        相对路径转为规范的绝对路径，去重后按目标目录和源路径排序，spec内容与条目的添加顺序无关。
+        """
+        base_dir = self.resource_base_dir()
+        entries = set()
+        for text in model:
+            src, _, dest = text.rpartition(RESOURCE_SEPARATOR)
+            src = canonical_path(src if os.path.isabs(src) else os.path.join(base_dir, src))
+            entries.add((src, dest or '.'))
+        return sorted(entries, key=lambda entry: (entry[1], entry[0]))
 
+    def pattern_entries(self, model):
+        """钩子目录、运行时钩子的模式列表，相对路径转为规范的绝对路径，保留先后顺序"""
+        base_dir = self.resource_base_dir()
+        return unique_paths(p if os.path.isabs(p) else os.path.join(base_dir, p) for p in model)
 
-a = Analysis(
+    def spec_glob_helpers(self):
+        """使用了glob模式时在spec开头生成展开函数，模式在打包时才展开"""
+        entries = self.resource_entries(self.datas_model) + self.resource_entries(self.binaries_model)
+        patterns = self.pattern_entries(self.hookspath_model) + self.pattern_entries(self.runtime_hooks_model)
+        if any(has_glob(src) for src, dest in entries) or any(has_glob(p) for p in patterns):
+            return SPEC_GLOB_HELPERS
+        return ""
+
+    def spec_toc_list(self, entries):
+        """数据文件或二进制文件列表：单个文件写成元组，glob模式写成展开表达式，目录另用Tree"""
+        items = []
+        for src, dest in entries:
+            if has_glob(src):
+                items.append(f"*_glob_files({repr(src)}, {repr(dest)})")
+            elif not os.path.isdir(src):
+                items.append(f"({repr(src)}, {repr(dest)})")
+        return "[" + ", ".join(items) + "]"
+
+    def spec_trees(self, var, entries, attr, typecode):
+        """目录条目生成Tree，由PyInstaller在打包时遍历"""
+        lines = ""
+        for src, dest in entries:
+            if not has_glob(src) and os.path.isdir(src):
+                prefix = None if dest in ('', '.') else dest
+                lines += f"{var}.{attr} += Tree({repr(src)}, prefix={repr(prefix)}, typecode={repr(typecode)})\n"
+        return lines
+
+    def spec_path_list(self, patterns):
+        """钩子路径列表：glob模式写成展开表达式"""
+        return "[" + ", ".join(f"*_glob_paths({repr(p)})" if has_glob(p) else repr(p) for p in patterns) + "]"
+
+    def spec_analysis(self, var, scripts):
+        """生成一个Analysis段"""
+        pathex = unique_paths(self.pathex_model)
+        hiddenimports = sorted_unique(self.hidden_imports_model)
+        datas = self.resource_entries(self.datas_model)
+        binaries = self.resource_entries(self.binaries_model)
+        trees = self.spec_trees(var, datas, 'datas', 'DATA') + self.spec_trees(var, binaries, 'binaries', 'BINARY')
+        return f"""{var} = Analysis(
     {repr(scripts)},
     pathex={repr(pathex)},
-    binaries=[],
-    datas=[],
+    binaries={self.spec_toc_list(binaries)},
+    datas={self.spec_toc_list(datas)},
     hiddenimports={repr(hiddenimports)},
-    hookspath=[],
+    hookspath={self.spec_path_list(self.pattern_entries(self.hookspath_model))},
     hooksconfig={{}},
-    runtime_hooks=[],
-    excludes=[],
+    runtime_hooks={self.spec_path_list(self.pattern_entries(self.runtime_hooks_model))},
+    excludes={repr(sorted_unique(self.excludes_model))},
     win_no_prefer_redirects=False,
     win_private_assemblies=False,
     cipher=block_cipher,
     noarchive=False,
 )
-pyz = PYZ(a.pure, a.zipped_data, cipher=block_cipher)
+{trees}"""
+
+    def spec_program(self, suffix, analysis, exe_name, collect_name, mode):
+        """生成一个程序的PYZ、EXE和COLLECT段
 
-exe = EXE(
-    pyz,
-    a.scripts,
+        onedir 生成EXE和COLLECT，onefile 生成包含全部依赖的单个EXE，
+        dual 在同一个PYZ上同时生成两者，单文件版程序名加 _onefile 后缀。
+        """
+        content = f"pyz{suffix} = PYZ({analysis}.pure, {analysis}.zipped_data, cipher=block_cipher)\n"
+        if mode in ('onedir', 'dual'):
+            content += f"""
+exe{suffix} = EXE(
+    pyz{suffix},
+    {analysis}.scripts,
     [],
     exclude_binaries=True,
-    name={repr(self.exe_name_edit.text() if self.exe_name_edit.text() else 'app')},
-    debug={str(self.debug_cb.isChecked()).lower()},
+{self.spec_exe_options(exe_name)})
+coll{suffix} = COLLECT(
+    exe{suffix},
+    {analysis}.binaries,
+    {analysis}.datas,
+    strip=False,
+    upx={self.upx_cb.isChecked()},
+    upx_exclude=[],
+    name={repr(collect_name)},
+)
+"""
+        if mode in ('onefile', 'dual'):
+            onefile_var = f"exe{suffix}_onefile" if mode == 'dual' else f"exe{suffix}"
+            onefile_name = f"{exe_name}_onefile" if mode == 'dual' else exe_name
+            content += f"""
+{onefile_var} = EXE(
+    pyz{suffix},
+    {analysis}.scripts,
+    {analysis}.binaries,
+    {analysis}.datas,
+    [],
+{self.spec_exe_options(onefile_name)})
+"""
+        return content
+
+    def spec_exe_options(self, exe_name):
+        """EXE段的公共参数"""
+        return f"""    name={repr(exe_name)},
+    debug={self.debug_cb.isChecked()},
     bootloader_ignore_signals=False,
     strip=False,
-    upx={str(self.upx_cb.isChecked()).lower()},
+    upx={self.upx_cb.isChecked()},
     upx_exclude=[],
     runtime_tmpdir={repr(self.runtime_tmpdir_edit.text() if self.runtime_tmpdir_edit.text() else None)},
-    console={str(self.console_cb.isChecked()).lower()},
+    console={self.console_cb.isChecked()},
     disable_windowed_traceback=False,
     argv_emulation=False,
     target_arch=None,
     codesign_identity=None,
     entitlements_file=None,
-    icon={repr(self.icon_edit.text() if self.icon_edit.text() else None)},
-)
-coll = COLLECT(
-    exe,
-    a.binaries,
-    a.datas,
-    strip=False,
-    upx={str(self.upx_cb.isChecked()).lower()},
-    upx_exclude=[],
-    name={repr(self.collect_name_edit.text() if self.collect_name_edit.text() else 'app')},
-)
+    icon={repr(canonical_path(self.icon_edit.text()) if self.icon_edit.text() else None)},
 """
-        return spec_content
 
     def save_and_build(self):
-        """保存并打包"""
-        # 保存spec文件
-        temp_spec_path = os.path.join(tempfile.gettempdir(), 'temp.spec')
-        spec_content = self.generate_spec_content()
-        with open(temp_spec_path, 'w', encoding='utf-8') as f:
-            f.write(spec_content)
+        """保存并打包，每次打包使用独立的spec、工作目录和输出目录"""
+        scripts = list(self.scripts_model)
+        if not scripts:
+            QMessageBox.warning(self, "警告", "请先添加至少一个脚本！")
+            return
+        if not self.python_path:
+            QMessageBox.warning(self, "警告", "Python环境尚未准备就绪，请稍候再试！")
+            return
+        if self.warmup_thread and self.warmup_thread.isRunning() and self.warmup_thread.stage == 'install':
+            QMessageBox.warning(self, "警告", "后台正在安装PyInstaller，请稍候再试！")
+            return
         
-        # 执行打包
-        cmd = [self.python_path, '-m', 'PyInstaller', temp_spec_path]
+        # 任务名用于spec文件名和输出目录名，去掉不能用于文件名的字符
+        name = self.exe_name_edit.text().strip() or 'app'
+        name = re.sub(r'[\\/:*?"<>|\s]+', '_', name)
+        output_root = os.path.join(os.path.dirname(os.path.abspath(scripts[0])), 'dist')
+        meta = {}
+        if self.use_merge():
+            meta['merge_scripts'] = scripts
+        # 固定的时间戳取自源码，同样的输入每次打包得到相同的产物
+        epoch = source_date_epoch(scripts)
+        # 复现性校验：同一个spec提交两个任务，各自使用全新的工作目录，都完成后比较产物
+        runs = 2 if self.verify_cb.isChecked() else 1
+        verify_group = {'jobs': [], 'finished': []} if runs == 2 else None
+        spec_content = self.generate_spec_content()
         
-        QMessageBox.information(self, "开始打包", f"正在执行打包命令：\n{' '.join(cmd)}\n\n打包过程可能需要几分钟，请稍候...")
+        for _ in range(runs):
+            job_meta = dict(meta, verify=verify_group) if verify_group else meta
+            try:
+                job = self.build_scheduler.submit(name, spec_content, self.python_path, output_root, job_meta, epoch)
+            except Exception as e:
+                QMessageBox.critical(self, "错误", f"创建打包任务失败: {str(e)}")
+                return
+            if verify_group:
+                verify_group['jobs'].append(job)
+            if job.status == 'pending':
+                self.append_log(f"打包任务 {os.path.basename(job.dist_dir)} 已排队，等待其他任务完成", "info")
+        self.update_build_status()
+    
+    def on_build_started(self, job):
+        """打包任务开始执行，逐块读取输出"""
+        # 打包期间暂停预热
+        if self.warmup_thread and self.warmup_thread.isRunning():
+            self.warmup_thread.pause()
+        cmd = job.command()
+        job.label = os.path.basename(job.dist_dir)
+        job.job_log = self.log_store.start_job("spec", f"Spec打包 {job.name}")
+        job.job_log.write_line("$ " + " ".join(cmd))
+        job.decoder = OutputDecoder()
+        # spec路径每次都不同，项目键使用输出根目录加任务名，同一项目的历史记录才能累积
+        project = os.path.join(os.path.dirname(job.dist_dir), job.name)
+        job.history_keys = BuildHistory.make_keys(project, [job.spec_content])
+        estimate = self.build_history.estimate(*job.history_keys)
+        job.tracker = BuildProgressTracker(estimate)
+        # 从启动到开始分析第一个脚本的耗时（初始化依赖图、分析base_library等），分别打包时每个程序都要付出
+        job.setup_time = None
+        job.process.readyReadStandardOutput.connect(lambda: self.read_build_output(job))
+        
+        self.append_log(f"[{job.label}] 开始打包: {' '.join(cmd)}", "info")
+        if estimate:
+            self.append_log(f"[{job.label}] 根据 {estimate['runs']} 次历史记录，预计打包耗时 "
+                            f"{format_duration(estimate['total'])}", "info")
+        self.update_build_status()
+        self.build_progress.show()
+        self.build_eta_label.show()
+        self.update_build_progress()
+        self.eta_timer.start()
+    
+    def read_build_output(self, job):
+        """读取打包输出，按完整行解码和分类"""
+        data = job.process.readAllStandardOutput().data()
+        self.handle_build_lines(job, job.decoder.feed(data))
+    
+    def handle_build_lines(self, job, lines):
+        """将解码后的输出行写入日志面板和磁盘日志，并识别打包阶段"""
+        if not lines:
+            return
+        self.log_text.append_lines([(f"[{job.label}] {line}", level) for line, level in lines])
+        phase_changed = False
+        for line, level in lines:
+            job.job_log.write_line(line)
+            if job.tracker.feed_line(line):
+                phase_changed = True
+            if job.setup_time is None and job.meta.get('merge_scripts') and 'Analyzing ' in line and \
+                    any(script in line for script in job.meta['merge_scripts']):
+                job.setup_time = job.tracker.elapsed()
+        if phase_changed:
+            self.update_build_progress()
+    
+    def on_build_finished(self, job, exit_code):
+        """打包完成后的处理"""
+        # 先输出剩余内容，再汇总警告和错误
+        self.read_build_output(job)
+        self.handle_build_lines(job, job.decoder.flush())
+        job.job_log.close(exit_code)
+        self.update_build_status()
+        # 没有运行和排队的打包任务时继续预热
+        if not self.build_scheduler.running and not self.build_scheduler.pending and self.warmup_thread:
+            self.warmup_thread.resume()
+        self.finish_build_progress(job, exit_code)
+        verify_group = job.meta.get('verify')
+        if job.status == 'cancelled':
+            self.append_log(f"[{job.label}] 打包已取消，已删除不完整的工作目录和输出目录", "warning")
+            if verify_group:
+                self.on_verify_job_finished(verify_group, job)
+            return
+        if job.status == 'timeout':
+            minutes = self.timeout_spin.value()
+            self.append_log(f"[{job.label}] ❌ 打包超时，已强制结束并删除不完整的输出", "error")
+            if not verify_group:
+                QMessageBox.critical(self, "错误", f"{job.name} 打包超时，已强制结束。\n\n"
+                                                   f"可以在底部调大超时时间（当前 {minutes} 分钟）。")
+            else:
+                self.on_verify_job_finished(verify_group, job)
+            return
         
-        # 执行命令
-        self.process = QProcess()
-        self.process.setProcessChannelMode(QProcess.MergedChannels)
+        counts = job.decoder.counts
+        self.append_log(f"[{job.label}] 打包输出共 {counts['warning']} 条警告，{counts['error']} 条错误", "info")
+        if exit_code == 0:
+            if job.meta.get('merge_scripts'):
+                self.report_merge_savings(job)
+            self.append_log(f"[{job.label}] ✅ 打包成功，输出目录: {job.dist_dir}", "success")
+            # 工作目录在任务结束后删除，先读出产物文件与源文件的对应关系
+            job.collect_tocs = read_collect_tocs(job.work_dir) if self.manifest_cb.isChecked() else None
+            job.make_delta = self.delta_cb.isChecked()
+            if not verify_group:
+                self.start_manifest(job)
+                QMessageBox.information(self, "成功", f"{job.name} 打包完成！\n\n输出目录: {job.dist_dir}")
+        else:
+            self.append_log(f"[{job.label}] ❌ 打包失败，退出码: {exit_code}，工作目录已保留: {job.build_dir}", "error")
+            if job.decoder.error_lines:
+                self.append_log(f"[{job.label}] 最近的错误:", "error")
+                for line in job.decoder.error_lines:
+                    self.append_log(f"  {line}", "error")
+            if not verify_group:
+                QMessageBox.critical(self, "错误", f"{job.name} 打包失败，退出码: {exit_code}\n\n请查看日志获取详细信息。")
+        if verify_group:
+            self.on_verify_job_finished(verify_group, job)
+    
+    def on_verify_job_finished(self, group, job):
+        """复现性校验的两个任务都完成后比较产物"""
+        group['finished'].append(job)
+        if len(group['finished']) < len(group['jobs']):
+            return
+        first, second = group['jobs']
+        if 'cancelled' in (first.status, second.status):
+            discard_dir(second.dist_dir)
+            return
+        if first.status != 'success' or second.status != 'success':
+            discard_dir(second.dist_dir)
+            QMessageBox.critical(self, "错误", f"{first.name} 复现性校验失败：有打包任务未成功完成，请查看日志获取详细信息。")
+            return
+        thread = ArtifactCompareThread(first.dist_dir, second.dist_dir)
+        thread.progress_updated.connect(self.append_log)
+        thread.compared.connect(lambda count, differences: self.on_artifacts_compared(first, count, differences))
+        thread.finished.connect(
+            lambda success, message: self.on_artifact_compare_finished(thread, first, second, success, message))
+        self.compare_threads.append(thread)
+        thread.start()
+    
+    def on_artifacts_compared(self, job, count, differences):
+        """输出复现性校验结果"""
+        if not differences:
+            self.append_log(f"[{job.label}] ✅ 复现性校验通过: 两次打包的 {count} 个文件完全相同", "success")
+            QMessageBox.information(self, "成功", f"{job.name} 打包完成，复现性校验通过！\n\n输出目录: {job.dist_dir}")
+            return
+        self.append_log(f"[{job.label}] ⚠ 复现性校验未通过: {count} 个文件中有 {len(differences)} 个不同", "warning")
+        for rel_path, reason in differences[:20]:
+            self.append_log(f"  {rel_path}: {reason}", "warning")
+        if len(differences) > 20:
+            self.append_log(f"  ……另有 {len(differences) - 20} 个", "warning")
+        QMessageBox.warning(self, "复现性校验", f"{job.name} 打包完成，但两次打包的产物有 {len(differences)} 个文件不同。"
+                                               f"\n\n请查看日志中的文件列表。输出目录: {job.dist_dir}")
+    
+    def on_artifact_compare_finished(self, thread, first, second, success, message):
+        """比较完成后删除第二次打包的产物，只保留第一次的输出"""
+        if not success:
+            self.append_log(message, "error")
+        discard_dir(second.dist_dir)
+        if success:
+            self.start_manifest(first)
+        if thread in self.compare_threads:
+            self.compare_threads.remove(thread)
+    
+    def start_manifest(self, job):
+        """在后台为任务输出目录中的各个产物生成清单"""
+        if job.collect_tocs is None:
+            return
+        try:
+            targets = [os.path.join(job.dist_dir, name) for name in sorted(os.listdir(job.dist_dir))
+                       if not name.endswith((MANIFEST_SUFFIX, DELTA_SUFFIX))]
+        except OSError:
+            return
+        if not targets:
+            return
+        self.manifest_threads = [thread for thread in self.manifest_threads if thread.isRunning()]
+        # 每次打包输出到新的目录，按输出根目录和spec名称区分保存的打包
+        release_scope = os.path.join(os.path.dirname(job.dist_dir), job.name) if job.make_delta else None
+        thread = ManifestThread(targets, job.collect_tocs, release_scope)
+        thread.progress_updated.connect(lambda message, level: self.append_log(f"[{job.label}] {message}", level))
+        self.manifest_threads.append(thread)
+        thread.start()
+    
+    def report_merge_savings(self, job):
+        """报告MERGE多程序打包与分别打包相比节省的磁盘空间和时间"""
+        savings = merge_savings(job.work_dir)
+        if savings is None:
+            self.append_log(f"[{job.label}] 无法读取分析结果，跳过MERGE节省统计", "warning")
+            return
+        programs, shared_count, saved_bytes = savings
+        message = (f"[{job.label}] MERGE: {programs} 个程序共用 {shared_count} 个文件，"
+                   f"比分别打包节省磁盘约 {format_size(saved_bytes)}")
+        if job.setup_time is not None:
+            message += f"，节省依赖图初始化时间约 {format_duration(job.setup_time * (programs - 1))}"
+        self.append_log(message, "success")
+    
+    def update_build_progress(self):
+        """刷新最早开始的运行中任务的进度条和预计剩余时间"""
+        running = self.build_scheduler.running
+        if not running:
+            return
+        job = running[0]
+        tracker = job.tracker
+        elapsed = tracker.elapsed()
+        remaining = tracker.remaining()
+        phase_name = PHASE_NAMES[tracker.phase]
+        others = f" | 另有 {len(running) - 1} 个任务" if len(running) > 1 else ""
+        if remaining is None:
+            self.build_progress.setRange(0, 0)
+            self.build_eta_label.setText(f"{job.label}: {phase_name} | 已用时 {format_duration(elapsed)} | "
+                                         f"暂无历史记录{others}")
+            return
         
-        # 设置环境变量
-        from PyQt5.QtCore import QProcessEnvironment
-        env = QProcessEnvironment.systemEnvironment()
-        env.insert("PYTHONIOENCODING", "utf-8")
-        env.insert("PYTHONUTF8", "1")
-        self.process.setEnvironment(env)
+        self.build_progress.setRange(0, 1000)
+        self.build_progress.setValue(int(1000 * elapsed / max(elapsed + remaining, 1)))
+        self.build_progress.setFormat(f"{phase_name} %p%")
+        self.build_eta_label.setText(f"{job.label}: 已用时 {format_duration(elapsed)} | "
+                                     f"预计剩余 {format_duration(remaining)}{others}")
+        if tracker.is_slow() and not tracker.slow_warned:
+            tracker.slow_warned = True
+            self.append_log(f"[{job.label}] ⚠ 本次打包已用时 {format_duration(elapsed)}，明显慢于历史中位数 "
+                            f"{format_duration(tracker.estimate['total'])}，当前阶段: {phase_name}", "warning")
+    
+    def finish_build_progress(self, job, exit_code):
+        """结束计时，成功时记录历史并检查性能回退"""
+        if not self.build_scheduler.running:
+            self.eta_timer.stop()
+            self.build_progress.hide()
+            self.build_eta_label.hide()
+        else:
+            self.update_build_progress()
         
-        # 连接信号
-        self.process.finished.connect(self.on_build_finished)
-        self.process.start(cmd[0], cmd[1:])
-
-    def on_build_finished(self, exit_code, exit_status):
-        """打包完成后的处理"""
-        output = self.process.readAllStandardOutput().data().decode('utf-8', errors='replace')
-        if exit_code == 0:
-            QMessageBox.information(self, "成功", "打包完成！\n\n可执行文件已生成在dist目录中。")
+        durations, total = job.tracker.finish()
+        if exit_code != 0:
+            return
+        regressions = job.tracker.regressions(durations, total)
+        if regressions:
+            self.append_log(f"[{job.label}] ⚠ 本次打包明显慢于历史记录，可能存在性能回退:", "warning")
+            for message in regressions:
+                self.append_log(f"  {message}", "warning")
+        self.build_history.record(*job.history_keys, durations, total)
+    
+    def stop_builds(self):
+        """停止所有打包任务，不等待进程退出，结束后照常处理"""
+        if self.build_scheduler.running or self.build_scheduler.pending:
+            self.append_log("正在停止打包任务...", "warning")
+        for job in list(self.build_scheduler.pending):
+            # 排队的任务不会发出结束信号，在这里处理复现性校验的分组
+            self.build_scheduler.cancel_job(job)
+            if job.meta.get('verify'):
+                job.meta['verify']['finished'].append(job)
+        self.build_scheduler.cancel_all()
+        self.update_build_status()
+    
+    def update_build_status(self):
+        """更新正在运行和排队的打包任务数"""
+        running = len(self.build_scheduler.running)
+        pending = len(self.build_scheduler.pending)
+        self.stop_builds_btn.setEnabled(bool(running or pending))
+        if running or pending:
+            self.build_status_label.setText(f"正在打包 {running} 个，排队 {pending} 个")
         else:
-            QMessageBox.critical(self, "错误", f"打包失败，退出码: {exit_code}\n\n输出信息:\n{output}")
+            self.build_status_label.setText("")
 
     def closeEvent(self, event):
         """关闭窗口时清理临时文件"""
-        self.append_log("软件正在关闭，开始清理Python环境...")
+        self.append_log("软件正在关闭，开始清理Python环境...", "info")
         
         # 禁用窗口关闭，直到清理完成
         event.ignore()
-        
-        # 检查解压线程是否正在运行
+        self.close_pending = True
+        
+        # 后台线程都可以取消，取消后很快退出；中断留下的临时目录由下次启动的 CleanupThread 清理
+        if self.module_index_thread and self.module_index_thread.isRunning():
+            # 扫描在每个目录检查取消，很快退出；只等待有限时间，不阻塞关闭
+            self.module_index_thread.cancel()
+            self.module_index_thread.wait(2000)
+        for thread in list(self.glob_threads) + list(self.compare_threads) + list(self.manifest_threads):
+            thread.cancel()
+            thread.wait()
+        self.cancel_warmup()
+        if self.cleanup_thread and self.cleanup_thread.isRunning():
+            # 清理可以随时中断，剩余部分下次启动时继续
+            self.cleanup_thread.cancel()
+            self.cleanup_thread.wait()
+        self.build_scheduler.cancel_all(discard=True)
+        
+        # 取消仍在进行的运行时准备（如解析项目依赖），其他窗口仍在使用时不受影响
         if self.python_thread and self.python_thread.isRunning():
-            self.append_log("等待Python解压完成...")
-            self.close_pending = True
-        else:
-            # 开始清理
-            self.really_close()
+            self.python_thread.release()
+            self.python_thread.wait()
+        self.really_close()
     
     def really_close(self):
         """执行实际的关闭操作"""
-        # 清理临时解压的Python环境
-        if hasattr(self, 'extracted_python_dir') and self.extracted_python_dir and os.path.exists(self.extracted_python_dir):
-            try:
-                shutil.rmtree(self.extracted_python_dir)
-                self.append_log(f"✅ 已清理临时Python环境: {self.extracted_python_dir}")
-            except Exception as e:
-                self.append_log(f"❌ 清理临时Python环境失败: {str(e)}")
-        
-        self.append_log("软件已关闭")
-        # 执行实际的关闭操作
-        QApplication.quit()
+        self.append_log("软件已关闭", "info")
+        self.closed.emit()
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
     window = PyInstallerSpecEditor()
+    window.closed.connect(app.quit)
     sys.exit(app.exec_())
@@ -0,0 +1,52 @@
+import sys
+
+from PyQt5.QtWidgets import QApplication, QMainWindow, QTabWidget
+
+from pyinstaller_gui import PyInstallerGUI
+from pyinstaller_spec_editor import PyInstallerSpecEditor
+
+
+class PyInstallerSuite(QMainWindow):
+    """在同一个进程中以标签页运行打包器和Spec编辑器
+
+    两个标签页通过 RuntimeManager 共用运行时：同一个运行时只解压、预热一次，
+    也只需要一个Qt进程。关闭时依次执行两个标签页各自的关闭流程，全部完成后退出。
+    """
+
+    def __init__(self, report_startup_time=False):
+        super().__init__()
+        self.setWindowTitle("PyInstaller GUI - Python打包器")
+        self.setGeometry(100, 100, 1200, 800)
+        self.tabs = QTabWidget()
+        self.setCentralWidget(self.tabs)
+
+        self.packager = PyInstallerGUI(report_startup_time=report_startup_time, embedded=True)
+        self.spec_editor = PyInstallerSpecEditor(embedded=True)
+        self.tabs.addTab(self.packager, "打包器")
+        self.tabs.addTab(self.spec_editor, "Spec编辑器")
+        self.open_windows = [self.packager, self.spec_editor]
+        for window in self.open_windows:
+            window.closed.connect(lambda window=window: self.on_window_closed(window))
+        self.closing = False
+        self.show()
+
+    def closeEvent(self, event):
+        """两个标签页都完成关闭流程后再退出"""
+        event.ignore()
+        if self.closing:
+            return
+        self.closing = True
+        for window in list(self.open_windows):
+            window.close()
+
+    def on_window_closed(self, window):
+        if window in self.open_windows:
+            self.open_windows.remove(window)
+        if not self.open_windows:
+            QApplication.quit()
+
+
+if __name__ == "__main__":
+    app = QApplication(sys.argv)
+    window = PyInstallerSuite(report_startup_time="--startup-time" in sys.argv)
+    sys.exit(app.exec_())
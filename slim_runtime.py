@@ -0,0 +1,418 @@
+"""精简嵌入式Python运行时
+
+在完整的嵌入式Python中运行代表性的打包任务（PyInstaller打包、pip、pipreqs），
+记录这些过程实际加载的模块，以及打包结果中收集的模块，
+然后生成只保留这些模块的精简压缩包和清单，并用精简后的运行时重新打包验证。
+
+用法:
+    python slim_runtime.py python-3.9.13-embed-amd64.zip --script app1.py --script app2.py
+
+生成 python-3.9.13-embed-amd64-slim.zip 和 python-3.9.13-embed-amd64-slim.json，
+放在原压缩包旁边时会被打包器识别为可选的精简运行时。
+精简运行时只能打包与基准脚本用到的标准库范围相近的项目，清单中记录了保留的模块。
+"""
+import os
+import sys
+import ast
+import glob
+import time
+import shutil
+import zipfile
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+from pyinstaller_common import (
+    enable_site_in_pth, module_name_from_file, hash_file, write_json_atomic, format_size, format_duration
+)
+
+# 在测量用的运行时根目录放置的 sitecustomize，记录每个进程导入过的模块和模块文件
+TRACE_SITECUSTOMIZE = r'''
+import os
+import sys
+import atexit
+
+_trace_dir = os.environ.get('SLIM_RUNTIME_TRACE')
+if _trace_dir:
+    _imported = set()
+
+    def _audit(event, args):
+        if event == 'import':
+            _imported.add(args[0])
+
+    def _flush():
+        modules = list(sys.modules.items())
+        with open(os.path.join(_trace_dir, f"{os.getpid()}.txt"), 'a', encoding='utf-8') as f:
+            for name in _imported | {name for name, module in modules}:
+                f.write(f"M {name}\n")
+            for name, module in modules:
+                path = getattr(module, '__file__', None)
+                if path:
+                    f.write(f"F {os.path.abspath(path)}\n")
+
+    sys.addaudithook(_audit)
+    atexit.register(_flush)
+    # PyInstaller的子进程可能通过 os._exit 退出，不会执行 atexit
+    _os_exit = os._exit
+
+    def _exit(code):
+        _flush()
+        _os_exit(code)
+
+    os._exit = _exit
+'''
+
+# 没有指定基准脚本时使用的示例脚本
+DEFAULT_BENCHMARK_SCRIPT = '''import json
+import logging
+import argparse
+
+logging.basicConfig(level=logging.INFO)
+parser = argparse.ArgumentParser()
+parser.add_argument('--name', default='world')
+print(json.dumps({'hello': parser.parse_args().name}))
+'''
+
+# 可执行文件、动态库和路径配置总是保留
+ALWAYS_KEEP_SUFFIXES = ('.exe', '.dll', '._pth', '.cat')
+
+
+def top_level(name):
+    return name.partition('.')[0]
+
+
+def runtime_python(runtime_dir):
+    """运行时中的python可执行文件"""
+    for name in ('python.exe', 'python'):
+        path = os.path.join(runtime_dir, name)
+        if os.path.isfile(path):
+            return path
+    raise FileNotFoundError(f"运行时中找不到python可执行文件: {runtime_dir}")
+
+
+def extract_runtime(archive, dest):
+    """解压运行时并启用site模块，返回耗时（秒）"""
+    start = time.perf_counter()
+    with zipfile.ZipFile(archive) as zip_ref:
+        zip_ref.extractall(dest)
+        # 恢复可执行位（在非Windows上测试时需要）
+        for info in zip_ref.infolist():
+            mode = info.external_attr >> 16
+            if mode & 0o111 and not info.is_dir():
+                os.chmod(os.path.join(dest, info.filename), mode & 0o777)
+    enable_site_in_pth(dest)
+    return time.perf_counter() - start
+
+
+def dir_size(path):
+    total = 0
+    for dirpath, dirnames, filenames in os.walk(path):
+        for name in filenames:
+            try:
+                total += os.path.getsize(os.path.join(dirpath, name))
+            except OSError:
+                pass
+    return total
+
+
+def read_toc_modules(work_dir):
+    """读取工作目录中 Analysis-NN.toc 收集的模块名和源文件"""
+    modules, files = set(), set()
+    for toc_path in glob.glob(os.path.join(work_dir, '**', 'Analysis-*.toc'), recursive=True):
+        with open(toc_path, 'r', encoding='utf-8') as f:
+            data = ast.literal_eval(f.read())
+        stack = [data]
+        while stack:
+            item = stack.pop()
+            if isinstance(item, (list, tuple)):
+                if len(item) == 3 and all(isinstance(x, str) for x in item):
+                    name, src, typecode = item
+                    if typecode == 'PYMODULE':
+                        modules.add(name)
+                    elif typecode == 'EXTENSION':
+                        modules.add(module_name_from_file(os.path.basename(src)) or name)
+                    files.add(os.path.abspath(src))
+                else:
+                    stack.extend(item)
+            elif isinstance(item, dict):
+                stack.extend(item.values())
+    return modules, files
+
+
+class BenchmarkRunner:
+    """在指定运行时中运行基准任务"""
+
+    def __init__(self, runtime_dir, scripts, work_root, log=print):
+        self.runtime_dir = runtime_dir
+        self.python = runtime_python(runtime_dir)
+        self.scripts = scripts
+        self.work_root = work_root
+        self.log = log
+
+    def run(self, cmd, env=None, timeout=1800):
+        start = time.perf_counter()
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace',
+                                env=env, timeout=timeout)
+        return result, time.perf_counter() - start
+
+    def has_module(self, name, env):
+        result, _ = self.run([self.python, '-c', f'import {name}'], env)
+        return result.returncode == 0
+
+    def run_all(self, env=None):
+        """运行全部基准任务，返回 {'builds': [...], 'modules': 集合, 'files': 集合}"""
+        env = dict(env or os.environ)
+        env['PYTHONUTF8'] = '1'
+        env['PYTHONIOENCODING'] = 'utf-8'
+        if not self.has_module('PyInstaller', env):
+            raise RuntimeError("运行时中未安装PyInstaller，请先在完整运行时中安装后再打包成压缩包")
+
+        report = {'builds': [], 'tools': [], 'modules': set(), 'files': set()}
+        for index, script in enumerate(self.scripts):
+            work_dir = os.path.join(self.work_root, f"build-{index}")
+            cmd = [self.python, '-m', 'PyInstaller', '--noconfirm', '-F',
+                   '--workpath', os.path.join(work_dir, 'build'), '--distpath', os.path.join(work_dir, 'dist'),
+                   '--specpath', work_dir, script]
+            self.log(f"打包基准脚本: {os.path.basename(script)}")
+            result, seconds = self.run(cmd, env)
+            modules, files = read_toc_modules(os.path.join(work_dir, 'build'))
+            report['builds'].append({'script': script, 'exit_code': result.returncode, 'seconds': round(seconds, 2),
+                                     'modules': sorted(modules)})
+            report['modules'] |= modules
+            report['files'] |= files
+            if result.returncode != 0:
+                self.log("\n".join(result.stderr.strip().splitlines()[-10:]))
+
+        # pip和pipreqs只用于测量加载的模块，失败（如没有网络）不影响结果
+        download_dir = os.path.join(self.work_root, 'pip-download')
+        tools = [
+            [self.python, '-m', 'pip', 'list'],
+            [self.python, '-m', 'pip', 'show', 'pyinstaller'],
+            [self.python, '-m', 'pip', 'download', '--no-deps', '-d', download_dir, 'pip'],
+        ]
+        if self.has_module('pipreqs', env):
+            tools.append([self.python, '-m', 'pipreqs.pipreqs', '--print', '--mode', 'no-pin',
+                          os.path.dirname(self.scripts[0])])
+        for cmd in tools:
+            self.log(f"运行: {' '.join(cmd[1:])}")
+            result, seconds = self.run(cmd, env, timeout=600)
+            report['tools'].append({'command': cmd[1:], 'exit_code': result.returncode, 'seconds': round(seconds, 2)})
+        return report
+
+
+def measure(runtime_dir, scripts, work_root, log):
+    """在完整运行时中运行基准任务并记录加载的模块"""
+    trace_dir = os.path.join(work_root, 'trace')
+    os.makedirs(trace_dir, exist_ok=True)
+    with open(os.path.join(runtime_dir, 'sitecustomize.py'), 'w', encoding='utf-8') as f:
+        f.write(TRACE_SITECUSTOMIZE)
+    env = dict(os.environ)
+    env['SLIM_RUNTIME_TRACE'] = trace_dir
+    try:
+        report = BenchmarkRunner(runtime_dir, scripts, os.path.join(work_root, 'measure'), log).run_all(env)
+    finally:
+        os.remove(os.path.join(runtime_dir, 'sitecustomize.py'))
+
+    for path in glob.glob(os.path.join(trace_dir, '*.txt')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                kind, _, value = line.rstrip('\n').partition(' ')
+                if kind == 'M':
+                    report['modules'].add(value)
+                elif kind == 'F':
+                    report['files'].add(value)
+    report['modules'].discard('sitecustomize')
+    return report
+
+
+def relative_files(files, runtime_dir):
+    """运行时目录内的文件，转为使用 / 分隔的相对路径"""
+    root = os.path.abspath(runtime_dir) + os.sep
+    return {os.path.relpath(path, root).replace(os.sep, '/') for path in files if path.startswith(root)}
+
+
+def plan_archive(archive, keep_modules, used_files):
+    """决定精简压缩包中保留的条目
+
+    以顶层模块为单位取舍：标准库压缩包、扩展模块和 site-packages 中的顶层包
+    只要有子模块被用到就整体保留；dist-info、.pth 和其他非模块文件全部保留。
+    返回 (保留的条目名集合, 标准库压缩包名, 标准库中保留的条目名集合, 删除的条目列表)
+    """
+    keep_top = {top_level(name) for name in keep_modules}
+    kept, removed = set(), []
+    stdlib_zip, stdlib_kept = None, set()
+
+    with zipfile.ZipFile(archive) as zip_ref:
+        for info in zip_ref.infolist():
+            name = info.filename
+            parts = name.rstrip('/').split('/')
+            if len(parts) == 1 and name.startswith('python') and name.endswith('.zip'):
+                stdlib_zip = name
+                with zipfile.ZipFile(zip_ref.open(info)) as stdlib_ref:
+                    for member in stdlib_ref.namelist():
+                        top = member.split('/')[0]
+                        module = top if '/' in member else module_name_from_file(top)
+                        if module is None or module in keep_top:
+                            stdlib_kept.add(member)
+                        else:
+                            removed.append(f"{name}/{member}")
+                kept.add(name)
+                continue
+            if info.is_dir() or name.endswith(ALWAYS_KEEP_SUFFIXES) or name in used_files:
+                kept.add(name)
+                continue
+
+            # site-packages 中的顶层包或模块
+            if 'site-packages' in parts[:-1]:
+                index = parts.index('site-packages')
+                top = parts[index + 1]
+                module = top if len(parts) > index + 2 else module_name_from_file(top)
+                if top.endswith(('.dist-info', '.egg-info', '.data')) or module is None or top == '__pycache__':
+                    kept.add(name)
+                elif module in keep_top:
+                    kept.add(name)
+                else:
+                    removed.append(name)
+                continue
+
+            # 扩展模块（.pyd、lib-dynload 中的 .so）
+            module = module_name_from_file(parts[-1])
+            if parts[-1].endswith(('.pyd', '.so')) and module and module not in keep_top:
+                removed.append(name)
+            else:
+                kept.add(name)
+    return kept, stdlib_zip, stdlib_kept, removed
+
+
+def write_archive(archive, output, kept, stdlib_zip, stdlib_kept):
+    """按计划写出精简压缩包，标准库压缩包重新打包"""
+    tmp_output = output + '.tmp'
+    with zipfile.ZipFile(archive) as src, \
+            zipfile.ZipFile(tmp_output, 'w', zipfile.ZIP_DEFLATED) as dst:
+        for info in src.infolist():
+            if info.filename not in kept:
+                continue
+            if info.filename == stdlib_zip:
+                buffer_path = os.path.join(os.path.dirname(output), f".{stdlib_zip}.tmp")
+                with zipfile.ZipFile(src.open(info)) as stdlib_src, \
+                        zipfile.ZipFile(buffer_path, 'w', zipfile.ZIP_DEFLATED) as stdlib_dst:
+                    for member in stdlib_src.infolist():
+                        if member.filename in stdlib_kept:
+                            stdlib_dst.writestr(member, stdlib_src.read(member))
+                dst.write(buffer_path, stdlib_zip)
+                os.remove(buffer_path)
+            else:
+                dst.writestr(info, src.read(info))
+    os.replace(tmp_output, output)
+
+
+def slim_name(archive):
+    base, ext = os.path.splitext(os.path.basename(archive))
+    return f"{base}-slim{ext}"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="测量打包实际用到的模块，生成精简的嵌入式Python压缩包")
+    parser.add_argument('archive', help="完整的嵌入式Python压缩包，需已安装PyInstaller和pip")
+    parser.add_argument('--script', action='append', default=[], help="基准脚本，可指定多次")
+    parser.add_argument('--keep', action='append', default=[], help="额外保留的模块，可指定多次")
+    parser.add_argument('--output-dir', help="输出目录，默认与原压缩包相同")
+    parser.add_argument('--no-verify', action='store_true', help="不用精简后的运行时重新打包验证")
+    args = parser.parse_args(argv)
+
+    archive = os.path.abspath(args.archive)
+    output_dir = os.path.abspath(args.output_dir or os.path.dirname(archive))
+    output = os.path.join(output_dir, slim_name(archive))
+    manifest_path = os.path.splitext(output)[0] + '.json'
+    work_root = tempfile.mkdtemp(prefix='slim_runtime_')
+    log = lambda message: print(message, flush=True)
+
+    try:
+        scripts = [os.path.abspath(s) for s in args.script]
+        if not scripts:
+            script_dir = os.path.join(work_root, 'sample')
+            os.makedirs(script_dir)
+            scripts = [os.path.join(script_dir, 'sample_app.py')]
+            with open(scripts[0], 'w', encoding='utf-8') as f:
+                f.write(DEFAULT_BENCHMARK_SCRIPT)
+
+        full_dir = os.path.join(work_root, 'full')
+        full_extract = extract_runtime(archive, full_dir)
+        full_size = dir_size(full_dir)
+        log(f"完整运行时: 压缩包 {format_size(os.path.getsize(archive))}, 解压后 {format_size(full_size)}, "
+            f"解压耗时 {full_extract:.2f} 秒")
+
+        log("在完整运行时中测量加载的模块...")
+        report = measure(full_dir, scripts, work_root, log)
+        failed = [b['script'] for b in report['builds'] if b['exit_code'] != 0]
+        if failed:
+            log(f"基准打包失败，无法确定需要的模块: {', '.join(failed)}")
+            return 1
+        keep_modules = report['modules'] | set(args.keep)
+        used_files = relative_files(report['files'], full_dir)
+        log(f"共用到 {len({top_level(m) for m in keep_modules})} 个顶层模块")
+
+        os.makedirs(output_dir, exist_ok=True)
+        kept, stdlib_zip, stdlib_kept, removed = plan_archive(archive, keep_modules, used_files)
+        write_archive(archive, output, kept, stdlib_zip, stdlib_kept)
+
+        slim_dir = os.path.join(work_root, 'slim')
+        slim_extract = extract_runtime(output, slim_dir)
+        slim_size = dir_size(slim_dir)
+        log(f"精简运行时: 压缩包 {format_size(os.path.getsize(output))}, 解压后 {format_size(slim_size)}, "
+            f"解压耗时 {slim_extract:.2f} 秒，删除 {len(removed)} 个文件")
+
+        verify = None
+        if not args.no_verify:
+            log("用精简运行时重新打包验证...")
+            slim_report = BenchmarkRunner(slim_dir, scripts, os.path.join(work_root, 'verify'), log).run_all()
+            verify = {'builds': [], 'passed': True}
+            for full_build, slim_build in zip(report['builds'], slim_report['builds']):
+                missing = sorted(set(full_build['modules']) - set(slim_build['modules']))
+                passed = slim_build['exit_code'] == 0 and not missing
+                verify['passed'] &= passed
+                verify['builds'].append({'script': slim_build['script'], 'exit_code': slim_build['exit_code'],
+                                         'seconds': slim_build['seconds'], 'full_seconds': full_build['seconds'],
+                                         'missing_modules': missing})
+                log(f"  {os.path.basename(slim_build['script'])}: "
+                    f"{'通过' if passed else '失败'}，耗时 {format_duration(slim_build['seconds'])} "
+                    f"(完整运行时 {format_duration(full_build['seconds'])})"
+                    + (f"，缺少模块: {', '.join(missing[:10])}" if missing else ""))
+            # 在完整运行时中成功的pip、pipreqs命令，精简后也应成功
+            for full_tool, slim_tool in zip(report['tools'], slim_report['tools']):
+                if full_tool['exit_code'] == 0 and slim_tool['exit_code'] != 0:
+                    verify['passed'] = False
+                    verify.setdefault('failed_tools', []).append(slim_tool['command'])
+                    log(f"  {' '.join(slim_tool['command'])}: 失败，退出码 {slim_tool['exit_code']}")
+
+        manifest = {
+            'source_archive': os.path.basename(archive),
+            'source_sha256': hash_file(archive),
+            'slim_archive': os.path.basename(output),
+            'slim_sha256': hash_file(output),
+            'created': datetime.now().isoformat(timespec='seconds'),
+            'benchmarks': {'builds': [{k: v for k, v in b.items() if k != 'modules'} for b in report['builds']],
+                           'tools': report['tools']},
+            'kept_modules': sorted({top_level(m) for m in keep_modules}),
+            'extra_modules': sorted(args.keep),
+            'removed_files': sorted(removed),
+            'sizes': {'full_archive': os.path.getsize(archive), 'slim_archive': os.path.getsize(output),
+                      'full_extracted': full_size, 'slim_extracted': slim_size,
+                      'full_extract_seconds': round(full_extract, 3), 'slim_extract_seconds': round(slim_extract, 3)},
+            'verify': verify,
+            'verified': bool(verify and verify['passed']),
+        }
+        write_json_atomic(manifest_path, manifest)
+        log(f"已生成: {output}")
+        log(f"清单: {manifest_path}")
+        if verify and not verify['passed']:
+            log("验证未通过，精简运行时在列表中显示为未验证")
+            return 2
+        return 0
+    finally:
+        shutil.rmtree(work_root, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    sys.exit(main())